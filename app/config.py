@@ -1,3 +1,5 @@
+import plotly.express as px
+
 config_labels = {
     "menus": {
         "file": "Select Data File",
@@ -8,6 +10,7 @@ config_labels = {
         "reference": "Select Reference",
         "groupping": "Select Groupping",
         "target": "Select Target(s)",
+        "explore": "Explore in browser",
     },
     "plot": {
         "x_label": "X-Axis",
@@ -20,11 +23,21 @@ config_labels = {
     },
     "headers": {
         "main": "📊 Mock Database Visualization",
-        "dataframes": "View Underlying Data"
+        "dataframes": "View Underlying Data",
+        "performance": "Performance"
     },
     "download_buttons": {
         "df_csv": "Download Line Plot Data as CSV",
-        "dfh_csv": "Download Bar Plot Data as CSV"
+        "dfh_csv": "Download Bar Plot Data as CSV",
+        "prepare": "Prepare CSV downloads"
+    },
+    "export": {
+        "header": "Export",
+        "match": "Match on",
+        "match_help": "Entries must match the current selection on these parameters; unchecked ones match any value.",
+        "format": "Format",
+        "button": "Download as ZIP",
+        "prepare": "Prepare ZIP"
     },
     "help": {
         "database": "Choose the database to analyze.",
@@ -33,7 +46,8 @@ config_labels = {
         "agg_function": "Select the aggregation function.",
         "groupping": "Choose how to group the data.",
         "target": "Select the target variable(s) for analysis.",
-        "reference": "Select the reference type for Var Y calculation."
+        "reference": "Select the reference type for Var Y calculation.",
+        "explore": "Pack all targets and references into the figure and switch them with its menus, without reloading."
     },
     "labels": {
         "bar_plot": "Bar Plot",
@@ -54,6 +68,31 @@ analysis_explanations = {
     # Add more as needed
 }
 
+# Rendering options for large selections
+config_performance = {
+    "webgl_point_threshold": 20000,  # total line points before switching to WebGL traces
+    "webgl_trace_threshold": 60,     # total line traces before switching to WebGL traces
+    "lightweight_figure": True,      # build the figure as a plain spec (modelviz.figure_spec)
+    "consolidate_traces": False,     # one line trace per target, groups separated by gaps
+    "consolidate_trace_threshold": 200,  # ...once there are this many per-group line traces
+    "group_heatmap_threshold": 15,   # groups above which the grouped histogram becomes a heatmap
+    "float32_rtol": 1e-6,            # send float arrays as float32 when this precision is kept
+    "show_payload_size": False,      # show the size of the figure sent to the browser
+    "client_side_exploration": False,  # default of the "Explore in browser" checkbox
+    "exploration_max_points": 500000,  # points packed into the exploration figure at most
+    "table_page_size": 1000,         # rows per page of the data tables; longer frames are paged
+    "memory_budget_mb": 2048,        # decoded data files kept in memory; least recently used ones are evicted
+    "prewarm": False,                # load data files into the shared store in the background at startup
+    "prewarm_files": [],             # file names to preload; empty: the most recently modified ones
+    "prewarm_recent": 2,             # files preloaded when prewarm_files is empty
+    "prewarm_workers": 2,            # background loading threads
+    "perf_query_param": "perf",      # ?perf=1 shows the stage timings panel in the sidebar
+    "perf_history": 50,              # reruns kept for the panel's percentiles
+    "memory_profile": False,         # tracemalloc snapshots around each stage (slow; implies the panel)
+    "memory_profile_dir": "./profiles",  # snapshots are written here, one directory per rerun (None: not written)
+    "memory_profile_top": 10,        # top allocation sites kept per stage
+}
+
 dictionary_aggregated_values = {
     'mean': 100,
     'median': 1000
@@ -265,7 +265,8 @@ def create_figure(data_dict, config_labels, config_colors, custom_xticks, select
     dfh_first = first_data['dfh']
 
     if selected_column in custom_xticks:
-        dfh_first['x'] = dfh_first['x'].map( map_xticks( custom_xticks[selected_column]))
+        # Derived columns go to a new frame, so the cached entry is left untouched
+        dfh_first = dfh_first.assign(x=dfh_first['x'].map(map_xticks(custom_xticks[selected_column])))
         dfh_first = dfh_first.sort_values('x')
 
 
@@ -280,9 +281,11 @@ def create_figure(data_dict, config_labels, config_colors, custom_xticks, select
     if add_third_subplot and 'dfhg' in first_data:
         dfhg_first = first_data['dfhg']
         if selected_column in custom_xticks:
-            dfhg_first['x'] = dfhg_first['x'].map( map_xticks( custom_xticks[selected_column]))
             group_list = dfhg_first['group'].unique().tolist()
-            dfhg_first['order'] = dfhg_first['group'].apply(lambda g: group_list.index(g))
+            dfhg_first = dfhg_first.assign(
+                x=dfhg_first['x'].map(map_xticks(custom_xticks[selected_column])),
+                order=dfhg_first['group'].map({g: i for i, g in enumerate(group_list)})
+            )
             dfhg_first = dfhg_first.sort_values(['order','x'])
 
 
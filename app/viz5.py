@@ -7,52 +7,146 @@ from pathlib import Path
 from PIL import Image
 import plotly.express as px
 from io import StringIO
-from app.config import config_labels, config_colors, analysis_explanations, dictionary_aggregated_values
-from modelviz.data_loader import load_data_dict, load_logo
-from modelviz.sidebar_setup import setup_sidebar, select_config
+from app.config import config_labels, config_colors, config_performance, analysis_explanations, dictionary_aggregated_values, custom_xticks
+from modelviz.data_loader import enable_copy_on_write, load_data_index, load_logo
+from modelviz.sidebar_setup import setup_sidebar, select_data_config, select_figure_config
 from modelviz.plotting import create_figure, map_xticks
+from modelviz.figure_spec import build_figure_spec, build_exploration_spec, figure_from_spec, figure_payload_size
 from modelviz.dataframe_display import display_dataframes
+from modelviz.export import export_section
+from modelviz.prewarm import is_warming, prewarm_progress, prewarm_summary, start_prewarm
+from modelviz.store_manager import get_data_store, store_stats
+from modelviz.instrumentation import fragment_rerun, performance_enabled, performance_panel, record_data_size, recorded_rerun, stage
 
 # ===========================
 # Configurable Paths
 # ===========================
 DATA_PATH = './data'
 IMAGE_PATH = './images/log.jpeg'
+# Memory profiling mode of the recorded reruns (instrumentation.start_rerun)
+MEMORY_PROFILE = {
+    "dir": config_performance.get("memory_profile_dir"),
+    "top": config_performance.get("memory_profile_top", 10),
+} if config_performance.get("memory_profile", False) else None
 
-# ===========================
-# Custom X-Ticks Dictionary
-# ===========================
+@st.fragment
+def figure_section(data_dict, data_index, data_path, selection, explore_in_browser, show_performance):
+    """
+    Targets, var_y reference, figure and data section. Changing the targets or the
+    reference reruns only this fragment, not the file and sidebar selection above it.
+    """
+    selected_db, selected_analysis, selected_column, selected_agg, selected_ref, selected_group = selection
+    with fragment_rerun("figure", show_performance, config_performance.get("perf_history", 50), MEMORY_PROFILE):
+        st.header(f"Variable impact for {selected_column} in {selected_db}.")
+        with stage("select_figure_config"):
+            # In the main area, as a fragment cannot write to the sidebar
+            selected_targets, var_y_type, y0 = select_figure_config(
+                data_dict, config_labels, dictionary_aggregated_values, *selection, container=st, data_index=data_index
+            )
+
+        with stage("build_figure"):
+            if explore_in_browser:
+                # All targets and references in one figure, switched with the in-figure menus
+                available_targets = data_index["items"].get(selection, [])
+                fig_plotly, add_third_subplot, included_targets = build_exploration_spec(
+                    data_dict, config_labels, config_colors, custom_xticks,
+                    selected_db, selected_analysis, selected_column, selected_agg, selected_ref,
+                    selected_group, available_targets, selected_targets, var_y_type, dictionary_aggregated_values,
+                    config_performance=config_performance
+                )
+                if len(included_targets) < len(available_targets):
+                    st.info(f"Showing {len(included_targets)} of {len(available_targets)} targets to stay within the figure size cap.")
+            else:
+                # The spec builder skips graph_objects validation; create_figure is the reference path
+                figure_builder = build_figure_spec if config_performance.get("lightweight_figure") else create_figure
+                fig_plotly, add_third_subplot = figure_builder(
+                    data_dict, config_labels, config_colors, custom_xticks,
+                    selected_db, selected_analysis, selected_column, selected_agg, selected_ref,
+                    selected_group, selected_targets, var_y_type, y0,
+                    config_performance=config_performance
+                )
+            if isinstance(fig_plotly, dict):
+                fig_plotly = figure_from_spec(fig_plotly)
 
+        with stage("plotly_chart"):
+            st.plotly_chart(fig_plotly, use_container_width=True)
+        if config_performance.get("show_payload_size"):
+            payload = figure_payload_size(fig_plotly)
+            st.caption(f"Figure payload: {payload['total'] / 1e6:.2f} MB in {len(payload['traces'])} traces")
 
-    # Add more entries if needed
-}
+        data_section(data_dict, data_path, selection, selected_targets, add_third_subplot, show_performance)
+
+@st.fragment
+def data_section(data_dict, data_path, selection, selected_targets, add_third_subplot, show_performance):
+    """Tables and exports of the selected targets; their widgets rerun only this fragment."""
+    selected_db, selected_analysis, selected_column, selected_agg, selected_ref, selected_group = selection
+    with fragment_rerun("data", show_performance, config_performance.get("perf_history", 50), MEMORY_PROFILE):
+        with stage("display_dataframes"):
+            display_dataframes(
+                data_dict, config_labels, selected_db, selected_analysis, selected_column,
+                selected_agg, selected_ref, selected_group, selected_targets, add_third_subplot,
+                source=(str(data_path), data_path.stat().st_mtime),
+                page_size=config_performance.get("table_page_size", 1000)
+            )
+        with stage("export_section"):
+            export_section(
+                data_dict, config_labels,
+                {"db": selected_db, "analysis": selected_analysis, "column": selected_column,
+                 "agg": selected_agg, "ref": selected_ref, "group": selected_group},
+                selected_targets
+            )
 
 # Entry point
 if __name__ == "__main__":
     # Set page configuration
     st.set_page_config(page_title="Data Visualization Tool", layout="wide", page_icon="📊")
+    # The data store is shared by every session; derived frames must never write into it
+    enable_copy_on_write()
+
+    # Stage timings of each rerun, shown in the sidebar when the page is opened with ?perf=1
+    show_performance = MEMORY_PROFILE is not None or performance_enabled(config_performance.get("perf_query_param", "perf"))
+    with recorded_rerun(show_performance, config_performance.get("perf_history", 50), MEMORY_PROFILE):
+        # Decoded data files kept resident per process; least recently used ones are evicted beyond it
+        memory_budget = config_performance.get("memory_budget_mb")
+        memory_budget = None if memory_budget is None else int(memory_budget * 2**20)
 
-    selected_file = setup_sidebar(config_labels, IMAGE_PATH, DATA_PATH)
-    data_dict = load_data_dict(Path(DATA_PATH) / selected_file)
+        # Background loading of the data files into the shared store, started once per process
+        prewarm = start_prewarm(
+            DATA_PATH, tuple(config_performance.get("prewarm_files", ())), config_performance.get("prewarm_recent", 2),
+            dictionary_aggregated_values, config_performance.get("prewarm_workers", 2), memory_budget
+        ) if config_performance.get("prewarm") else None
 
-    if not data_dict:
-        st.stop()
+        with stage("setup_sidebar"):
+            selected_file = setup_sidebar(config_labels, IMAGE_PATH, DATA_PATH)
+        data_path = Path(DATA_PATH) / selected_file
+        if prewarm is not None:
+            prewarm_caption = prewarm_summary(prewarm)
+            if prewarm_caption:
+                st.sidebar.caption(prewarm_caption)
+            if is_warming(prewarm, selected_file):
+                # Progress instead of a blocking load; the fragment reruns the app once the file is ready
+                prewarm_progress(prewarm, selected_file)
+                st.stop()
+        modified = data_path.stat().st_mtime if data_path.is_file() else None
+        with stage("load_data_store"):
+            # One read-only data_dict per process, shared by reference across sessions
+            data_dict = get_data_store(data_path, dictionary_aggregated_values, modified, memory_budget)
 
-    (
-        selected_db, selected_analysis, selected_column, selected_agg, selected_ref,
-        selected_group, selected_targets, var_y_type, y0
-    ) = select_config(data_dict, config_labels, analysis_explanations, dictionary_aggregated_values)
+        if not data_dict:
+            st.stop()
+        record_data_size(selected_file, data_dict)
+        with stage("load_data_index"):
+            data_index = load_data_index(data_path, dictionary_aggregated_values, modified)
 
-    fig_plotly, add_third_subplot = create_figure(
-        data_dict, config_labels, config_colors, custom_xticks,
-        selected_db, selected_analysis, selected_column, selected_agg, selected_ref,
-        selected_group, selected_targets, var_y_type, y0
-    )
+        with stage("select_config"):
+            selection = select_data_config(data_dict, config_labels, analysis_explanations, data_index)
 
-    st.header(f"Variable impact for {selected_column} in {selected_db}.")
-    st.plotly_chart(fig_plotly, use_container_width=True)
+        explore_in_browser = st.sidebar.checkbox(
+            config_labels["menus"]["explore"], value=config_performance.get("client_side_exploration", False),
+            help=config_labels["help"]["explore"]
+        )
+        # Targets and var_y changes rerun only the figure fragment, the table widgets only the data fragment
+        figure_section(data_dict, data_index, data_path, selection, explore_in_browser, show_performance)
 
-    display_dataframes(
-        data_dict, config_labels, selected_db, selected_analysis, selected_column,
-        selected_agg, selected_ref, selected_group, selected_targets, add_third_subplot
-    )
+    if show_performance:
+        performance_panel(config_labels, store_stats())
@@ -0,0 +1,88 @@
+"""
+Benchmark of modelviz.aggregation.aggregate_model_data against a nested loop over
+column x grouping x agg x ref x target that bins and groups the rows again for
+every combination, which is how the entries used to be produced by hand.
+
+Both use the same bins, and the y and var_y columns are checked to agree.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import timed
+from modelviz.aggregation import ALL_GROUP, aggregate_model_data, bin_codes, column_bins
+from modelviz.keygen import key_generator
+
+COLUMNS = ["column1", "column2", "column3"]
+TARGETS = ["RP_total", "MP"]
+REFERENCES = {"ref1": "ref_a", "ref2": "ref_b"}
+GROUPS = ["group1", "group2"]
+AGGS = ("sum", "mean")
+
+def make_raw_data(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "column1": rng.lognormal(3, 0.6, n_rows),
+        "column2": rng.integers(18, 80, n_rows),
+        "column3": rng.choice(["a", "b", "c", "d"], n_rows),
+        "group1": rng.choice(["category1", "category2", "category3"], n_rows),
+        "group2": rng.choice(["x", "y"], n_rows),
+        "RP_total": rng.gamma(2, 50, n_rows),
+        "MP": rng.gamma(2, 48, n_rows),
+        "ref_a": rng.gamma(2, 50, n_rows),
+        "ref_b": rng.gamma(2, 52, n_rows),
+    })
+
+def nested_loop(raw, bins):
+    data_dict = {}
+    for column in COLUMNS:
+        for grouping in [ALL_GROUP] + GROUPS:
+            for agg in AGGS:
+                for ref, ref_column in REFERENCES.items():
+                    for target in TARGETS:
+                        codes = bin_codes(raw[column].to_numpy(), bins[column])
+                        rows = raw[codes >= 0].assign(bin=codes[codes >= 0])
+                        if grouping == ALL_GROUP:
+                            rows = rows.assign(**{ALL_GROUP: ALL_GROUP})
+                        grouped = rows.groupby([grouping, "bin"])
+                        y = grouped[target].agg(agg)
+                        y_ref = grouped[ref_column].agg(agg)
+                        df = pd.DataFrame({
+                            "x": np.asarray(bins[column]["x"])[y.index.get_level_values("bin")],
+                            "y": y.to_numpy(),
+                            "var_y": (100 * (y - y_ref) / y_ref).to_numpy(),
+                            "group": y.index.get_level_values(0),
+                        })
+                        params = {"db": "db1", "analysis": "analysis1", "column": column, "agg": agg,
+                                  "ref": ref, "group": grouping, "target": target}
+                        data_dict[key_generator(params, preserve_types=True)] = df
+    return data_dict
+
+def main():
+    print(f"{'rows':>9} {'nested loop [s]':>16} {'engine [s]':>11} {'chunked [s]':>12} {'speedup':>8} {'max rel diff':>13}")
+    for n_rows in (10**5, 10**6, 4 * 10**6):
+        raw = make_raw_data(n_rows)
+        bins = column_bins(raw, COLUMNS)
+        kwargs = dict(columns=COLUMNS, targets=TARGETS, references=REFERENCES, groups=GROUPS, aggs=AGGS, bins=bins)
+        loop_time, expected = timed(nested_loop, raw, bins, repeat=1)
+        engine_time, result = timed(aggregate_model_data, raw, **kwargs)
+        chunk_size = max(n_rows // 8, 1)
+        chunks = [raw.iloc[start:start + chunk_size] for start in range(0, n_rows, chunk_size)]
+        chunked_time, _ = timed(aggregate_model_data, chunks, **kwargs)
+
+        diff = 0.0
+        for key, df in expected.items():
+            for name in ("y", "var_y"):
+                reference = df[name].to_numpy()
+                diff = max(diff, np.abs(result[key]["df"][name].to_numpy() - reference).max() / np.abs(reference).max())
+        print(f"{n_rows:>9} {loop_time:>16.3f} {engine_time:>11.3f} {chunked_time:>12.3f} {loop_time / engine_time:>7.1f}x {diff:>13.2e}")
+
+    # Choosing the bins is part of a full run
+    raw = make_raw_data(10**6)
+    start = time.perf_counter()
+    aggregate_model_data(raw, COLUMNS, TARGETS, REFERENCES, GROUPS, AGGS)
+    print(f"1e6 rows including the choice of bins: {time.perf_counter() - start:.3f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Benchmark of consolidated line traces (one trace per target and subplot) against
+one trace per target-group pair: trace count, build time and payload size.
+"""
+import plotly.io as pio
+
+from common import SELECTION, make_data_dict, timed
+from app.config import config_labels, config_colors, dictionary_aggregated_values
+from modelviz.figure_spec import build_figure_spec, figure_from_spec
+
+SIZES = [
+    # (targets, groups, points per group)
+    (5, 10, 100),
+    (20, 30, 100),
+    (20, 30, 1000),
+]
+
+def build(data_dict, targets, consolidate):
+    spec, _ = build_figure_spec(
+        data_dict, config_labels, config_colors, {},
+        SELECTION["db"], SELECTION["analysis"], SELECTION["column"], SELECTION["agg"],
+        SELECTION["ref"], "group1", targets, "mean", dictionary_aggregated_values["mean"],
+        config_performance={"consolidate_traces": consolidate, "consolidate_trace_threshold": None},
+    )
+    return spec, pio.to_json(figure_from_spec(spec), validate=False)
+
+def main():
+    print(f"{'targets':>7} {'groups':>6} {'points':>7} {'mode':>13} {'traces':>7} {'build+json [s]':>15} {'payload [MB]':>13}")
+    for n_targets, n_groups, n_points in SIZES:
+        data_dict = make_data_dict(n_targets, n_groups, n_points)
+        targets = [f"target{t}" for t in range(n_targets)]
+        for consolidate in (False, True):
+            elapsed, (spec, payload) = timed(build, data_dict, targets, consolidate)
+            mode = "consolidated" if consolidate else "per group"
+            print(
+                f"{n_targets:>7} {n_groups:>6} {n_points:>7} {mode:>13} {len(spec['data']):>7} "
+                f"{elapsed:>15.3f} {len(payload) / 1e6:>13.2f}"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Benchmark of the lightweight figure spec builder against create_figure.
+
+Both paths are timed up to the JSON string that st.plotly_chart sends to the
+browser; tests/test_figure_spec.py checks that they produce the same figure.
+"""
+import json
+
+import plotly.io as pio
+
+from common import SELECTION, make_data_dict, timed
+from app.config import config_labels, config_colors, dictionary_aggregated_values
+from modelviz.plotting import create_figure
+from modelviz.figure_spec import build_figure_spec, figure_from_spec
+
+SIZES = [
+    # (targets, groups, points per group)
+    (1, 3, 100),
+    (5, 10, 100),
+    (10, 30, 100),
+    (20, 30, 500),
+]
+
+def graph_objects_path(data_dict, targets):
+    fig, _ = create_figure(
+        data_dict, config_labels, config_colors, {},
+        SELECTION["db"], SELECTION["analysis"], SELECTION["column"], SELECTION["agg"],
+        SELECTION["ref"], "group1", targets, "mean", dictionary_aggregated_values["mean"],
+    )
+    return pio.to_json(fig, validate=False)
+
+def spec_path(data_dict, targets):
+    spec, _ = build_figure_spec(
+        data_dict, config_labels, config_colors, {},
+        SELECTION["db"], SELECTION["analysis"], SELECTION["column"], SELECTION["agg"],
+        SELECTION["ref"], "group1", targets, "mean", dictionary_aggregated_values["mean"],
+    )
+    return pio.to_json(figure_from_spec(spec), validate=False)
+
+def main():
+    print(f"{'targets':>7} {'groups':>6} {'points':>7} {'traces':>7} {'go [s]':>8} {'spec [s]':>9} {'speedup':>8}")
+    for n_targets, n_groups, n_points in SIZES:
+        data_dict = make_data_dict(n_targets, n_groups, n_points)
+        targets = [f"target{t}" for t in range(n_targets)]
+        go_time, go_json = timed(graph_objects_path, data_dict, targets)
+        spec_time, _ = timed(spec_path, data_dict, targets)
+        print(
+            f"{n_targets:>7} {n_groups:>6} {n_points:>7} {len(json.loads(go_json)['data']):>7} "
+            f"{go_time:>8.3f} {spec_time:>9.3f} {go_time / spec_time:>7.1f}x"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Benchmark of modelviz.histogram.smart_histogram against the notebook version
+(notebooks/histogram_test.ipynb), which loops over categories and calls
+np.percentile several times. The outputs are checked to agree.
+"""
+import json
+import time
+
+import numpy as np
+
+from common import ROOT, timed
+from modelviz.histogram import smart_histogram, smart_histograms
+
+def load_notebook_smart_histogram():
+    # The reference is the function defined in the first cell of the notebook
+    notebook = json.loads((ROOT / "notebooks" / "histogram_test.ipynb").read_text())
+    source = "".join(notebook["cells"][0]["source"])
+    namespace = {}
+    exec(source[:source.index("# Example usage")], namespace)
+    return namespace["smart_histogram"]
+
+CASES = {
+    "lognormal": lambda rng, n: rng.lognormal(2, 0.5, n),
+    "integers": lambda rng, n: rng.integers(0, 500, n),
+    "categories": lambda rng, n: rng.integers(0, 30, n),
+}
+
+def main():
+    notebook_smart_histogram = load_notebook_smart_histogram()
+    rng = np.random.default_rng(0)
+    print(f"{'case':>10} {'n':>10} {'notebook [s]':>13} {'module [s]':>11} {'speedup':>8} {'max |dh|':>9}")
+    for n in (10**5, 10**6, 10**7):
+        for case, make in CASES.items():
+            v = make(rng, n)
+            categorical = case == "categories"
+            ref_time, (h_ref, x_ref) = timed(notebook_smart_histogram, v, categorical, repeat=1)
+            new_time, (h_new, x_new) = timed(smart_histogram, v, categorical)
+            # Quartiles are taken on the trimmed rank range, so counts agree up to ties at the bounds
+            diff = np.abs(h_ref - h_new).max() if len(h_ref) == len(h_new) else float("nan")
+            print(f"{case:>10} {n:>10} {ref_time:>13.3f} {new_time:>11.3f} {ref_time / new_time:>7.1f}x {diff:>9}")
+
+    columns = {f"col{i}": rng.lognormal(2, 0.5, 10**6) for i in range(8)}
+    start = time.perf_counter()
+    for values in columns.values():
+        smart_histogram(values)
+    serial = time.perf_counter() - start
+    batch, _ = timed(smart_histograms, columns, repeat=1)
+    print(f"8 columns x 1e6: serial {serial:.3f} s, smart_histograms {batch:.3f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark of the incremental refresh (modelviz.incremental) against regenerating the
+whole data file.
+
+Two analyses each receive one raw partition per day. On the last day, a new
+partition of analysis1 arrives and is handled in two ways:
+  - full refresh: aggregate_model_data over all partitions of both analyses, then
+    write_data_file;
+  - incremental: add_partition for the new partition, then update_data_file on a
+    .jsonl file, which rewrites only the lines of the affected entries.
+Both use the bins frozen on the first day, so the two data files must be identical.
+"""
+import tempfile
+import time
+from pathlib import Path
+
+from bench_aggregation import AGGS, COLUMNS, GROUPS, REFERENCES, TARGETS, make_raw_data
+from modelviz.aggregation import aggregate_model_data, column_bins
+from modelviz.data_loader import read_raw_data_file, update_data_file, write_data_file
+from modelviz.incremental import add_partition, create_store, store_entries
+
+ANALYSES = ["analysis1", "analysis2"]
+
+def main(n_days=10, rows_per_day=500_000):
+    partitions = {
+        analysis: [make_raw_data(rows_per_day, seed=100 * i + day) for day in range(n_days)]
+        for i, analysis in enumerate(ANALYSES)
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        store_dir, incremental_file, full_file = tmp / "store", tmp / "incremental.jsonl", tmp / "full.json"
+
+        # Days before the last one: fill the stores and write the initial file
+        for analysis in ANALYSES:
+            create_store(store_dir, "db1", analysis, COLUMNS, TARGETS, REFERENCES, GROUPS, AGGS)
+            for day, partition in enumerate(partitions[analysis][:-1]):
+                add_partition(store_dir, "db1", analysis, f"day{day}", partition)
+        write_data_file(store_entries(store_dir, "db1", "analysis1"), incremental_file)
+        update_data_file(incremental_file, store_entries(store_dir, "db1", "analysis2"))
+
+        # Last day: a new partition of analysis1
+        start = time.perf_counter()
+        entries = add_partition(store_dir, "db1", "analysis1", f"day{n_days - 1}", partitions["analysis1"][-1])
+        aggregated = time.perf_counter()
+        update_data_file(incremental_file, entries)
+        incremental_time = time.perf_counter() - start
+        print(f"incremental: {incremental_time:.2f} s (aggregation {aggregated - start:.2f} s, {len(entries)} entries rewritten)")
+
+        start = time.perf_counter()
+        data_dict = {}
+        for analysis in ANALYSES:
+            # Only analysis1 received a partition on the last day
+            available = partitions[analysis] if analysis == "analysis1" else partitions[analysis][:-1]
+            bins = column_bins(available[0], COLUMNS)
+            data_dict.update(aggregate_model_data(
+                available, COLUMNS, TARGETS, REFERENCES, GROUPS, AGGS,
+                analysis=analysis, bins=bins
+            ))
+        write_data_file(data_dict, full_file)
+        full_time = time.perf_counter() - start
+        print(f"full refresh: {full_time:.2f} s ({len(data_dict)} entries written)")
+        print(f"speedup: {full_time / incremental_time:.1f}x")
+
+        full = read_raw_data_file(full_file)
+        incremental = read_raw_data_file(incremental_file)
+        assert full.keys() == incremental.keys()
+        identical = sum(full[key] == incremental[key] for key in full)
+        print(f"identical entries: {identical}/{len(full)}")
+
+if __name__ == "__main__":
+    main()
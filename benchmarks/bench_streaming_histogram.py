@@ -0,0 +1,47 @@
+"""
+Benchmark of modelviz.streaming_histogram against the in-memory smart_histogram.
+
+The column is fed in chunks to several partial histograms (as separate worker
+processes would) which are then merged. For each rank_error the script reports the
+time, the worst-case rank error bound, whether the bin edges agree and the largest
+count difference relative to the total.
+"""
+import numpy as np
+
+from common import timed
+from modelviz.histogram import smart_histogram
+from modelviz.streaming_histogram import histogram_error, histogram_from_chunks, histogram_result, merge_histograms
+
+CASES = {
+    "lognormal": lambda rng, n: rng.lognormal(2, 0.5, n),
+    "normal": lambda rng, n: rng.normal(0, 1, n),
+    "integers": lambda rng, n: rng.integers(0, 500, n),
+}
+
+def streamed(v, rank_error, n_workers=4, n_chunks=16):
+    partials = [
+        histogram_from_chunks(np.array_split(part, n_chunks), rank_error=rank_error)
+        for part in np.array_split(v, n_workers)
+    ]
+    state = partials[0]
+    for partial in partials[1:]:
+        merge_histograms(state, partial)
+    return state
+
+def main():
+    rng = np.random.default_rng(0)
+    n = 10**7
+    print(f"{'case':>10} {'rank_error':>10} {'exact [s]':>10} {'stream [s]':>11} {'bound':>9} {'edges':>6} {'max |dh|/n':>11}")
+    for case, make in CASES.items():
+        v = make(rng, n)
+        exact_time, (h_ref, x_ref) = timed(smart_histogram, v, repeat=1)
+        for rank_error in (0.01, 0.001, 0.0001):
+            stream_time, state = timed(streamed, v, rank_error, repeat=1)
+            h, x = histogram_result(state)
+            same_edges = len(x) == len(x_ref) and np.allclose(x, x_ref)
+            diff = np.abs(h - h_ref).max() / n if same_edges else float("nan")
+            bound = histogram_error(state)["rank"]
+            print(f"{case:>10} {rank_error:>10} {exact_time:>10.3f} {stream_time:>11.3f} {bound:>9.2e} {str(same_edges):>6} {diff:>11.2e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+End-to-end benchmark suite of the app's stages, run headless.
+
+For every case of a matrix of points per entry x categories per grouping x targets,
+a synthetic data file is generated (modelviz.synthetic) and each stage is timed (best
+of --repeat runs) and traced with tracemalloc for its peak allocation:
+
+    load_data_store    load_data_store (cache cleared before each run)
+    get_data_store     get_data_store of the loaded file, as on every rerun of the app
+    load_data_index    load_data_index (cache cleared before each run)
+    targets            the target lookup of select_figure_config in the key index
+    select_config      select_data_config and select_figure_config in Streamlit's
+                       AppTest harness (warm cache rerun)
+    create_figure      create_figure for the first targets of the grouping
+    figure_spec        build_figure_spec, the lightweight path of viz5
+    csv                the CSV payloads of the download buttons (generated on click)
+    display_dataframes display_dataframes in the AppTest harness (warm cache rerun)
+
+Results are written as JSON; with a baseline file each stage is compared to it and
+slower stages beyond the tolerance are reported as regressions.
+
+    python benchmarks/bench_suite.py --quick
+    python benchmarks/bench_suite.py --save-baseline
+    python benchmarks/bench_suite.py --baseline benchmarks/results/baseline.json
+"""
+import argparse
+import itertools
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly
+import streamlit
+
+from common import ROOT
+from streamlit.testing.v1 import AppTest
+from app.config import config_colors, config_labels, config_performance, custom_xticks, dictionary_aggregated_values
+from modelviz.data_loader import load_data_index, load_data_store
+from modelviz.dataframe_display import csv_payload
+from modelviz.figure_spec import build_figure_spec
+from modelviz.keygen import key_generator
+from modelviz.plotting import create_figure
+from modelviz.store_manager import get_data_store
+from modelviz.synthetic import generate_data_file, parameter_values
+
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+SELECTION = {"db": "db1", "analysis": "analysis1", "column": "column1", "agg": "sum", "ref": "ref1", "group": "group1"}
+# Targets drawn in the figure and display stages
+MAX_SELECTED_TARGETS = 8
+
+def select_config_script(data_file, modified):
+    import streamlit as st
+    from app.config import analysis_explanations, config_labels, dictionary_aggregated_values
+    from modelviz.data_loader import load_data_index, load_data_store
+    from modelviz.sidebar_setup import select_data_config, select_figure_config
+    data_dict = load_data_store(data_file, dictionary_aggregated_values, modified)
+    data_index = load_data_index(data_file, dictionary_aggregated_values, modified)
+    selection = select_data_config(data_dict, config_labels, analysis_explanations, data_index)
+    select_figure_config(
+        data_dict, config_labels, dictionary_aggregated_values, *selection, container=st, data_index=data_index
+    )
+
+def display_dataframes_script(data_file, modified, selection, targets):
+    from app.config import config_labels, dictionary_aggregated_values
+    from modelviz.data_loader import load_data_store
+    from modelviz.dataframe_display import display_dataframes
+    data_dict = load_data_store(data_file, dictionary_aggregated_values, modified)
+    display_dataframes(
+        data_dict, config_labels, selection["db"], selection["analysis"], selection["column"],
+        selection["agg"], selection["ref"], selection["group"], targets, True
+    )
+
+def measure(func, repeat):
+    """Best wall time over repeat runs, then the peak traced allocation of one more run."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"time_s": best, "peak_bytes": peak}
+
+def app_test(script, args):
+    at = AppTest.from_function(script, args=args, default_timeout=600)
+    # The first run fills st.cache_data; the measured runs are reruns, as in the app
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"{script.__name__} failed: {at.exception[0].message}")
+    return at.run
+
+def run_case(data_file, repeat):
+    stages = {}
+    # The arguments of the app's loader calls, so the warm stages hit the same cache entries
+    modified = data_file.stat().st_mtime
+    load_args = (str(data_file), dictionary_aggregated_values, modified)
+    load_data_store.clear()
+    load_data_index.clear()
+    data_dict = get_data_store(*load_args)
+    data_index = load_data_index(*load_args)
+    targets = data_index["items"].get(tuple(SELECTION.values()), [])[:MAX_SELECTED_TARGETS]
+
+    def load():
+        load_data_store.clear()
+        load_data_store(*load_args)
+
+    def index():
+        load_data_index.clear()
+        load_data_index(*load_args)
+
+    def csv():
+        for target in targets:
+            entry = data_dict[key_generator(dict(SELECTION, target=target), preserve_types=True)]
+            for name in ("df", "dfh", "dfhg"):
+                csv_payload(entry[name])
+
+    figure_args = (
+        data_dict, config_labels, config_colors, custom_xticks, *SELECTION.values(), targets, "min", None
+    )
+    stage_funcs = {
+        "load_data_store": load,
+        "get_data_store": lambda: get_data_store(*load_args),
+        "load_data_index": index,
+        "targets": lambda: data_index["items"].get(tuple(SELECTION.values()), []),
+        "select_config": app_test(select_config_script, (str(data_file), modified)),
+        "create_figure": lambda: create_figure(*figure_args, config_performance=config_performance),
+        "figure_spec": lambda: build_figure_spec(*figure_args, config_performance=config_performance),
+        "csv": csv,
+        "display_dataframes": app_test(display_dataframes_script, (str(data_file), modified, SELECTION, targets)),
+    }
+    for stage, func in stage_funcs.items():
+        stages[stage] = measure(func, repeat)
+    return stages, len(data_dict)
+
+def compare(results, baseline, tolerance):
+    """Rows of (case, stage, time, baseline time, ratio, regression) for the shared stages."""
+    baseline_times = {
+        (json.dumps(result["case"], sort_keys=True), stage): values["time_s"]
+        for result in baseline["results"] for stage, values in result["stages"].items()
+    }
+    rows = []
+    for result in results:
+        case = json.dumps(result["case"], sort_keys=True)
+        for stage, values in result["stages"].items():
+            reference = baseline_times.get((case, stage))
+            if reference:
+                ratio = values["time_s"] / reference
+                rows.append((result["case"], stage, values["time_s"], reference, ratio, ratio > 1 + tolerance))
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the app's stages over a matrix of data sizes.")
+    parser.add_argument("--points", type=int, nargs="+", default=[100, 1000], help="Points per group of an entry")
+    parser.add_argument("--categories", type=int, nargs="+", default=[3, 12], help="Categories per grouping")
+    parser.add_argument("--targets", type=int, nargs="+", default=[4, 32], help="Targets per selection")
+    parser.add_argument("--quick", action="store_true", help="Smallest case only")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=RESULTS_DIR / "latest.json")
+    parser.add_argument("--baseline", type=Path, default=None, help="Results file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Also write the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before a regression is reported")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.points, args.categories, args.targets = args.points[:1], args.categories[:1], args.targets[:1]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_points, n_categories, n_targets in itertools.product(args.points, args.categories, args.targets):
+            case = {"points": n_points, "categories": n_categories, "targets": n_targets}
+            data_file = Path(tmp) / f"p{n_points}_c{n_categories}_t{n_targets}.json"
+            values = parameter_values(dbs=1, analyses=1, columns=2, refs=1, groups=2, targets=n_targets)
+            generate_data_file(data_file, values, n_points=n_points, n_categories=n_categories, workers=1)
+            stages, n_entries = run_case(data_file, args.repeat)
+            case["entries"] = n_entries
+            results.append({"case": case, "file_bytes": data_file.stat().st_size, "stages": stages})
+            print(f"\n{case}")
+            for stage, values in stages.items():
+                print(f"  {stage:>18} {values['time_s'] * 1e3:>10.2f} ms {values['peak_bytes'] / 2**20:>9.2f} MiB")
+
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "plotly": plotly.__version__,
+            "streamlit": streamlit.__version__,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"\nResults written to {args.output}")
+    if args.save_baseline:
+        (RESULTS_DIR / "baseline.json").write_text(json.dumps(report, indent=2))
+        print(f"Baseline written to {RESULTS_DIR / 'baseline.json'}")
+
+    if args.baseline:
+        rows = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        print(f"\nComparison with {args.baseline} (tolerance {args.tolerance:.0%}):")
+        for case, stage, current, reference, ratio, regression in rows:
+            flag = "  REGRESSION" if regression else ""
+            print(f"  {str(case):>60} {stage:>18} {current * 1e3:>9.2f} ms vs {reference * 1e3:>9.2f} ms ({ratio:.2f}x){flag}")
+        return 1 if any(row[-1] for row in rows) else 0
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
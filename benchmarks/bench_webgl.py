@@ -0,0 +1,47 @@
+"""
+Benchmark of create_figure with SVG (go.Scatter) vs WebGL (go.Scattergl) line traces.
+
+Reports the server build time and the JSON payload size sent to the browser
+for increasing numbers of targets, groups and points. Both trace types serialize
+to the same payload; the gain of WebGL is in browser rendering, which is not
+measured here.
+"""
+import plotly.io as pio
+
+from common import SELECTION, make_data_dict, timed
+from app.config import config_labels, config_colors, dictionary_aggregated_values
+from modelviz.plotting import create_figure
+
+SIZES = [
+    # (targets, groups, points per group)
+    (1, 3, 100),
+    (5, 10, 1000),
+    (10, 20, 2000),
+    (20, 30, 5000),
+]
+
+MODES = {
+    "svg": {"webgl_point_threshold": None, "webgl_trace_threshold": None},
+    "webgl": {"webgl_point_threshold": 0, "webgl_trace_threshold": None},
+}
+
+def main():
+    print(f"{'targets':>7} {'groups':>6} {'points':>7} {'mode':>6} {'build [s]':>10} {'json [s]':>9} {'payload [MB]':>13}")
+    for n_targets, n_groups, n_points in SIZES:
+        data_dict = make_data_dict(n_targets, n_groups, n_points)
+        targets = [f"target{t}" for t in range(n_targets)]
+        for mode, config_performance in MODES.items():
+            build_time, (fig, _) = timed(
+                create_figure, data_dict, config_labels, config_colors, {},
+                SELECTION["db"], SELECTION["analysis"], SELECTION["column"], SELECTION["agg"],
+                SELECTION["ref"], "group1", targets, "mean", dictionary_aggregated_values["mean"],
+                config_performance=config_performance,
+            )
+            json_time, payload = timed(pio.to_json, fig, validate=False)
+            print(
+                f"{n_targets:>7} {n_groups:>6} {n_points:>7} {mode:>6} "
+                f"{build_time:>10.3f} {json_time:>9.3f} {len(payload) / 1e6:>13.2f}"
+            )
+
+if __name__ == "__main__":
+    main()
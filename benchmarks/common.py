@@ -0,0 +1,63 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Run the scripts from the repository root, e.g. `python benchmarks/bench_webgl.py`.
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+for path in (ROOT, ROOT / "src"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from modelviz.keygen import key_generator  # noqa: E402
+
+SELECTION = {
+    "db": "db1",
+    "analysis": "analysis1",
+    "column": "column1",
+    "agg": "sum",
+    "ref": "ref1",
+}
+
+def make_data_dict(n_targets, n_groups, n_points, group="group1", seed=0):
+    """
+    Builds an in-memory data_dict (DataFrames already decoded) for one selection
+    with n_targets targets, each with n_groups groups of n_points points.
+    """
+    rng = np.random.default_rng(seed)
+    x = np.arange(1, n_points + 1)
+    group_labels = [f"category{i}" for i in range(1, n_groups + 1)]
+    data_dict = {}
+    for t in range(n_targets):
+        target = f"target{t}"
+        df = pd.DataFrame({
+            "x": np.tile(x, n_groups),
+            "y": rng.lognormal(2, 0.5, n_points * n_groups),
+            "var_y": rng.lognormal(1.5, 0.4, n_points * n_groups),
+            "group": np.repeat(group_labels, n_points),
+        })
+        dfh = pd.DataFrame({"x": x, "y": rng.random(n_points) * 10})
+        dfhg = pd.DataFrame({
+            "x": np.tile(x, n_groups),
+            "group": np.repeat(group_labels, n_points),
+            "y": rng.random(n_points * n_groups) * 10,
+        })
+        key = key_generator(dict(SELECTION, group=group, target=target), preserve_types=True)
+        data_dict[key] = {"df": df, "dfh": dfh, "dfhg": dfhg}
+    return data_dict
+
+def timed(func, *args, repeat=3, **kwargs):
+    """Returns (best wall time in seconds, last result) over `repeat` calls."""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
@@ -0,0 +1,258 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from .histogram import smart_histograms
+from .keygen import key_generator
+from .streaming_histogram import histogram_result, streaming_histogram, update_histogram
+
+ALL_GROUP = 'all'
+# Statistics kept per (bin, group) and how the partial results of two chunks are merged
+PARTIAL_STATISTICS = {"size": "sum", "count": "sum", "sum": "sum", "min": "min", "max": "max"}
+AGGREGATIONS = ("sum", "mean", "count", "min", "max")
+
+def aggregate_model_data(data, columns, targets, references, groups=(), aggs=("sum", "mean"), db="db1", analysis="analysis1", categorical=(), bins=None, trim=0.025, rank_error=0.001, max_workers=None):
+    """
+    Builds the data_dict of the app (df, dfh and dfhg per key) from raw model data,
+    for every column x agg x ref x group x target.
+
+    For each column, the rows are binned once (smart_histogram bins, categories for
+    categorical columns) and every target, reference, agg and grouping is aggregated
+    from the same bin codes (bincount reductions over dense (bin, group) keys). Columns
+    are processed in a thread pool. The result of each (column, grouping) is a set of mergeable partial
+    statistics (see aggregate_chunk), so chunked input is aggregated chunk by chunk.
+
+    - df: x (left bin edge or category), y (agg of the target), var_y
+      (100 * (y - y_ref) / y_ref, with y_ref the same agg of the reference column)
+      and group.
+    - dfh: rows per bin over all groups. dfhg: rows per bin and group.
+    Rows outside the trimmed range of the bins (or in trimmed categories) are left out,
+    as in the histograms.
+
+    Args:
+        data (pd.DataFrame, list or callable): The raw rows, as a DataFrame, a list of
+            DataFrame chunks or a callable returning a new iterable of chunks (e.g.
+            lambda: pd.read_csv(path, chunksize=10**6)). A one-pass iterator of chunks
+            is accepted when bins are given for every column.
+        columns (list): Columns to bin (the 'column' of the keys).
+        targets (list): Columns to aggregate (the 'target' of the keys).
+        references (dict): Reference name (the 'ref' of the keys) -> column aggregated
+            as the reference of var_y.
+        groups (iterable): Grouping columns; the grouping 'all' is always included.
+        aggs (iterable): Aggregations among AGGREGATIONS.
+        db (str), analysis (str): Values of the 'db' and 'analysis' keys.
+        categorical (iterable): Columns binned as categories (non-numeric columns are
+            always categorical).
+        bins (dict): Precomputed bins (see column_bins) of some or all columns.
+        trim (float), rank_error (float): Passed to the histograms that choose the bins.
+        max_workers (int): Threads to use; None lets the executor decide.
+
+    Returns:
+        dict: key -> {'df', 'dfh', 'dfhg'} DataFrames, as read_data_file before the
+              var_y precomputation. Save it with data_loader.write_data_file.
+    """
+    unknown = set(aggs) - set(AGGREGATIONS)
+    if unknown:
+        raise ValueError(f"Unsupported aggregations: {sorted(unknown)}. Use any of {AGGREGATIONS}.")
+
+    chunks, reiterable = _chunk_source(data)
+    bins = dict(bins or {})
+    missing = [column for column in columns if column not in bins]
+    if missing:
+        if not reiterable:
+            raise ValueError("Bins must be given for a one-pass iterator of chunks; pass a callable returning the chunks instead.")
+        bins.update(column_bins(chunks() if not isinstance(data, pd.DataFrame) else data, missing, categorical, trim, rank_error, max_workers))
+
+    value_columns = list(dict.fromkeys(list(targets) + list(references.values())))
+    partials = {}
+    for chunk in chunks():
+        for key, partial in aggregate_chunk(chunk, bins, columns, value_columns, groups, max_workers).items():
+            partials[key] = merge_partials([partials[key], partial]) if key in partials else partial
+    return build_data_dict(partials, bins, targets, references, aggs, db, analysis)
+
+def column_bins(data, columns, categorical=(), trim=0.025, rank_error=0.001, max_workers=None):
+    """
+    Chooses the bins of each column with the smart_histogram rules: exactly from a
+    DataFrame, or with streaming histograms over an iterable of chunks.
+
+    Returns:
+        dict: column -> {'categorical': bool, 'x': categories or bin edges}
+    """
+    categorical = set(categorical)
+
+    def is_categorical(column, values):
+        return column in categorical or not pd.api.types.is_numeric_dtype(values)
+
+    if isinstance(data, pd.DataFrame):
+        flags = {column: is_categorical(column, data[column]) for column in columns}
+        histograms = smart_histograms(
+            data[columns], categorical=[column for column, flag in flags.items() if flag],
+            trim=trim, max_workers=max_workers
+        )
+        return {column: {"categorical": flags[column], "x": x} for column, (_, x) in histograms.items()}
+
+    states = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for chunk in data:
+            for column in columns:
+                if column not in states:
+                    states[column] = streaming_histogram(is_categorical(column, chunk[column]), trim, rank_error)
+            list(pool.map(lambda column: update_histogram(states[column], chunk[column].to_numpy()), columns))
+    return {
+        column: {"categorical": state["categorical"], "x": histogram_result(state)[1]}
+        for column, state in states.items()
+    }
+
+def bin_codes(values, column_bin):
+    """
+    Bin index of each value for the bins of column_bins; -1 for values outside the
+    bins (trimmed values and categories, NaN).
+    """
+    x = column_bin["x"]
+    if column_bin["categorical"]:
+        return pd.Categorical(values, categories=x).codes.astype(np.int64)
+
+    values = np.asarray(values, dtype=float)
+    n_bins = len(x) - 1
+    codes = np.searchsorted(x, values, side='right') - 1
+    # The last bin includes its right edge, as in np.histogram
+    codes[values == x[-1]] = n_bins - 1
+    codes[(values < x[0]) | (values > x[-1]) | np.isnan(values)] = -1
+    return codes
+
+def aggregate_chunk(chunk, bins, columns, value_columns, groups=(), max_workers=None):
+    """
+    Partial statistics of one chunk of rows for each (column, grouping).
+
+    Each partial is a dict of PARTIAL_STATISTICS frames indexed by (bin, group): 'size'
+    (rows), and the 'count' (non-NaN), 'sum', 'min' and 'max' of each value column.
+    Partials of different chunks are combined with merge_partials.
+    """
+    # (value column, row) layout: each value column is contiguous
+    values = np.ascontiguousarray(chunk[value_columns].to_numpy(dtype=float).T)
+    # Group codes are shared by every column
+    groupings = {ALL_GROUP: (np.zeros(len(chunk), dtype=np.int64), np.array([ALL_GROUP], dtype=object))}
+    for grouping in groups:
+        groupings[grouping] = pd.factorize(chunk[grouping], sort=True)
+
+    def aggregate_column(column):
+        # One binning pass per column, shared by every grouping, target and agg
+        codes = bin_codes(chunk[column].to_numpy(), bins[column])
+        valid = codes >= 0
+        n_bins = max(len(bins[column]["x"]) - (0 if bins[column]["categorical"] else 1), 1)
+        column_values = values[:, valid]
+        return {
+            (column, grouping): _partial_statistics(
+                column_values, value_columns, codes[valid], n_bins, group_codes[valid], np.asarray(labels, dtype=object)
+            )
+            for grouping, (group_codes, labels) in groupings.items()
+        }
+
+    partials = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for result in pool.map(aggregate_column, columns):
+            partials.update(result)
+    return partials
+
+def merge_partials(partials):
+    """Combines the partial statistics of several chunks into one."""
+    partials = list(partials)
+    if len(partials) == 1:
+        return partials[0]
+    return {
+        statistic: pd.concat([partial[statistic] for partial in partials]).groupby(level=[0, 1], sort=True).agg(func)
+        for statistic, func in PARTIAL_STATISTICS.items()
+    }
+
+def build_data_dict(partials, bins, targets, references, aggs, db, analysis):
+    """
+    Turns the merged partial statistics of aggregate_chunk into the data_dict entries
+    (see aggregate_model_data).
+    """
+    data_dict = {}
+    for (column, grouping), statistics in partials.items():
+        x_values = np.asarray(bins[column]["x"])
+        # Group-major order, like the mock data: each group lists all of its bins
+        statistics = {name: frame.reorder_levels(['group', 'bin']).sort_index() for name, frame in statistics.items()}
+        index = statistics["size"].index
+        x = x_values[index.get_level_values('bin')]
+        group = index.get_level_values('group').to_numpy()
+
+        totals = partials[(column, ALL_GROUP)]["size"]
+        dfh = pd.DataFrame({'x': x_values[totals.index.get_level_values('bin')], 'y': totals.to_numpy()})
+        dfhg = pd.DataFrame({'x': x, 'group': group, 'y': statistics["size"].to_numpy()})
+
+        for agg in aggs:
+            for ref, ref_column in references.items():
+                y_ref = _aggregate(statistics, agg, ref_column)
+                for target in targets:
+                    y = _aggregate(statistics, agg, target)
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        var_y = 100 * (y - y_ref) / y_ref
+                    params = {
+                        "db": db,
+                        "analysis": analysis,
+                        "column": column,
+                        "agg": agg,
+                        "ref": ref,
+                        "group": grouping,
+                        "target": target
+                    }
+                    data_dict[key_generator(params, preserve_types=True)] = {
+                        'df': pd.DataFrame({'x': x, 'y': y, 'var_y': var_y, 'group': group}),
+                        'dfh': dfh,
+                        'dfhg': dfhg
+                    }
+    return data_dict
+
+def _partial_statistics(values, value_columns, codes, n_bins, group_codes, labels):
+    # Dense (bin, group) keys: the statistics are plain bincount/ufunc.at reductions.
+    # NaN group labels (code -1) are left out, as in a groupby.
+    if group_codes.min(initial=0) < 0:
+        kept = group_codes >= 0
+        values, codes, group_codes = values[:, kept], codes[kept], group_codes[kept]
+    n_keys = n_bins * len(labels)
+    keys = codes * len(labels) + group_codes
+
+    size = np.bincount(keys, minlength=n_keys)
+    # One contiguous row per value column, so ufunc.at takes its fast path
+    count = np.empty((len(value_columns), n_keys), dtype=np.int64)
+    total = np.empty((len(value_columns), n_keys))
+    minimum = np.full((len(value_columns), n_keys), np.nan)
+    maximum = np.full((len(value_columns), n_keys), np.nan)
+    for j, v in enumerate(values):
+        if np.isnan(v).any():
+            not_nan = ~np.isnan(v)
+            v_keys, v = keys[not_nan], v[not_nan]
+            count[j] = np.bincount(v_keys, minlength=n_keys)
+        else:
+            v_keys = keys
+            count[j] = size
+        total[j] = np.bincount(v_keys, weights=v, minlength=n_keys)
+        np.fmin.at(minimum[j], v_keys, v)
+        np.fmax.at(maximum[j], v_keys, v)
+
+    present = np.flatnonzero(size)
+    index = pd.MultiIndex.from_arrays([present // len(labels), labels[present % len(labels)]], names=['bin', 'group'])
+    return {
+        "size": pd.Series(size[present], index=index),
+        "count": pd.DataFrame(count[:, present].T, index=index, columns=value_columns),
+        "sum": pd.DataFrame(total[:, present].T, index=index, columns=value_columns),
+        "min": pd.DataFrame(minimum[:, present].T, index=index, columns=value_columns),
+        "max": pd.DataFrame(maximum[:, present].T, index=index, columns=value_columns),
+    }
+
+def _aggregate(statistics, agg, column):
+    if agg == "mean":
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return statistics["sum"][column].to_numpy(dtype=float) / statistics["count"][column].to_numpy()
+    return statistics[agg][column].to_numpy()
+
+def _chunk_source(data):
+    # Returns a function giving the chunks, and whether it can be called more than once
+    if isinstance(data, pd.DataFrame):
+        return (lambda: [data]), True
+    if callable(data):
+        return data, True
+    if isinstance(data, (list, tuple)):
+        return (lambda: data), True
+    return (lambda: data), False
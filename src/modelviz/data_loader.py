@@ -1,37 +1,294 @@
 # filepath: /home/diego/Dropbox/DropboxGit/VizApp/src/modelviz/data_loader.py
 import streamlit as st
 import pandas as pd
+import numpy as np
 from pathlib import Path
 from PIL import Image
 from io import StringIO
 import json
+import os
+import sys
+from .keygen import build_data_index
 
 @st.cache_data(show_spinner=False)
-def load_data_dict(filename):
+def load_data_dict(filename, reference_values=None, modified=None):
     """
     Loads the flat data_dict from a JSON file, converting JSON strings back to DataFrames.
+    The var_y arrays for every reference mode are precomputed once here (see precompute_var_y).
+    modified (e.g. the file's mtime) only takes part in the cache key, so a data file
+    rewritten by update_data_file is loaded again.
     """
+    return _load_data_file(filename, reference_values)
+
+@st.cache_resource(show_spinner=False)
+def load_data_store(filename, reference_values=None, modified=None, _progress=None):
+    """
+    Like load_data_dict, but the decoded data_dict is held once per process and
+    returned by reference to every session and rerun, instead of a pickled copy each
+    time. Its arrays are read-only (see freeze_data_dict), so callers must derive new
+    arrays or frames rather than modify the shared ones.
+    _progress is not part of the cache key, see read_data_file.
+    """
+    return freeze_data_dict(_load_data_file(filename, reference_values, _progress))
+
+@st.cache_resource(show_spinner=False)
+def load_data_index(filename, reference_values=None, modified=None):
+    """
+    The key index (see keygen.build_data_index) of the store of a data file, built
+    once per process. Takes the arguments of load_data_store.
+    """
+    return build_data_index(load_data_store(filename, reference_values, modified))
+
+def _load_data_file(filename, reference_values, progress=None):
     try:
         file_path = Path(filename)
         if not file_path.is_file():
             st.error(f"Data file not found at path: {filename}")
             return {}
 
-        with open(filename, 'r') as f:
-            data_dict_json = json.load(f)
-
-        # Convert JSON strings to DataFrames for each entry
-        for key, entry in data_dict_json.items():
-            entry['df'] = pd.read_json(StringIO(entry['df']), orient='split')
-            entry['dfh'] = pd.read_json(StringIO(entry['dfh']), orient='split')
-            if 'dfhg' in entry:
-                entry['dfhg'] = pd.read_json(StringIO(entry['dfhg']), orient='split')
-        return data_dict_json
+        return read_data_file(filename, reference_values, progress)
 
     except Exception as e:
         st.error(f"An error occurred while loading the data: {e}")
         return {}
 
+def read_data_file(filename, reference_values=None, progress=None):
+    """
+    Reads a data file into a decoded data_dict without any Streamlit calls, so it can
+    be used by headless tools. Errors are raised to the caller.
+    progress, if given, is called with (entries decoded, total entries) as the
+    entries are decoded.
+    """
+    data_dict_json = read_raw_data_file(filename)
+
+    # Convert JSON strings to DataFrames for each entry
+    total = len(data_dict_json)
+    for i, entry in enumerate(data_dict_json.values(), 1):
+        decode_entry(entry)
+        if progress is not None:
+            progress(i, total)
+    return precompute_var_y(data_dict_json, reference_values)
+
+def read_raw_data_file(filename):
+    """
+    Reads a data file (.json, or .jsonl with one entry per line) without decoding its
+    entries: the 'df', 'dfh' and 'dfhg' values are left as JSON strings.
+    """
+    with open(filename, 'r') as f:
+        if Path(filename).suffix == '.jsonl':
+            # One entry per line, with its key under 'key'
+            data_dict_json = {}
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    data_dict_json[entry.pop('key')] = entry
+        else:
+            data_dict_json = json.load(f)
+    return data_dict_json
+
+def decode_entry(entry):
+    """
+    Converts the JSON strings ('df', 'dfh' and optional 'dfhg') of one entry back to
+    DataFrames, in place. Returns the entry.
+    """
+    entry['df'] = pd.read_json(StringIO(entry['df']), orient='split')
+    entry['dfh'] = pd.read_json(StringIO(entry['dfh']), orient='split')
+    if 'dfhg' in entry:
+        entry['dfhg'] = pd.read_json(StringIO(entry['dfhg']), orient='split')
+    return entry
+
+def encode_entry(entry):
+    """
+    Inverse of decode_entry: returns a copy of the entry with 'df', 'dfh' and optional
+    'dfhg' serialized as the JSON strings of the data file format.
+    """
+    encoded = {'df': entry['df'].to_json(orient='split'), 'dfh': entry['dfh'].to_json(orient='split')}
+    if 'dfhg' in entry:
+        encoded['dfhg'] = entry['dfhg'].to_json(orient='split')
+    return encoded
+
+def write_data_file(data_dict, filename):
+    """
+    Writes a data_dict of DataFrames in the format read by read_data_file: flat JSON,
+    or one entry per line for a .jsonl file.
+    """
+    file_path = Path(filename)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(file_path, 'w') as f:
+        if file_path.suffix == '.jsonl':
+            f.writelines(_jsonl_line(key, entry) for key, entry in data_dict.items())
+        else:
+            json.dump({key: encode_entry(entry) for key, entry in data_dict.items()}, f)
+    return file_path
+
+def update_data_file(filename, data_dict):
+    """
+    Replaces or adds the entries of data_dict in an existing data file (or creates it).
+
+    Only these entries are serialized. In a .jsonl file, only the lines of the
+    replaced entries are rewritten and new entries are appended; the other lines are
+    copied as they are, reading no more than their keys. A .json file is a single
+    object, so it is parsed and dumped as a whole (its other entries stay JSON
+    strings and are not decoded); use .jsonl for large files that are updated often.
+    Either way the file is written next to the original and then swapped in, so
+    readers never see a partial file.
+    """
+    file_path = Path(filename)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = file_path.with_name(file_path.name + '.tmp')
+    if file_path.suffix == '.jsonl':
+        replaced = set()
+        with open(tmp_path, 'w') as out:
+            if file_path.is_file():
+                with open(file_path, 'r') as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        key = _jsonl_key(line)
+                        if key in data_dict:
+                            out.write(_jsonl_line(key, data_dict[key]))
+                            replaced.add(key)
+                        else:
+                            out.write(line if line.endswith('\n') else line + '\n')
+            out.writelines(_jsonl_line(key, entry) for key, entry in data_dict.items() if key not in replaced)
+    else:
+        existing = {}
+        if file_path.is_file():
+            with open(file_path, 'r') as f:
+                existing = json.load(f)
+        for key, entry in data_dict.items():
+            existing[key] = encode_entry(entry)
+        with open(tmp_path, 'w') as f:
+            json.dump(existing, f)
+    os.replace(tmp_path, file_path)
+    return file_path
+
+def _jsonl_line(key, entry):
+    # The key comes first, so _jsonl_key can read it without parsing the frames
+    return json.dumps(dict(key=key, **encode_entry(entry))) + '\n'
+
+_JSONL_KEY_PREFIX = '{"key": '
+
+def _jsonl_key(line):
+    if line.startswith(_JSONL_KEY_PREFIX):
+        key, _ = json.JSONDecoder().raw_decode(line, len(_JSONL_KEY_PREFIX))
+        return key
+    return json.loads(line)['key']
+
+def freeze_frame(frame):
+    """
+    Returns a DataFrame over the same data whose numeric NumPy columns are read-only
+    views, so an in-place write raises (or, with pandas copy-on-write, copies) instead
+    of changing the shared buffers. Object and extension columns (e.g. strings) are
+    kept as they are: pandas cannot size read-only object arrays (memory_usage).
+    """
+    columns = {}
+    for name in frame.columns:
+        column = frame[name]
+        if isinstance(column.dtype, np.dtype) and column.dtype != object:
+            values = column.to_numpy().view()
+            values.flags.writeable = False
+            columns[name] = values
+        else:
+            columns[name] = column.array
+    return pd.DataFrame(columns, index=frame.index, copy=False)
+
+def freeze_data_dict(data_dict):
+    """Makes the frames and var_y tables of every entry read-only, in place. Returns data_dict."""
+    for entry in data_dict.values():
+        for name in ('df', 'dfh', 'dfhg'):
+            if name in entry:
+                entry[name] = freeze_frame(entry[name])
+        if 'var_y_table' in entry:
+            entry['var_y_table'].flags.writeable = False
+        if 'var_y_modes' in entry:
+            # One list is shared by all the entries
+            entry['var_y_modes'] = tuple(entry['var_y_modes'])
+    return data_dict
+
+def entry_view(entry):
+    """
+    A view of one entry for a caller: a new dict whose frames are shallow copies of
+    the shared ones. With copy-on-write (see enable_copy_on_write), the views share
+    the read-only buffers, and assigning or modifying their columns only changes the
+    view, never the shared entry.
+    """
+    return {
+        name: value.copy(deep=False) if isinstance(value, pd.DataFrame) else value
+        for name, value in entry.items()
+    }
+
+def enable_copy_on_write():
+    """Turns on pandas copy-on-write, which is always on from pandas 3."""
+    if int(pd.__version__.split('.')[0]) < 3:
+        pd.set_option('mode.copy_on_write', True)
+
+def precompute_var_y(data_dict, reference_values=None):
+    """
+    Precomputes y_min, y_max and var_y = 100 * (y - ref) / ref of every entry for
+    every reference mode, in one vectorized pass over the concatenated 'y' columns.
+
+    The reference modes are 'min', 'max' and each key of reference_values
+    (e.g. dictionary_aggregated_values). Each entry gets:
+      - 'y_min', 'y_max': floats (NaN-aware, like Series.min/max)
+      - 'var_y_modes': list of mode names
+      - 'var_y_table': 2-D array (len(var_y_modes), len(df)) aligned with the rows of df
+
+    The entries are updated in place and data_dict is returned.
+    """
+    reference_values = reference_values or {}
+    modes = ["min", "max"] + list(reference_values.keys())
+    entries = [entry for entry in data_dict.values() if 'df' in entry]
+    if not entries:
+        return data_dict
+
+    ys = [entry['df']['y'].to_numpy(dtype=float) for entry in entries]
+    lengths = np.array([len(y) for y in ys])
+    offsets = np.cumsum(lengths)[:-1]
+    y_all = np.concatenate(ys)
+
+    # Per-entry min/max with reduceat; empty entries are skipped since their segment has length 0
+    y_min = np.full(len(entries), np.nan)
+    y_max = np.full(len(entries), np.nan)
+    nonempty = lengths > 0
+    if nonempty.any():
+        starts = np.concatenate(([0], offsets))[nonempty]
+        y_min[nonempty] = np.fmin.reduceat(y_all, starts)
+        y_max[nonempty] = np.fmax.reduceat(y_all, starts)
+
+    refs = np.empty((len(modes), len(y_all)))
+    refs[0] = np.repeat(y_min, lengths)
+    refs[1] = np.repeat(y_max, lengths)
+    if reference_values:
+        refs[2:] = np.array(list(reference_values.values()), dtype=float)[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var_y_all = 100 * (y_all - refs) / refs
+
+    for entry, entry_min, entry_max, table in zip(entries, y_min, y_max, np.split(var_y_all, offsets, axis=1)):
+        entry['y_min'] = float(entry_min)
+        entry['y_max'] = float(entry_max)
+        entry['var_y_modes'] = modes
+        entry['var_y_table'] = table
+    return data_dict
+
+def deep_size(data_dict):
+    """
+    Memory held by a data dict: the deep memory usage of its DataFrames (object
+    columns included) and arrays, plus its keys.
+    """
+    total = sys.getsizeof(data_dict)
+    for key, entry in data_dict.items():
+        total += sys.getsizeof(key) + sys.getsizeof(entry)
+        for frame in entry.values():
+            if isinstance(frame, pd.DataFrame):
+                total += int(frame.memory_usage(deep=True).sum())
+            elif isinstance(frame, np.ndarray):
+                # Views (e.g. the var_y tables) do not count their buffer in getsizeof
+                total += sys.getsizeof(frame) + (frame.nbytes if frame.base is not None else 0)
+            else:
+                total += sys.getsizeof(frame)
+    return total
+
 def load_logo(image_path):
     """
     Loads the logo image.
@@ -1,9 +1,105 @@
 # filepath: /home/diego/Dropbox/DropboxGit/VizApp/src/modelviz/dataframe_display.py
+import threading
+from collections import OrderedDict
 import streamlit as st
 import pandas as pd
+from packaging.version import Version
+from .data_loader import entry_view
 from .keygen import key_generator
 
-def display_dataframes(data_dict, config_labels, selected_db, selected_analysis, selected_column, selected_agg, selected_ref, selected_group, selected_targets, add_third_subplot):
+# CSV payloads already generated, least recently used first, up to CSV_CACHE_BYTES in total
+CSV_CACHE_BYTES = 64 * 2**20
+_csv_cache = OrderedDict()
+_cache_lock = threading.Lock()
+# st.download_button only accepts a callable as data, run when clicked, from Streamlit 1.52
+DEFERRED_DOWNLOADS = Version(st.__version__) >= Version("1.52.0")
+
+def csv_payload(frame, cache_key=None):
+    """
+    CSV bytes of a frame. With a cache_key (which must identify the frame's content,
+    e.g. the data file, its modification time, the entry key and the frame name),
+    the bytes are kept in a process-wide LRU cache and reused by later downloads.
+    """
+    if cache_key is not None:
+        with _cache_lock:
+            payload = _csv_cache.get(cache_key)
+            if payload is not None:
+                _csv_cache.move_to_end(cache_key)
+                return payload
+    payload = frame.to_csv(index=False).encode()
+    if cache_key is not None and len(payload) <= CSV_CACHE_BYTES:
+        with _cache_lock:
+            _csv_cache[cache_key] = payload
+            total = sum(len(p) for p in _csv_cache.values())
+            while total > CSV_CACHE_BYTES:
+                _, evicted = _csv_cache.popitem(last=False)
+                total -= len(evicted)
+    return payload
+
+def deferred_csv(frame, cache_key=None):
+    """Callable producing the CSV bytes of a frame on demand, for st.download_button."""
+    return lambda: csv_payload(frame, cache_key)
+
+def download_data(build):
+    """
+    The data of st.download_button for a payload callable: the callable itself where
+    Streamlit defers it to the click (DEFERRED_DOWNLOADS), else the payload, built now.
+    Without DEFERRED_DOWNLOADS, only show the button once requested (see
+    display_dataframes), so that the payload is not built on every run.
+    """
+    return build if DEFERRED_DOWNLOADS else build()
+
+# Summary statistics of the windowed frames, least recently used first
+SUMMARY_CACHE_SIZE = 256
+_summary_cache = OrderedDict()
+
+def frame_summary(frame, cache_key=None):
+    """Summary statistics (count, mean, std, quantiles) of the numeric columns of a frame, cached like csv_payload."""
+    if cache_key is not None:
+        with _cache_lock:
+            summary = _summary_cache.get(cache_key)
+            if summary is not None:
+                _summary_cache.move_to_end(cache_key)
+                return summary
+    numeric = frame.select_dtypes("number")
+    summary = numeric.describe().T if not numeric.empty else pd.DataFrame()
+    if cache_key is not None:
+        with _cache_lock:
+            _summary_cache[cache_key] = summary
+            while len(_summary_cache) > SUMMARY_CACHE_SIZE:
+                _summary_cache.popitem(last=False)
+    return summary
+
+def windowed_dataframe(frame, widget_key, page_size=1000, cache_key=None):
+    """
+    Shows a frame one page of rows at a time, so only that window is sent to the
+    browser; frames of up to page_size rows are shown whole. Larger frames also get
+    their summary statistics, computed once per cache_key.
+    """
+    n_rows = len(frame)
+    if not page_size or n_rows <= page_size:
+        st.dataframe(frame)
+        return
+    n_pages = -(-n_rows // page_size)
+    page = st.number_input("Page", min_value=1, max_value=n_pages, value=1, step=1, key=widget_key)
+    start = (int(page) - 1) * page_size
+    stop = min(start + page_size, n_rows)
+    st.caption(f"Rows {start + 1:,}–{stop:,} of {n_rows:,} (page {int(page)} of {n_pages})")
+    st.dataframe(frame.iloc[start:stop])
+    summary = frame_summary(frame, cache_key)
+    if not summary.empty:
+        st.caption("Summary statistics of all rows")
+        st.dataframe(summary)
+
+def display_dataframes(data_dict, config_labels, selected_db, selected_analysis, selected_column, selected_agg, selected_ref, selected_group, selected_targets, add_third_subplot, source=None, page_size=1000):
+    """
+    Shows the frames of the selected targets with their download buttons. The CSV of
+    a button is only generated when it is clicked; where Streamlit cannot defer it to
+    the click (see DEFERRED_DOWNLOADS), the buttons of a target are shown, with their
+    CSVs, once requested with a separate button. source (e.g. the data file and its
+    modification time) identifies the data dict so the CSV can be reused, see csv_payload.
+    Frames longer than page_size rows are paged, see windowed_dataframe.
+    """
     with st.expander(config_labels["headers"]["dataframes"]):
         # Show each selected target's dataframes
         for t in selected_targets:
@@ -17,43 +113,38 @@ def display_dataframes(data_dict, config_labels, selected_db, selected_analysis,
                 "target": t
             }
             t_data = get_data_entry(data_dict, params)
+            entry_key = None if source is None else (source, key_generator(params, preserve_types=True))
             t_df = t_data['df']
             t_dfh = t_data['dfh']
 
             st.subheader(f"Target: {t}")
             st.write("Line Plot DataFrame (`df`):")
-            st.dataframe(t_df)
+            windowed_dataframe(t_df, f"_page_df_{t}", page_size, entry_key and entry_key + ('df',))
             st.write("Bar Plot DataFrame (`dfh`):")
-            st.dataframe(t_dfh)
+            windowed_dataframe(t_dfh, f"_page_dfh_{t}", page_size, entry_key and entry_key + ('dfh',))
             if add_third_subplot and 'dfhg' in t_data:
                 st.write("Grouped Histogram DataFrame (`dfhg`):")
-                st.dataframe(t_data['dfhg'])
-
-            # Download buttons for each target
-            csv_df = t_df.to_csv(index=False)
-            st.download_button(
-                label=f"{config_labels['download_buttons']['df_csv']} - {t}",
-                data=csv_df,
-                file_name=f'df_{t}.csv',
-                mime='text/csv',
-            )
-
-            csv_dfh = t_dfh.to_csv(index=False)
-            st.download_button(
-                label=f"{config_labels['download_buttons']['dfh_csv']} - {t}",
-                data=csv_dfh,
-                file_name=f'dfh_{t}.csv',
-                mime='text/csv',
-            )
+                windowed_dataframe(t_data['dfhg'], f"_page_dfhg_{t}", page_size, entry_key and entry_key + ('dfhg',))
+
+            # Download buttons for each target, generated on click without a rerun
+            downloads = [
+                (f"{config_labels['download_buttons']['df_csv']} - {t}", t_df, 'df'),
+                (f"{config_labels['download_buttons']['dfh_csv']} - {t}", t_dfh, 'dfh'),
+            ]
             if add_third_subplot and 'dfhg' in t_data:
-                csv_dfhg = t_data['dfhg'].to_csv(index=False)
-                st.download_button(
-                    label=f"Download dfhg Data as CSV - {t}",
-                    data=csv_dfhg,
-                    file_name=f'dfhg_{t}.csv',
-                    mime='text/csv',
-                )
+                downloads.append((f"Download dfhg Data as CSV - {t}", t_data['dfhg'], 'dfhg'))
+            if DEFERRED_DOWNLOADS or st.button(f"{config_labels['download_buttons']['prepare']} - {t}", key=f"_prepare_csv_{t}"):
+                for label, frame, name in downloads:
+                    st.download_button(
+                        label=label,
+                        data=download_data(deferred_csv(frame, entry_key and entry_key + (name,))),
+                        file_name=f'{name}_{t}.csv',
+                        mime='text/csv',
+                        on_click="ignore",
+                    )
+
 def get_data_entry(data_dict, params):
     from .keygen import key_generator
     key = key_generator(params, preserve_types=True)
-    return data_dict[key]
\ No newline at end of file
+    # A view, so changes made by the caller stay out of the shared store
+    return entry_view(data_dict[key])
\ No newline at end of file
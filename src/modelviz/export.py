@@ -0,0 +1,204 @@
+import importlib.util
+import json
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+from .dataframe_display import DEFERRED_DOWNLOADS
+from .keygen import reverse_key_generator
+
+EXPORT_FORMATS = ("csv", "parquet", "feather")
+FRAME_NAMES = ("df", "dfh", "dfhg")
+PARAM_ORDER = ["db", "analysis", "column", "agg", "ref", "group", "target"]
+# Archives up to this size are built in memory, larger ones spill to a temporary file
+SPOOL_SIZE = 64 * 2**20
+# Same for each serialized frame waiting to be copied into the archive
+FRAME_SPOOL_SIZE = 8 * 2**20
+# Bytes copied into an archive member per write
+CHUNK_SIZE = 2**20
+
+def available_formats():
+    """Export formats usable here: Parquet and Feather need pyarrow."""
+    if importlib.util.find_spec("pyarrow") is None:
+        return ["csv"]
+    return list(EXPORT_FORMATS)
+
+def matching_keys(data_dict, query):
+    """
+    Keys of the entries matching a partial query.
+
+    Args:
+        query (dict): Parameter -> value, or list of accepted values. Parameters left
+                      out match anything.
+
+    Returns:
+        list: The matching keys, in the order of data_dict.
+    """
+    accepted = {p: set(v) if isinstance(v, (list, tuple, set)) else {v} for p, v in query.items()}
+    keys = []
+    for key in data_dict:
+        try:
+            params = reverse_key_generator(key, preserved_types=True)
+        except ValueError:
+            continue
+        if all(params.get(p) in values for p, values in accepted.items()):
+            keys.append(key)
+    return keys
+
+def write_frame(frame, fileobj, output_format):
+    """Writes one frame in an export format to a writable binary file."""
+    if output_format == "csv":
+        frame.to_csv(fileobj, index=False)
+    elif output_format == "parquet":
+        frame.to_parquet(fileobj, index=False)
+    elif output_format == "feather":
+        # Feather only stores a default index
+        frame.reset_index(drop=True).to_feather(fileobj)
+    else:
+        raise ValueError(f"Unknown export format '{output_format}'. Use one of {EXPORT_FORMATS}.")
+
+def entry_directory(key):
+    """Directory of an entry's frames in the archive: one level per parameter of its key."""
+    try:
+        params = reverse_key_generator(key, preserved_types=True)
+    except ValueError:
+        params = {"key": key}
+    ordered = [p for p in PARAM_ORDER if p in params] + sorted(p for p in params if p not in PARAM_ORDER)
+    return "/".join(re.sub(r"[^A-Za-z0-9._-]+", "-", str(params[p])).strip(".") or "_" for p in ordered)
+
+def entry_directories(keys):
+    """
+    Directory of each key (entry_directory). Keys whose values only differ in the
+    characters replaced there would share one; the later ones get a ~2, ~3... suffix.
+    """
+    directories, used = {}, set()
+    for key in keys:
+        base = directory = entry_directory(key)
+        n = 1
+        while directory in used:
+            n += 1
+            directory = f"{base}~{n}"
+        used.add(directory)
+        directories[key] = directory
+    return directories
+
+def serialize_frame(frame, output_format):
+    """
+    One frame in an export format, in a spooled temporary file rewound to its start:
+    in memory up to FRAME_SPOOL_SIZE, on disk beyond. The caller closes it.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=FRAME_SPOOL_SIZE)
+    try:
+        write_frame(frame, spool, output_format)
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+    return spool
+
+def write_archive(data_dict, keys, fileobj, output_format="csv", frames=FRAME_NAMES, max_workers=None):
+    """
+    Writes the frames of the given entries into a ZIP archive, plus a manifest.json
+    mapping each key to its files.
+
+    The frames are serialized concurrently by a thread pool into spooled temporary
+    files (see serialize_frame), with at most twice the number of threads in flight.
+    Each one is copied into its archive member in chunks, in key order, as the archive
+    takes one member at a time. Neither a large frame's serialized form nor the archive
+    is held whole in memory.
+
+    Args:
+        fileobj: Writable binary file (or path) receiving the archive.
+        output_format (str): 'csv', 'parquet' or 'feather'.
+        frames (tuple): Frames of each entry to export, when present.
+        max_workers (int): Serializing threads; None for the CPU count.
+
+    Returns:
+        int: Number of frames written.
+    """
+    if output_format not in available_formats():
+        raise ValueError(f"Export format '{output_format}' is not available. Use one of {available_formats()}.")
+    # The binary formats are already compressed
+    compression = zipfile.ZIP_DEFLATED if output_format == "csv" else zipfile.ZIP_STORED
+    tasks = (
+        (key, name, f"{directory}/{name}.{output_format}")
+        for key, directory in entry_directories(keys).items()
+        for name in frames if name in data_dict[key]
+    )
+    workers = max_workers or os.cpu_count() or 1
+    manifest = {}
+    in_flight = deque()
+    with zipfile.ZipFile(fileobj, "w", compression=compression) as archive, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+
+        def write_next():
+            (key, name, path), future = in_flight.popleft()
+            with future.result() as spool:
+                # The size is only known once written
+                with archive.open(path, "w", force_zip64=True) as member:
+                    shutil.copyfileobj(spool, member, CHUNK_SIZE)
+            manifest.setdefault(key, {})[name] = path
+
+        try:
+            for key, name, path in tasks:
+                in_flight.append(((key, name, path), pool.submit(serialize_frame, data_dict[key][name], output_format)))
+                if len(in_flight) >= 2 * workers:
+                    write_next()
+            while in_flight:
+                write_next()
+        finally:
+            # After an error, close the spools of the frames not written
+            for _, future in in_flight:
+                if not future.cancel() and future.exception() is None:
+                    future.result().close()
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+    return sum(len(names) for names in manifest.values())
+
+def deferred_archive(data_dict, query, output_format="csv", frames=FRAME_NAMES, max_workers=None):
+    """
+    Callable building the archive of the entries matching query on demand, for
+    st.download_button. While it is written, a small archive stays in memory and a
+    larger one is spooled to a temporary file, closed once its bytes are read.
+    """
+    def build():
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+            write_archive(data_dict, matching_keys(data_dict, query), spool, output_format, frames, max_workers)
+            spool.seek(0)
+            return spool.read()
+    return build
+
+def export_section(data_dict, config_labels, selection, selected_targets):
+    """
+    Export of the current selection as one ZIP archive. The parameters left unchecked
+    match any value, so the same button exports e.g. all targets or all groupings of
+    the selection. Where Streamlit cannot defer the download to the click (see
+    dataframe_display.DEFERRED_DOWNLOADS), the archive is built when requested with
+    a separate button instead of on every run.
+
+    Args:
+        selection (dict): The selected db, analysis, column, agg, ref and group.
+        selected_targets (list): The selected targets.
+    """
+    labels = config_labels["export"]
+    with st.expander(labels["header"]):
+        fixed = st.multiselect(
+            labels["match"], PARAM_ORDER, default=PARAM_ORDER, key="_export_match", help=labels["match_help"]
+        )
+        query = {p: selected_targets if p == "target" else selection[p] for p in fixed}
+        output_format = st.selectbox(labels["format"], available_formats(), key="_export_format")
+        readable = "_".join(str(query[p]) for p in PARAM_ORDER if p in query and p != "target") or "all"
+        build = deferred_archive(data_dict, query, output_format)
+        download = {
+            "label": labels["button"],
+            "file_name": f"export_{re.sub(r'[^A-Za-z0-9._-]+', '-', readable)}_{output_format}.zip",
+            "mime": "application/zip",
+            "on_click": "ignore",
+        }
+        if DEFERRED_DOWNLOADS:
+            st.download_button(data=build, **download)
+        elif st.button(labels["prepare"], key="_export_prepare"):
+            st.download_button(data=build(), **download)
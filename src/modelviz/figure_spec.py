@@ -0,0 +1,209 @@
+import copy
+import json
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+from _plotly_utils.utils import to_typed_array_spec
+from plotly.subplots import make_subplots
+from .plotting import (
+    AXIS_REFS, VERTICAL_SPACING, _insert_gaps, build_figure_parts, get_data_entry, get_var_y,
+    performance_option, subplot_grid, subplot_specs, typed_array, use_consolidation,
+)
+
+def build_figure_spec(data_dict, config_labels, config_colors, custom_xticks, selected_db, selected_analysis, selected_column, selected_agg, selected_ref, selected_group, selected_targets, var_y_type, y0, config_performance=None):
+    """
+    Lightweight alternative to plotting.create_figure.
+
+    Produces the same figure as a plain dict ({"data": [...], "layout": {...}}) without
+    going through graph_objects validation: the subplot layout is computed once per grid
+    and the traces get their axis references from AXIS_REFS.
+
+    Returns:
+        tuple: (spec, add_third_subplot). Wrap spec with figure_from_spec before
+               passing it to st.plotly_chart.
+    """
+    traces, layout_updates, add_third_subplot = build_figure_parts(
+        data_dict, config_labels, config_colors, custom_xticks,
+        selected_db, selected_analysis, selected_column, selected_agg, selected_ref,
+        selected_group, selected_targets, var_y_type, y0, config_performance
+    )
+    rows, subplot_titles, _ = subplot_grid(config_labels, add_third_subplot)
+
+    data = []
+    for trace, row, secondary_y in traces:
+        xref, yref = AXIS_REFS[(row, secondary_y)]
+        data.append(dict(trace, xaxis=xref, yaxis=yref))
+
+    layout = copy.deepcopy(_subplot_layout(rows, subplot_titles))
+    _deep_update(layout, layout_updates)
+    return {"data": data, "layout": layout}, add_third_subplot
+
+def build_exploration_spec(data_dict, config_labels, config_colors, custom_xticks, selected_db, selected_analysis, selected_column, selected_agg, selected_ref, selected_group, available_targets, selected_targets, var_y_type, reference_values, config_performance=None):
+    """
+    Builds a spec holding every available target and every var_y reference of the
+    selection, so targets and references can be switched in the browser without a
+    Streamlit rerun.
+
+    - Targets: all line traces of a target share a legend group, and a "Targets" menu
+      shows the selected targets, all targets or a single one. Targets that are not
+      selected start hidden ('legendonly').
+    - References: a "Reference" menu restyles the var_y traces with the precomputed
+      arrays of each reference mode ('min', 'max' and the keys of reference_values),
+      read from the entries' var_y tables and sent as typed arrays.
+
+    Targets are added (selected ones first) while the number of points sent stays
+    within config_performance['exploration_max_points']; the first target is always
+    included.
+
+    Returns:
+        tuple: (spec, add_third_subplot, included_targets)
+    """
+    modes = ["min", "max"] + list(reference_values.keys())
+    max_points = performance_option(config_performance, "exploration_max_points")
+    # Each point is sent once for the y line, once for the var_y line and once per reference in the menu
+    copies = 2 + len(modes)
+
+    ordered_targets = list(selected_targets) + [t for t in available_targets if t not in selected_targets]
+    included_targets = []
+    included_entries = []
+    n_points = 0
+    for target in ordered_targets:
+        params = {
+            "db": selected_db,
+            "analysis": selected_analysis,
+            "column": selected_column,
+            "agg": selected_agg,
+            "ref": selected_ref,
+            "group": selected_group,
+            "target": target
+        }
+        entry = get_data_entry(data_dict, params)
+        target_points = copies * len(entry['df'])
+        if included_targets and max_points is not None and n_points + target_points > max_points:
+            continue
+        included_targets.append(target)
+        included_entries.append(entry)
+        n_points += target_points
+
+    selection_args = (
+        data_dict, config_labels, config_colors, custom_xticks,
+        selected_db, selected_analysis, selected_column, selected_agg, selected_ref,
+        selected_group, included_targets
+    )
+    spec, add_third_subplot = build_figure_spec(
+        *selection_args, var_y_type, reference_values.get(var_y_type), config_performance
+    )
+
+    line_indices = [i for i, trace in enumerate(spec["data"]) if "target" in trace.get("meta", {})]
+    var_y_indices = [i for i in line_indices if spec["data"][i]["yaxis"] == AXIS_REFS[(2, False)][1]]
+    line_targets = [spec["data"][i]["meta"]["target"] for i in line_indices]
+    shown_targets = {str(t) for t in selected_targets}
+    for i, target in zip(line_indices, line_targets):
+        spec["data"][i]["legendgroup"] = target
+        spec["data"][i]["visible"] = True if target in shown_targets else "legendonly"
+
+    # var_y arrays of every reference mode, in the order of var_y_indices
+    float32_rtol = performance_option(config_performance, "float32_rtol")
+    line_entries = [entry for entry in included_entries if not entry['df'].empty]
+    consolidate = use_consolidation(line_entries, config_performance)
+    trace_rows = [_var_y_trace_rows(entry['df'], consolidate) for entry in line_entries]
+    reference_buttons = []
+    for mode in modes:
+        ys = []
+        for entry, rows in zip(line_entries, trace_rows):
+            var_y = get_var_y(entry, mode, reference_values.get(mode)).to_numpy()
+            for positions, gaps in rows:
+                values = var_y[positions] if gaps is None else _insert_gaps(var_y[positions], gaps)
+                # Restyle arguments are not converted to typed arrays by every Plotly version
+                ys.append(to_typed_array_spec(typed_array(values, float32_rtol)))
+        reference_buttons.append(dict(label=str(mode), method="restyle", args=[{"y": ys}, var_y_indices]))
+
+    def visibility(targets):
+        return [True if target in targets else "legendonly" for target in line_targets]
+
+    target_buttons = [
+        dict(label="Selected", method="restyle", args=[{"visible": visibility(shown_targets)}, line_indices]),
+        dict(label="All", method="restyle", args=[{"visible": visibility(set(line_targets))}, line_indices]),
+    ] + [
+        dict(label=str(t), method="restyle", args=[{"visible": visibility({str(t)})}, line_indices])
+        for t in included_targets
+    ]
+    # Room for the menus above the legend
+    spec["layout"]["margin"] = dict(spec["layout"].get("margin", {}), t=160)
+    spec["layout"]["updatemenus"] = [
+        dict(buttons=target_buttons, active=0, direction="down", x=0, xanchor="left", y=1.12, yanchor="bottom"),
+        dict(buttons=reference_buttons, active=modes.index(var_y_type) if var_y_type in modes else 0,
+             direction="down", x=0.15, xanchor="left", y=1.12, yanchor="bottom"),
+    ]
+    spec["layout"]["annotations"] = list(spec["layout"].get("annotations", [])) + [
+        dict(text="Targets", x=0, y=1.17, xref="paper", yref="paper", xanchor="left", yanchor="bottom", showarrow=False),
+        dict(text="Reference", x=0.15, y=1.17, xref="paper", yref="paper", xanchor="left", yanchor="bottom", showarrow=False),
+    ]
+    return spec, add_third_subplot, included_targets
+
+def _var_y_trace_rows(df, consolidate):
+    """
+    Rows of df behind each var_y trace of a target, in the order build_figure_parts
+    adds them: (positions, None) per group or, with the groups consolidated into one
+    trace, a single (positions, gaps) with the gaps between the groups.
+    """
+    df_sorted = df.reset_index(drop=True).sort_values(by=['group', 'x'])
+    positions = df_sorted.index.to_numpy()
+    if consolidate:
+        group_codes, _ = pd.factorize(df_sorted['group'])
+        return [(positions, np.flatnonzero(np.diff(group_codes)) + 1)]
+    groups = df_sorted['group'].to_numpy()
+    return [(positions[groups == g], None) for g in df_sorted['group'].unique()]
+
+def figure_from_spec(spec):
+    """
+    Wraps a spec from build_figure_spec in a go.Figure without re-validating it.
+
+    st.plotly_chart validates plain dicts by building a go.Figure from them; an
+    unvalidated Figure is serialized as is.
+    """
+    return go.Figure(spec, _validate=False)
+
+def figure_payload_size(figure):
+    """
+    Size in bytes of the JSON that st.plotly_chart sends to the browser for figure
+    (a go.Figure or a spec from build_figure_spec).
+
+    Returns:
+        dict: 'total' bytes, 'layout' bytes and 'traces', a list of bytes per trace.
+    """
+    if isinstance(figure, dict):
+        figure = figure_from_spec(figure)
+    payload_json = pio.to_json(figure, validate=False)
+    payload = json.loads(payload_json)
+    return {
+        "total": len(payload_json.encode()),
+        "layout": _json_size(payload.get("layout", {})),
+        "traces": [_json_size(trace) for trace in payload.get("data", [])],
+    }
+
+def _json_size(obj):
+    return len(json.dumps(obj, separators=(",", ":")).encode())
+
+@lru_cache(maxsize=None)
+def _subplot_layout(rows, subplot_titles):
+    # make_subplots is only called once per grid; the layout (domains, anchors,
+    # overlays, title annotations and template) is reused for every figure.
+    fig = make_subplots(
+        rows=rows, cols=1,
+        subplot_titles=subplot_titles,
+        shared_xaxes=False,
+        vertical_spacing=VERTICAL_SPACING,
+        specs=subplot_specs(rows)
+    )
+    return fig.to_dict()["layout"]
+
+def _deep_update(target, updates):
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _deep_update(target[key], value)
+        else:
+            target[key] = value
+    return target
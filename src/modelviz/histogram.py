@@ -0,0 +1,179 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+def smart_histogram(v, categorical=False, trim=0.025):
+    """
+    Create histogram h,x from array v with "smart" binning:
+      - If categorical=True, treat v as categorical and remove categories with <2.5% freq
+        (or `trim` fraction).
+      - If not categorical:
+          - Remove top and bottom 2.5% (or `trim` fraction) of values.
+          - Determine if all values are effectively integers.
+          - Use Freedman-Diaconis rule for bin width, then round to a nice number.
+
+    Categories are counted in a single np.unique pass, and the order statistics of the
+    numeric branch come from np.partition calls: one for the trim bounds, one for the
+    quartiles of the trimmed values.
+    NaN values are ignored in the numeric branch.
+
+    Returns:
+      h: histogram counts
+      x: bin edges (for numeric) or unique categories (for categorical)
+    """
+    v = np.asarray(v)
+    if len(v) == 0:
+        return np.array([]), np.array([])
+
+    if categorical:
+        return _categorical_histogram(v, trim)
+    return _numeric_histogram(v, trim)
+
+def smart_histograms(columns, categorical=(), trim=0.025, max_workers=None):
+    """
+    Runs smart_histogram over a batch of columns in a thread pool (NumPy releases the
+    GIL in the sorting and counting kernels).
+
+    Args:
+        columns (pd.DataFrame or dict): Column name -> values.
+        categorical (iterable): Names of the columns to treat as categorical.
+        trim (float): Passed to smart_histogram.
+        max_workers (int): Threads to use; None lets the executor decide.
+
+    Returns:
+        dict: Column name -> (h, x).
+    """
+    categorical = set(categorical)
+    names = list(columns.keys())
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = pool.map(
+            lambda name: smart_histogram(np.asarray(columns[name]), categorical=name in categorical, trim=trim),
+            names
+        )
+        return dict(zip(names, results))
+
+def histogram_frame(h, x):
+    """
+    Converts the output of smart_histogram into the 'x'/'y' frame used for dfh, with
+    x the category or the left edge of each bin.
+    """
+    x = np.asarray(x)
+    if len(x) == len(h) + 1:
+        x = x[:-1]
+    return pd.DataFrame({'x': x, 'y': np.asarray(h)})
+
+def nice_number(x):
+    """Rounds a positive bin width to 1, 2, 5 or 10 times a power of ten."""
+    if x <= 0:
+        return 1.0
+    exp = math.floor(math.log10(x))
+    frac = x / (10**exp)
+    if frac < 1.5:
+        nice_frac = 1
+    elif frac < 3:
+        nice_frac = 2
+    elif frac < 7:
+        nice_frac = 5
+    else:
+        nice_frac = 10
+    return nice_frac * 10**exp
+
+def _is_integral(v):
+    if np.issubdtype(v.dtype, np.integer):
+        return True
+    # Most float columns fail on the first values already; only then check them all
+    head = v[:1024]
+    if not np.allclose(head, head.astype(int)):
+        return False
+    return np.allclose(v, v.astype(int))
+
+def _categorical_histogram(v, trim):
+    if v.dtype == object:
+        # Hashing the labels is much cheaper than sorting Python objects; only the
+        # distinct categories get sorted
+        codes, cats = pd.factorize(v, sort=True)
+        counts = np.bincount(codes[codes >= 0], minlength=len(cats))
+        cats = np.asarray(cats, dtype=object)
+    else:
+        # np.unique sorts the categories and counts them in the same pass
+        cats, counts = np.unique(v, return_counts=True)
+    # Filter out rare categories
+    mask = counts / len(v) >= trim
+    return counts[mask], cats[mask]
+
+def _order_statistics(v, positions):
+    """Values at fractional positions of sorted v, interpolated linearly as np.percentile."""
+    kth = sorted({k for pos in positions for k in (math.floor(pos), math.ceil(pos))})
+    part = np.partition(v, kth)
+    values = []
+    for pos in positions:
+        low = part[math.floor(pos)]
+        values.append(low + (part[math.ceil(pos)] - low) * (pos - math.floor(pos)))
+    return values
+
+def _numeric_histogram(v, trim):
+    if np.issubdtype(v.dtype, np.floating):
+        v = v[~np.isnan(v)]
+    n = len(v)
+    if n == 0:
+        return np.array([]), np.array([])
+
+    if trim > 0:
+        # Trim bounds as np.percentile (linear interpolation), from one partial sort
+        lower_bound, upper_bound = _order_statistics(v, (trim * (n - 1), (1 - trim) * (n - 1)))
+        v_filtered = v[(v >= lower_bound) & (v <= upper_bound)]
+    else:
+        v_filtered = v
+    m = len(v_filtered)
+    if m == 0:
+        return np.array([]), np.array([])
+    # Quartiles of the values that survive the trim (ties at the bounds included)
+    q1, q3 = _order_statistics(v_filtered, (0.25 * (m - 1), 0.75 * (m - 1)))
+
+    # Check if effectively integral
+    is_integral = _is_integral(v_filtered)
+    data_min = v_filtered.min()
+    data_max = v_filtered.max()
+
+    # Freedman-Diaconis bin width
+    iqr = q3 - q1
+    if iqr > 0:
+        bin_width = 2 * iqr * (m ** (-1/3))
+    else:
+        # If IQR=0, fallback to a default
+        data_range = data_max - data_min
+        bin_width = data_range / 10 if data_range != 0 else 1
+
+    if bin_width <= 0:
+        # If still <=0, fallback
+        data_range = data_max - data_min
+        bin_width = data_range / 10 if data_range != 0 else 1
+
+    nice_bin_width = nice_number(bin_width)
+    if is_integral:
+        nice_bin_width = max(1, round(nice_bin_width))
+
+    # Align start to a nice boundary
+    start = math.floor(data_min / nice_bin_width) * nice_bin_width
+    while start > data_min:
+        start -= nice_bin_width
+
+    # Calculate number of bins needed (at least one, also when all values are equal)
+    n_bins = max(1, math.ceil((data_max - start) / nice_bin_width))
+    end = start + n_bins * nice_bin_width
+
+    # If integral, ensure the bin boundaries are integers
+    if is_integral:
+        start = int(math.floor(start))
+        end = int(math.ceil(end))
+        n_bins = max(1, int(math.ceil((end - start) / nice_bin_width)))
+
+    bins = start + np.arange(n_bins + 1) * nice_bin_width
+    if is_integral:
+        bins = bins.astype(int)
+
+    # Explicit edges: with bins=n_bins and a range, np.histogram places values on an
+    # edge by its own rounding of the edges, not by these ones
+    h, _ = np.histogram(v_filtered, bins=bins)
+    return h, bins
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+import pandas as pd
+from .aggregation import AGGREGATIONS, _chunk_source, aggregate_chunk, build_data_dict, column_bins, merge_partials
+from .keygen import key_generator
+
+SETTINGS_NAME = "store.json"
+BINS_NAME = "bins.pkl"
+# Totals of each generation of the store; store.json names the current one
+TOTALS_NAME = "totals_{}.pkl"
+PARTITIONS_DIR = "partitions"
+
+def create_store(store_dir, db, analysis, columns, targets, references, groups=(), aggs=("sum", "mean"), categorical=(), trim=0.025):
+    """
+    Creates the partition store of one (db, analysis) in store_dir.
+
+    The store keeps, for every raw partition added with add_partition, its partial
+    statistics per (column, grouping) (see aggregation.aggregate_chunk: rows, counts,
+    sums, minima and maxima per bin and group), plus their merged totals. The bins of
+    each column are frozen when the first partition is added, so the partials of all
+    partitions share one grid; later rows outside the frozen bins are left out.
+
+    The arguments are those of aggregation.aggregate_model_data.
+
+    Returns:
+        Path: The directory of the store.
+    """
+    unknown = set(aggs) - set(AGGREGATIONS)
+    if unknown:
+        raise ValueError(f"Unsupported aggregations: {sorted(unknown)}. Use any of {AGGREGATIONS}.")
+    path = store_path(store_dir, db, analysis)
+    (path / PARTITIONS_DIR).mkdir(parents=True, exist_ok=True)
+    settings = {
+        "db": db,
+        "analysis": analysis,
+        "columns": list(columns),
+        "targets": list(targets),
+        "references": dict(references),
+        "groups": list(groups),
+        "aggs": list(aggs),
+        "categorical": list(categorical),
+        "trim": trim,
+        "partitions": [],
+        "generation": 0,
+        "totals": None,
+    }
+    _write_settings(path, settings)
+    return path
+
+def store_path(store_dir, db, analysis):
+    """Directory of the store of one (db, analysis)."""
+    readable = "_".join(re.sub(r"[^A-Za-z0-9.-]+", "-", str(v)) for v in (db, analysis))
+    digest = hashlib.sha1(key_generator({"db": db, "analysis": analysis}, preserve_types=True).encode()).hexdigest()[:8]
+    return Path(store_dir) / f"{readable}_{digest}"
+
+def add_partition(store_dir, db, analysis, partition_id, data, max_workers=None):
+    """
+    Aggregates one raw partition into the store of (db, analysis) and returns the
+    entries it affects, i.e. all the entries of that (db, analysis), rebuilt from the
+    merged totals. Entries of other stores are untouched.
+
+    A new partition_id is merged into the totals; adding an existing partition_id
+    again replaces that partition (the totals are then re-merged from the stored
+    partials, as minima and maxima cannot be subtracted).
+
+    The new totals are written to a file of their own, and the settings that list the
+    partitions and name that file are swapped in with one atomic replace, so a failure
+    part way leaves the store as it was before the call. (When it fails while
+    replacing an existing partition, add that partition again.)
+
+    Args:
+        data: The raw rows, in any form accepted by aggregate_model_data. A one-pass
+              iterator of chunks is accepted once the bins are frozen, i.e. not for
+              the first partition.
+
+    Returns:
+        dict: key -> {'df', 'dfh', 'dfhg'} of the affected entries; write them with
+              data_loader.update_data_file.
+    """
+    path = store_path(store_dir, db, analysis)
+    settings = _read_settings(path)
+    chunks, reiterable = _chunk_source(data)
+
+    bins_path = path / BINS_NAME
+    if bins_path.is_file():
+        bins = pd.read_pickle(bins_path)
+    else:
+        if not reiterable:
+            raise ValueError("The first partition of a store cannot be a one-pass iterator of chunks, as its bins are computed from it; pass a callable returning the chunks instead.")
+        source = data if isinstance(data, pd.DataFrame) else chunks()
+        bins = column_bins(source, settings["columns"], settings["categorical"], settings["trim"], max_workers=max_workers)
+        _write_pickle(bins, bins_path)
+
+    value_columns = list(dict.fromkeys(settings["targets"] + list(settings["references"].values())))
+    partial = {}
+    for chunk in chunks():
+        for key, chunk_partial in aggregate_chunk(chunk, bins, settings["columns"], value_columns, settings["groups"], max_workers).items():
+            partial[key] = merge_partials([partial[key], chunk_partial]) if key in partial else chunk_partial
+    _write_pickle(partial, _partition_path(path, partition_id))
+
+    previous_totals = settings["totals"]
+    if partition_id in settings["partitions"]:
+        totals = _merge_stored_partitions(path, settings["partitions"])
+    else:
+        settings["partitions"].append(partition_id)
+        totals = _merge_totals(pd.read_pickle(path / previous_totals), partial) if previous_totals else partial
+    settings["generation"] += 1
+    settings["totals"] = TOTALS_NAME.format(settings["generation"])
+    pd.to_pickle(totals, path / settings["totals"])
+    _write_settings(path, settings)
+    if previous_totals:
+        (path / previous_totals).unlink(missing_ok=True)
+    return _entries(settings, totals, bins)
+
+def store_entries(store_dir, db, analysis):
+    """All the entries of the store of (db, analysis), from its merged totals."""
+    path = store_path(store_dir, db, analysis)
+    settings = _read_settings(path)
+    if not settings["totals"]:
+        return {}
+    return _entries(settings, pd.read_pickle(path / settings["totals"]), pd.read_pickle(path / BINS_NAME))
+
+def _entries(settings, totals, bins):
+    return build_data_dict(
+        totals, bins, settings["targets"], settings["references"], settings["aggs"],
+        settings["db"], settings["analysis"]
+    )
+
+def _merge_totals(totals, partial):
+    merged = dict(totals)
+    for key, value in partial.items():
+        merged[key] = merge_partials([totals[key], value]) if key in totals else value
+    return merged
+
+def _merge_stored_partitions(path, partition_ids):
+    partials = [pd.read_pickle(_partition_path(path, partition_id)) for partition_id in partition_ids]
+    keys = dict.fromkeys(key for partial in partials for key in partial)
+    return {key: merge_partials([partial[key] for partial in partials if key in partial]) for key in keys}
+
+def _partition_path(path, partition_id):
+    name = re.sub(r"[^A-Za-z0-9.-]+", "-", str(partition_id))
+    digest = hashlib.sha1(repr(partition_id).encode()).hexdigest()[:8]
+    return path / PARTITIONS_DIR / f"{name}_{digest}.pkl"
+
+def _write_settings(path, settings):
+    # Written next to the settings and then swapped in
+    settings_path = path / SETTINGS_NAME
+    tmp_path = settings_path.with_name(settings_path.name + ".tmp")
+    tmp_path.write_text(json.dumps(settings, indent=2))
+    os.replace(tmp_path, settings_path)
+
+def _write_pickle(obj, file_path):
+    tmp_path = file_path.with_name(file_path.name + ".tmp")
+    pd.to_pickle(obj, tmp_path)
+    os.replace(tmp_path, file_path)
+
+def _read_settings(path):
+    settings_path = path / SETTINGS_NAME
+    if not settings_path.is_file():
+        raise FileNotFoundError(f"No partition store at {path}; create it with create_store first.")
+    return json.loads(settings_path.read_text())
@@ -0,0 +1,301 @@
+"""
+Stage timings of the app's reruns, with an optional memory profiling mode.
+
+Each stage of a rerun records its wall time, CPU time and allocations in a ring buffer
+of the session, shown by performance_panel. In the memory profiling mode, tracemalloc
+snapshots are also taken around each stage and can be written to disk for offline
+diffing.
+
+Usage:
+    python -m modelviz.instrumentation profiles/<rerun>/01_load_data_dict_before.tracemalloc \
+        profiles/<rerun>/01_load_data_dict_after.tracemalloc --limit 20
+"""
+import argparse
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import streamlit as st
+from .data_loader import deep_size
+
+HISTORY_KEY = "_performance_history"
+SIZES_KEY = "_performance_data_sizes"
+# Allocations of the profiler itself are left out of the snapshots
+SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+]
+# The rerun being recorded by the current script thread. Not in session_state: while
+# st.stop is pending, every session_state access raises again, so a rerun stored
+# there could not be closed and would be left behind for the fragment reruns
+_current = threading.local()
+
+def performance_enabled(query_param="perf"):
+    """True when the page was opened with ?<query_param>=1 (or true/yes)."""
+    return str(st.query_params.get(query_param, "")).lower() in ("1", "true", "yes")
+
+def start_rerun(history_size=50, memory_profile=None):
+    """
+    Starts recording the stages of this rerun. Until finish_rerun, every stage block
+    is recorded; without a started rerun, stage does nothing.
+
+    Args:
+        history_size (int): Reruns kept in the ring buffer.
+        memory_profile (dict): Enables the memory profiling mode, with the keys
+                               'dir' (snapshots are written under it, one directory
+                               per rerun; None keeps them in memory only), 'top' (top
+                               allocation sites kept per stage) and 'frames' (frames
+                               traced per allocation). Starts tracemalloc if needed.
+    """
+    history = st.session_state.get(HISTORY_KEY)
+    if history is None or history.maxlen != history_size:
+        history = st.session_state[HISTORY_KEY] = deque(history or (), maxlen=history_size)
+    memory = None
+    if memory_profile is not None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(memory_profile.get("frames", 1))
+        memory = {"top": memory_profile.get("top", 10), "dir": None}
+        if memory_profile.get("dir"):
+            memory["dir"] = Path(memory_profile["dir"]) / datetime.now().strftime("%Y%m%dT%H%M%S_%f")
+            memory["dir"].mkdir(parents=True, exist_ok=True)
+    _current.history = history
+    _current.rerun = {
+        "started": time.time(),
+        "wall_start": time.perf_counter(),
+        "cpu_start": time.process_time(),
+        "memory": memory,
+        "stages": [],
+    }
+
+@contextmanager
+def stage(name):
+    """
+    Records a block as a stage of the current rerun:
+      - 'wall_s': wall time (time.perf_counter)
+      - 'cpu_s': CPU time of the process (time.process_time)
+      - 'alloc_blocks': net memory blocks allocated by Python (sys.getallocatedblocks)
+      - 'alloc_bytes': net traced bytes, only while tracemalloc is tracing
+    In the memory profiling mode (see start_rerun), also:
+      - 'retained_bytes': net bytes still allocated after the block, from tracemalloc
+        snapshots taken before and after it
+      - 'top_sites': the lines with the largest net allocations, as dicts of 'site',
+        'size_diff' and 'count_diff'
+      - 'snapshots': the files of the two snapshots, if written to disk
+    """
+    rerun = getattr(_current, "rerun", None)
+    if rerun is None:
+        yield
+        return
+    memory = rerun["memory"] if tracemalloc.is_tracing() else None
+    before = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS) if memory else None
+    tracing = tracemalloc.is_tracing()
+    traced_start = tracemalloc.get_traced_memory()[0] if tracing else None
+    blocks_start = sys.getallocatedblocks()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record = {
+            "stage": name,
+            "wall_s": time.perf_counter() - wall_start,
+            "cpu_s": time.process_time() - cpu_start,
+            "alloc_blocks": sys.getallocatedblocks() - blocks_start,
+            "alloc_bytes": tracemalloc.get_traced_memory()[0] - traced_start if tracing else None,
+        }
+        if before is not None:
+            after = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+            record.update(_memory_record(before, after, memory["top"]))
+            if memory["dir"] is not None:
+                prefix = memory["dir"] / f"{len(rerun['stages']):02d}_{name}"
+                record["snapshots"] = [str(prefix) + "_before.tracemalloc", str(prefix) + "_after.tracemalloc"]
+                before.dump(record["snapshots"][0])
+                after.dump(record["snapshots"][1])
+        rerun["stages"].append(record)
+
+def _memory_record(before, after, top):
+    stats = after.compare_to(before, "lineno")
+    return {
+        "retained_bytes": sum(stat.size_diff for stat in stats),
+        "top_sites": [
+            {"site": str(stat.traceback[0]), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+            for stat in sorted(stats, key=lambda stat: stat.size_diff, reverse=True)[:top]
+        ],
+    }
+
+def timed_stage(name):
+    """Decorator version of stage."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_data_size(name, data_dict):
+    """
+    Records the deep size of the data dict loaded from name, for the panel. Only
+    while a rerun is recorded, as it walks every frame, and only when the data dict
+    is not the one already measured (a shared store keeps its identity across reruns).
+    """
+    if getattr(_current, "rerun", None) is None:
+        return
+    sizes = st.session_state.setdefault(SIZES_KEY, {})
+    if sizes.get(str(name), {}).get("id") == id(data_dict):
+        return
+    sizes[str(name)] = {"entries": len(data_dict), "bytes": deep_size(data_dict), "id": id(data_dict)}
+
+@contextmanager
+def recorded_rerun(enabled=True, history_size=50, memory_profile=None):
+    """
+    Wraps the body of a full rerun: records it (start_rerun) and always closes it
+    (finish_rerun), also when st.stop or an exception ends the rerun early, so no
+    stale rerun is left for the fragment reruns that follow.
+    """
+    if not enabled:
+        yield
+        return
+    start_rerun(history_size, memory_profile)
+    try:
+        yield
+    finally:
+        finish_rerun()
+
+@contextmanager
+def fragment_rerun(name, enabled=True, history_size=50, memory_profile=None):
+    """
+    Wraps the body of a fragment (st.fragment). During a full rerun, the fragment's
+    stages belong to that rerun and nothing else happens; when the fragment reruns on
+    its own, it is recorded as a rerun of its own, marked with its name.
+    """
+    if not enabled or getattr(_current, "rerun", None) is not None:
+        yield
+        return
+    start_rerun(history_size, memory_profile)
+    _current.rerun["fragment"] = name
+    try:
+        yield
+    finally:
+        finish_rerun()
+
+def finish_rerun():
+    """
+    Closes the current rerun and appends it to the ring buffer of recent reruns.
+
+    Returns:
+        dict: The rerun ('stages' plus the 'wall_s' and 'cpu_s' of the whole rerun),
+              or None if no rerun was started.
+    """
+    rerun = getattr(_current, "rerun", None)
+    if rerun is None:
+        return None
+    _current.rerun = None
+    rerun["wall_s"] = time.perf_counter() - rerun.pop("wall_start")
+    rerun["cpu_s"] = time.process_time() - rerun.pop("cpu_start")
+    _current.history.append(rerun)
+    return rerun
+
+def stage_summary(history):
+    """
+    p50/p95 of the wall and CPU time of each stage (and of the whole rerun, as
+    'total', or 'total (<fragment>)' for fragment reruns) over the recorded reruns,
+    in milliseconds.
+    """
+    rows = [
+        {"stage": s["stage"], "wall_s": s["wall_s"], "cpu_s": s["cpu_s"]}
+        for rerun in history for s in rerun["stages"]
+    ] + [
+        {"stage": _total_name(rerun), "wall_s": rerun["wall_s"], "cpu_s": rerun["cpu_s"]}
+        for rerun in history
+    ]
+    if not rows:
+        return pd.DataFrame()
+    frame = pd.DataFrame(rows)
+    summary = frame.groupby("stage", sort=False).agg(
+        runs=("wall_s", "size"),
+        wall_p50_ms=("wall_s", lambda s: 1e3 * np.percentile(s, 50)),
+        wall_p95_ms=("wall_s", lambda s: 1e3 * np.percentile(s, 95)),
+        cpu_p50_ms=("cpu_s", lambda s: 1e3 * np.percentile(s, 50)),
+        cpu_p95_ms=("cpu_s", lambda s: 1e3 * np.percentile(s, 95)),
+    )
+    return summary.round(2)
+
+def _total_name(rerun):
+    return f"total ({rerun['fragment']})" if rerun.get("fragment") else "total"
+
+def performance_panel(config_labels, store=None):
+    """
+    Sidebar panel with the stages of the latest rerun and the percentiles of all
+    recorded reruns; with store (store_manager.store_stats), also the resident data
+    files and the eviction counters.
+    """
+    history = st.session_state.get(HISTORY_KEY) or []
+    with st.sidebar.expander(config_labels["headers"]["performance"], expanded=True):
+        if not history:
+            st.caption("No reruns recorded yet.")
+            return
+        latest = history[-1]
+        scope = f" of the {latest['fragment']} fragment" if latest.get("fragment") else ""
+        st.caption(f"Latest rerun{scope}: {1e3 * latest['wall_s']:.1f} ms wall, {1e3 * latest['cpu_s']:.1f} ms CPU")
+        stages = pd.DataFrame(latest["stages"])
+        if not stages.empty:
+            stages["wall_ms"] = (1e3 * stages.pop("wall_s")).round(2)
+            stages["cpu_ms"] = (1e3 * stages.pop("cpu_s")).round(2)
+            if stages["alloc_bytes"].isna().all():
+                stages = stages.drop(columns="alloc_bytes")
+            top_sites = dict(zip(stages["stage"], stages.pop("top_sites"))) if "top_sites" in stages else {}
+            stages = stages.drop(columns="snapshots", errors="ignore")
+            st.dataframe(stages.set_index("stage"))
+            if top_sites:
+                selected = st.selectbox("Top allocation sites of", list(top_sites), key="_performance_sites_stage")
+                st.dataframe(pd.DataFrame(top_sites[selected]), hide_index=True)
+            if latest.get("memory") and latest["memory"]["dir"] is not None:
+                st.caption(f"Snapshots written to {latest['memory']['dir']}")
+        st.caption(f"Percentiles over the last {len(history)} reruns")
+        st.dataframe(stage_summary(history))
+        sizes = st.session_state.get(SIZES_KEY)
+        if sizes:
+            st.caption("Deep size of the loaded data dicts")
+            st.dataframe(pd.DataFrame.from_dict(sizes, orient="index").drop(columns="id").assign(MiB=lambda d: (d["bytes"] / 2**20).round(2)))
+        if store is not None:
+            st.caption(
+                f"Data store: {store['resident_bytes'] / 2**20:.1f} MiB resident in {len(store['files'])} files; "
+                f"{store['hits']} hits, {store['misses']} loads, {store['evictions']} evictions "
+                f"({store['evicted_bytes'] / 2**20:.1f} MiB)"
+            )
+            if store["files"]:
+                st.dataframe(pd.DataFrame(store["files"]).set_index("file"))
+
+def diff_snapshots(old, new, key_type="lineno", limit=20):
+    """
+    Compares two snapshots written by the memory profiling mode.
+
+    Returns:
+        list: The tracemalloc.StatisticDiff of the largest net allocations, largest first.
+    """
+    stats = tracemalloc.Snapshot.load(str(new)).compare_to(tracemalloc.Snapshot.load(str(old)), key_type)
+    return sorted(stats, key=lambda stat: stat.size_diff, reverse=True)[:limit]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Diff two tracemalloc snapshots written by the memory profiling mode.")
+    parser.add_argument("old", help="Earlier snapshot, e.g. 01_load_data_dict_before.tracemalloc")
+    parser.add_argument("new", help="Later snapshot")
+    parser.add_argument("--key-type", default="lineno", choices=["lineno", "filename", "traceback"])
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+    stats = diff_snapshots(args.old, args.new, args.key_type, args.limit)
+    for stat in stats:
+        print(stat)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -246,4 +246,55 @@ def get_all_distinct_parameter_values(
             # Sort by their string representation
             result[param_name] = sorted(list(values_set), key=str)
             
-    return result
\ No newline at end of file
+    return result
+
+
+def build_data_index(
+    dict_of_all_plots: dict,
+    selection_names: list[str] = ("db", "analysis", "column", "agg", "ref", "group"),
+    item_name: str = "target",
+    preserved_types_in_keys: bool = True
+) -> dict:
+    """
+    Parses every key once into a lookup index, so the sidebar does not have to parse
+    all keys on each rerun.
+
+    Args:
+        dict_of_all_plots (dict): The main dictionary keyed by key_generator strings.
+        selection_names (list[str]): Parameters that make up a selection.
+        item_name (str): Parameter listed per selection (the targets).
+        preserved_types_in_keys (bool): Flag indicating if types were preserved
+                                        during key generation. Defaults to True.
+
+    Returns:
+        dict: 'options': the output of get_all_distinct_parameter_values for the
+              selection parameters and item_name; 'items': tuple of selection
+              values -> sorted list of the item values available for it.
+    """
+    items = {}
+    for key_str in dict_of_all_plots.keys():
+        try:
+            params_dict = reverse_key_generator(key_str, preserved_types=preserved_types_in_keys)
+        except ValueError:
+            continue
+        if item_name in params_dict:
+            selection = tuple(params_dict.get(name) for name in selection_names)
+            items.setdefault(selection, set()).add(params_dict[item_name])
+
+    options = {name: set() for name in list(selection_names) + [item_name]}
+    for selection, values in items.items():
+        for name, value in zip(selection_names, selection):
+            if value is not None:
+                options[name].add(value)
+        options[item_name].update(values)
+
+    def _sorted(values):
+        try:
+            return sorted(values)
+        except TypeError:
+            return sorted(values, key=str)
+
+    return {
+        "options": {name: _sorted(values) for name, values in options.items()},
+        "items": {selection: _sorted(values) for selection, values in items.items()},
+    }
@@ -1,20 +1,104 @@
 # filepath: /home/diego/Dropbox/DropboxGit/VizApp/src/modelviz/plotting.py
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
+import numpy as np
+from functools import lru_cache
+import plotly.colors
+from plotly.colors import make_colorscale
 from plotly.subplots import make_subplots
-from .keygen import key_generator
+from .data_loader import entry_view
 
-def create_figure(data_dict, config_labels, config_colors, custom_xticks, selected_db, selected_analysis, selected_column, selected_agg, selected_ref, selected_group, selected_targets, var_y_type, y0):
-    # Determine if we have a third subplot
-    add_third_subplot = (selected_group != 'all')
+# Defaults of the config_performance options read by the figure builders
+DEFAULT_PERFORMANCE = {
+    # Above these sizes SVG line traces get slow in the browser, so go.Scattergl is used
+    "webgl_point_threshold": 20000,
+    "webgl_trace_threshold": 60,
+    # One line trace per target and subplot, with the groups separated by gaps
+    "consolidate_traces": False,
+    # ...only from this many per-group line traces: the hover labels of the groups make
+    # a consolidated figure about 3x larger, which only pays off against many traces
+    "consolidate_trace_threshold": 200,
+    # Above this many groups the grouped histogram is drawn as a single heatmap
+    "group_heatmap_threshold": 15,
+    # Float arrays are sent as float32 when this relative precision is kept (None: always float64)
+    "float32_rtol": 1e-6,
+    # Cap on the points packed into the client-side exploration figure (None: no cap)
+    "exploration_max_points": 500000,
+}
 
-    # Get figure size from configuration
-    fig_width, fig_height = config_labels["plot"]["fig_size"]
-    if add_third_subplot:
-        fig_height = int(fig_height * 1.5)  # Increase height for three subplots
+# Trace properties converted with typed_array
+TYPED_ARRAY_KEYS = ("x", "y", "z")
+
+# Vertical spacing between the subplot rows
+VERTICAL_SPACING = 0.15
+
+HEATMAP_COLORSCALE = make_colorscale(plotly.colors.sequential.Viridis)
+
+# Axis references of each (row, secondary_y) cell of the subplot grid built in create_figure
+AXIS_REFS = {
+    (1, False): ("x", "y"),
+    (1, True): ("x", "y2"),
+    (2, False): ("x2", "y3"),
+    (2, True): ("x2", "y4"),
+    (3, False): ("x3", "y5"),
+}
+
+def create_figure(data_dict, config_labels, config_colors, custom_xticks, selected_db, selected_analysis, selected_column, selected_agg, selected_ref, selected_group, selected_targets, var_y_type, y0, config_performance=None):
+    traces, layout, add_third_subplot = build_figure_parts(
+        data_dict, config_labels, config_colors, custom_xticks,
+        selected_db, selected_analysis, selected_column, selected_agg, selected_ref,
+        selected_group, selected_targets, var_y_type, y0, config_performance
+    )
+    rows, subplot_titles, specs = subplot_grid(config_labels, add_third_subplot)
+
+    # Prepare the figure
+    fig_plotly = make_subplots(
+        rows=rows, cols=1,
+        subplot_titles=subplot_titles,
+        shared_xaxes=False,
+        vertical_spacing=VERTICAL_SPACING,
+        specs=specs
+    )
+    for trace, row, secondary_y in traces:
+        if row == 3:
+            fig_plotly.add_trace(trace, row=row, col=1)
+        else:
+            fig_plotly.add_trace(trace, row=row, col=1, secondary_y=secondary_y)
+    fig_plotly.update_layout(layout)
+
+    # If custom xticks available for selected_column, apply them
+    # if selected_column in custom_xticks:
+    #     xticks = custom_xticks[selected_column]['xticks']
+    #     xticklabels = custom_xticks[selected_column]['xticklabels']
 
-    # Determine subplot rows
+    #     # Update x-axis for first two subplots
+    #     fig_plotly.update_xaxes(
+    #         tickmode='array',
+    #         tickvals=xticks,
+    #         ticktext=xticklabels,
+    #         row=1, col=1
+    #     )
+    #     fig_plotly.update_xaxes(
+    #         tickmode='array',
+    #         tickvals=xticks,
+    #         ticktext=xticklabels,
+    #         row=2, col=1
+    #     )
+    #     # Also update third if it exists
+    #     if add_third_subplot:
+    #         fig_plotly.update_xaxes(
+    #             tickmode='array',
+    #             tickvals=xticks,
+    #             ticktext=xticklabels,
+    #             row=3, col=1
+    #         )
+
+    return fig_plotly, add_third_subplot
+
+def subplot_grid(config_labels, add_third_subplot):
+    """
+    Returns (rows, subplot_titles, specs) of the make_subplots grid used by the figure.
+    """
     if add_third_subplot:
         rows = 3
         subplot_titles = (
@@ -22,32 +106,54 @@ def create_figure(data_dict, config_labels, config_colors, custom_xticks, select
             config_labels["plot"]["title_var_y"],
             config_labels["plot"]["title_group_hist"]
         )
-        specs = [
-            [{"secondary_y": True}],
-            [{"secondary_y": True}],
-            [{}]
-        ]
     else:
         rows = 2
         subplot_titles = (
             config_labels["plot"]["title_line"],
             config_labels["plot"]["title_var_y"]
         )
-        specs = [
-            [{"secondary_y": True}],
-            [{"secondary_y": True}]
-        ]
+    return rows, subplot_titles, subplot_specs(rows)
 
-    # Prepare the figure
-    fig_plotly = make_subplots(
-        rows=rows, cols=1,
-        subplot_titles=subplot_titles,
-        shared_xaxes=False,
-        vertical_spacing=0.15,
-        specs=specs
-    )
+def subplot_specs(rows):
+    # The line and var_y subplots carry the histogram bars on a secondary y-axis
+    specs = [
+        [{"secondary_y": True}],
+        [{"secondary_y": True}]
+    ]
+    if rows == 3:
+        specs.append([{}])
+    return specs
+
+def build_figure_parts(data_dict, config_labels, config_colors, custom_xticks, selected_db, selected_analysis, selected_column, selected_agg, selected_ref, selected_group, selected_targets, var_y_type, y0, config_performance=None):
+    """
+    Builds the traces and layout of the figure as plain dicts, independent of how the
+    figure object is assembled (create_figure or figure_spec.build_figure_spec).
 
+    Returns:
+        tuple: (traces, layout, add_third_subplot) where traces is a list of
+               (trace_dict, row, secondary_y) in drawing order and layout holds the
+               layout properties, with axes named as in AXIS_REFS.
+    """
+    # Determine if we have a third subplot
+    add_third_subplot = (selected_group != 'all')
+
+    # Get figure size from configuration
+    fig_width, fig_height = config_labels["plot"]["fig_size"]
+    if add_third_subplot:
+        fig_height = int(fig_height * 1.5)  # Increase height for three subplots
+
+    traces = []
+    layout = {}
     plotly_palette = config_colors["plotly_palette"]
+    x_label = config_labels['plot']['x_label']
+    line_hovertemplate = (
+        f"{x_label}: %{{x}}<br>"
+        f"%{{y}}<extra>%{{fullData.name}}</extra>"
+    )
+    bar_hovertemplate = (
+        f"{x_label}: %{{x}}<br>"
+        f"{config_labels['labels']['bar_plot']}: %{{y}}<extra>%{{fullData.name}}</extra>"  # Use the label from config
+    )
 
     # We'll handle the bar plot only once, using the first selected target
     first_target = selected_targets[0]
@@ -64,51 +170,72 @@ def create_figure(data_dict, config_labels, config_colors, custom_xticks, select
     first_data = get_data_entry(data_dict, params)
     dfh_first = first_data['dfh']
 
-    if selected_column in custom_xticks:
-        dfh_first['x'] = dfh_first['x'].map(map_xticks(custom_xticks[selected_column]))
-        dfh_first = dfh_first.sort_values('x')
-
     if dfh_first.empty:
         st.error("No bar plot data available for the selected configuration.")
         st.stop()
 
-    group_list = None
+    # The cached frames are never modified: the tick mapping produces new arrays
+    xtick_lookup = compile_xticks(custom_xticks[selected_column]) if selected_column in custom_xticks else None
+    dfh_x = dfh_first['x'].to_numpy()
+    dfh_y = dfh_first['y'].to_numpy()
+    if xtick_lookup is not None:
+        x_codes = xtick_codes(dfh_x, xtick_lookup)
+        order = np.argsort(x_codes, kind='stable')
+        dfh_x = xtick_lookup[2][x_codes][order]
+        dfh_y = dfh_y[order]
 
     # ---------------------------------------------
     # If we have a third subplot (grouped histogram per group), plot dfhg
     if add_third_subplot and 'dfhg' in first_data:
         dfhg_first = first_data['dfhg']
-        if selected_column in custom_xticks:
-            dfhg_first['x'] = dfhg_first['x'].map(map_xticks(custom_xticks[selected_column]))
-            group_list = dfhg_first['group'].unique().tolist()
-            dfhg_first['order'] = dfhg_first['group'].apply(lambda g: group_list.index(g))
-            dfhg_first = dfhg_first.sort_values(['order','x'])
+        hg_x = dfhg_first['x'].to_numpy()
+        hg_y = dfhg_first['y'].to_numpy()
+        # Groups numbered in order of first appearance
+        hg_group_codes, unique_groups_hg = pd.factorize(dfhg_first['group'])
+        if xtick_lookup is not None:
+            x_codes = xtick_codes(hg_x, xtick_lookup)
+            order = np.lexsort((x_codes, hg_group_codes))
+            hg_x = xtick_lookup[2][x_codes][order]
+            hg_y = hg_y[order]
+            hg_group_codes = hg_group_codes[order]
+            hg_x_codes = x_codes[order]
+        else:
+            hg_x_codes = None
 
-        if not dfhg_first.empty:
+        heatmap_threshold = performance_option(config_performance, "group_heatmap_threshold")
+        if dfhg_first.empty:
+            st.warning("dfhg is empty for the selected configuration.")
+        elif heatmap_threshold is not None and len(unique_groups_hg) > heatmap_threshold:
+            traces.append((
+                group_histogram_heatmap(
+                    hg_x, hg_y, hg_group_codes, unique_groups_hg, hg_x_codes,
+                    x_label, config_labels['labels']['bar_plot']
+                ),
+                3, False
+            ))
+            layout["yaxis5"] = dict(type='category')
+        else:
             # group-based histogram: one bar trace per group
-            unique_groups_hg = dfhg_first['group'].unique()
             for idx, g in enumerate(unique_groups_hg):
-                group_dfhg = dfhg_first[dfhg_first['group'] == g]
+                in_group = hg_group_codes == idx
                 color = plotly_palette[idx % len(plotly_palette)]
-                fig_plotly.add_trace(
-                    go.Bar(
-                        x =group_dfhg['x'],
-                        y=group_dfhg['y'],
+                traces.append((
+                    dict(
+                        type='bar',
+                        x=hg_x[in_group],
+                        y=hg_y[in_group],
                         name=f"Group {g} Hist",
                         marker=dict(color=color),
-                        opacity=0.7
+                        opacity=0.7,
+                        hovertemplate=bar_hovertemplate
                     ),
-                    row=3, col=1
-                )
+                    3, False
+                ))
             # Set barmode to group so bars appear side-by-side
-            fig_plotly.update_layout(barmode='group')
-        else:
-            st.warning("dfhg is empty for the selected configuration.")
-
-    # A line index to differentiate line colors for each target-group combination
-    line_index = 0
+            layout['barmode'] = 'group'
 
-    # Loop over selected targets to plot line data
+    # Collect the line data first so the trace type can be chosen from the total size
+    line_frames = []
     for target in selected_targets:
         params = {
             "db": selected_db,
@@ -125,101 +252,117 @@ def create_figure(data_dict, config_labels, config_colors, custom_xticks, select
         if df.empty:
             st.error(f"No line plot data available for the target: {target}")
             continue
+        line_frames.append((target, selected_data))
+
+    consolidate = use_consolidation([entry for _, entry in line_frames], config_performance)
+    n_points = sum(len(entry['df']) for _, entry in line_frames)
+    if consolidate:
+        n_traces = 2 * len(line_frames)
+    else:
+        n_traces = sum(2 * entry['df']['group'].nunique() for _, entry in line_frames)
+    scatter_type = 'scattergl' if use_webgl(n_points, n_traces, config_performance) else 'scatter'
 
-        df_sorted = df.sort_values(by=['group', 'x'])
+    # A line index to differentiate line colors for each target-group combination
+    line_index = 0
 
-        # Compute var_y on the fly
-        y_min = df_sorted['y'].min()
-        y_max = df_sorted['y'].max()
+    # Loop over selected targets to plot line data
+    for target, selected_data in line_frames:
+        df_sorted = selected_data['df'].sort_values(by=['group', 'x'])
 
-        if var_y_type == 'min':
-            var_y = 100 * (df_sorted['y'] - y_min) / y_min
-        elif var_y_type == 'max':
-            var_y = 100 * (df_sorted['y'] - y_max) / y_max
-        else:
-            # specific key from dictionary_aggregated_values
-            var_y = 100 * (df_sorted['y'] - y0) / y0
+        # var_y is precomputed by the loader; this is a lookup aligned with the df index
+        var_y = get_var_y(selected_data, var_y_type, y0)
+
+        if consolidate:
+            target_traces, n_groups = consolidated_line_traces(
+                target, df_sorted, var_y, line_index, plotly_palette, scatter_type, x_label
+            )
+            traces.extend(target_traces)
+            line_index += n_groups
+            continue
 
         unique_groups_data = df_sorted['group'].unique()
 
         for g in unique_groups_data:
             group_df = df_sorted[df_sorted['group'] == g]
             color = plotly_palette[line_index % len(plotly_palette)]
-            fig_plotly.add_trace(
-                go.Scatter(
-                    x=group_df['x'],
-                    y=group_df['y'],
+            traces.append((
+                dict(
+                    type=scatter_type,
+                    x=group_df['x'].to_numpy(),
+                    y=group_df['y'].to_numpy(),
                     mode='lines+markers',
                     name=f"{target}-{g}",
+                    meta=dict(target=str(target)),
                     line=dict(color=color),
-                    marker=dict(color=color)
+                    marker=dict(color=color),
+                    hovertemplate=line_hovertemplate
                 ),
-                row=1, col=1,
-                secondary_y=False
-            )
+                1, False
+            ))
             # Plot lines for var_y vs X (bottom subplot)
             var_y_group = var_y[group_df.index]
-            fig_plotly.add_trace(
-                go.Scatter(
-                    x=group_df['x'],
-                    y=var_y_group,
+            traces.append((
+                dict(
+                    type=scatter_type,
+                    x=group_df['x'].to_numpy(),
+                    y=var_y_group.to_numpy(),
                     mode='lines+markers',
                     name=f"{target}-{g} Var Y",
+                    meta=dict(target=str(target)),
                     line=dict(color=color),
                     marker=dict(color=color),
-                    showlegend=False
+                    showlegend=False,
+                    hovertemplate=line_hovertemplate
                 ),
-                row=2, col=1,
-                secondary_y=False
-            )
+                2, False
+            ))
 
             line_index += 1
     # ---------------------------------------------
     # Add bar plot once to the first two subplots
-    fig_plotly.add_trace(
-        go.Bar(
-            x=dfh_first['x'],
-            y=dfh_first['y'],
+    traces.append((
+        dict(
+            type='bar',
+            x=dfh_x,
+            y=dfh_y,
             name=config_labels["labels"]["bar_plot"],  # Use the label from config
             marker=dict(color=config_colors["bar_plot"]),
-            opacity=0.3
+            opacity=0.3,
+            hovertemplate=bar_hovertemplate
         ),
-        row=1, col=1,
-        secondary_y=True
-    )
-    fig_plotly.add_trace(
-        go.Bar(
-            x=dfh_first['x'],
-            y=dfh_first['y'],
+        1, True
+    ))
+    traces.append((
+        dict(
+            type='bar',
+            x=dfh_x,
+            y=dfh_y,
             name=config_labels["labels"]["bar_plot_var_y"],  # Use the label from config
             marker=dict(color=config_colors["bar_plot"]),
             opacity=0.3,
-            showlegend=False
+            showlegend=False,
+            hovertemplate=bar_hovertemplate
         ),
-        row=2, col=1,
-        secondary_y=True
-    )
+        2, True
+    ))
     # ---------------------------------------------
 
     # If after looping no data was plotted (e.g., all were empty), stop
-    if len(fig_plotly.data) == 0:
+    if len(traces) == 0:
         st.error("No data was plotted. Check your selections.")
         st.stop()
     # ---------------------------------------------
-    # Update axes titles
-    fig_plotly.update_yaxes(title_text=config_labels["plot"]["y_label_line"], row=1, col=1, secondary_y=False)
-    fig_plotly.update_yaxes(title_text="Bar Plot Y-Axis", row=1, col=1, secondary_y=True)
-    fig_plotly.update_yaxes(title_text=config_labels["plot"]["y_label_var_y"], row=2, col=1, secondary_y=False)
-    fig_plotly.update_yaxes(title_text="Bar Plot Y-Axis", row=2, col=1, secondary_y=True)
-    if add_third_subplot:
-        fig_plotly.update_yaxes(title_text="Grouped Histogram Y-Axis", row=3, col=1)
-
-    fig_plotly.update_xaxes(title_text=config_labels["plot"]["x_label"], row=2, col=1)
+    # Axes titles
+    layout["yaxis"] = dict(title=dict(text=config_labels["plot"]["y_label_line"]))
+    layout["yaxis2"] = dict(title=dict(text="Bar Plot Y-Axis"))
+    layout["yaxis3"] = dict(title=dict(text=config_labels["plot"]["y_label_var_y"]))
+    layout["yaxis4"] = dict(title=dict(text="Bar Plot Y-Axis"))
+    layout["xaxis2"] = dict(title=dict(text=x_label))
     if add_third_subplot:
-        fig_plotly.update_xaxes(title_text=config_labels["plot"]["x_label"], row=3, col=1)
+        layout.setdefault("yaxis5", {})["title"] = dict(text="Grouped Histogram Y-Axis")
+        layout["xaxis3"] = dict(title=dict(text=x_label))
 
-    # Update layout
-    fig_plotly.update_layout(
+    layout.update(
         height=fig_height,
         width=fig_width,
         showlegend=True,
@@ -235,51 +378,228 @@ def create_figure(data_dict, config_labels, config_colors, custom_xticks, select
         margin=dict(l=50, r=50, t=100, b=50)
     )
 
-    # Update hover templates
-    for trace in fig_plotly['data']:
-        if trace['type'] == 'scatter':
-            trace['hovertemplate'] = (
-                f"{config_labels['plot']['x_label']}: %{{x}}<br>"
-                f"%{{y}}<extra>%{{fullData.name}}</extra>"
-            )
-        elif trace['type'] == 'bar':
-            trace['hovertemplate'] = (
-                f"{config_labels['plot']['x_label']}: %{{x}}<br>"
-                f"{config_labels['labels']['bar_plot']}: %{{y}}<extra>%{{fullData.name}}</extra>"  # Use the label from config
-            )
+    # Numeric data is sent as compact base64 typed arrays
+    float32_rtol = performance_option(config_performance, "float32_rtol")
+    for trace, _, _ in traces:
+        for name in TYPED_ARRAY_KEYS:
+            if name in trace:
+                trace[name] = typed_array(trace[name], float32_rtol)
 
-    # If custom xticks available for selected_column, apply them
-    # if selected_column in custom_xticks:
-    #     xticks = custom_xticks[selected_column]['xticks']
-    #     xticklabels = custom_xticks[selected_column]['xticklabels']
+    return traces, layout, add_third_subplot
 
-    #     # Update x-axis for first two subplots
-    #     fig_plotly.update_xaxes(
-    #         tickmode='array',
-    #         tickvals=xticks,
-    #         ticktext=xticklabels,
-    #         row=1, col=1
-    #     )
-    #     fig_plotly.update_xaxes(
-    #         tickmode='array',
-    #         tickvals=xticks,
-    #         ticktext=xticklabels,
-    #         row=2, col=1
-    #     )
-    #     # Also update third if it exists
-    #     if add_third_subplot:
-    #         fig_plotly.update_xaxes(
-    #             tickmode='array',
-    #             tickvals=xticks,
-    #             ticktext=xticklabels,
-    #             row=3, col=1
-    #         )
+def group_histogram_heatmap(x, y, group_codes, groups, x_codes, x_label, value_label):
+    """
+    Builds the grouped histogram as one heatmap trace (x across, one row per group)
+    instead of one bar trace per group. The x by group matrix is filled in a single
+    vectorized assignment; missing (x, group) cells stay NaN.
+
+    Args:
+        x, y (np.ndarray): dfhg 'x' (already tick-mapped) and 'y' values.
+        group_codes (np.ndarray): Row of each point in groups.
+        groups (pd.Index): Group names, in row order.
+        x_codes (np.ndarray or None): Column of each point when x follows custom ticks
+                                      (see xtick_codes); otherwise x is sorted.
+    """
+    if x_codes is None:
+        x_codes, x_values = pd.factorize(x, sort=True)
+        x_values = np.asarray(x_values)
+    else:
+        used_codes, x_codes = np.unique(x_codes, return_inverse=True)
+        x_values = np.empty(len(used_codes), dtype=object)
+        x_values[x_codes] = x
+    z = np.full((len(groups), len(x_values)), np.nan)
+    z[group_codes, x_codes] = y
+    return dict(
+        type='heatmap',
+        x=x_values,
+        y=np.asarray(groups.astype(str), dtype=object),
+        z=z,
+        # Expanded like graph_objects validation does for named scales
+        colorscale=HEATMAP_COLORSCALE,
+        # Colorbar next to the third subplot
+        colorbar=dict(len=(1 - 2 * VERTICAL_SPACING) / 3, y=0, yanchor='bottom'),
+        hovertemplate=(
+            f"{x_label}: %{{x}}<br>Group: %{{y}}<br>"
+            f"{value_label}: %{{z}}<extra></extra>"
+        )
+    )
+
+def consolidated_line_traces(target, df_sorted, var_y, line_index, plotly_palette, scatter_type, x_label):
+    """
+    Builds the two line traces (row 1: y, row 2: var_y) of one target with all of its
+    groups merged into a single trace. Groups are separated by NaN gaps, the markers
+    keep the per-group colors and the hover shows the group of each point.
+
+    Args:
+        df_sorted (pd.DataFrame): The target's df sorted by ['group', 'x'].
+        var_y (pd.Series): var_y indexed like df_sorted.
+        line_index (int): Palette index of the target's first group.
+
+    Returns:
+        tuple: (traces, n_groups) with traces as (trace_dict, row, secondary_y).
+    """
+    group_codes, groups = pd.factorize(df_sorted['group'])
+    # A gap is inserted before the first point of every group but the first
+    gaps = np.flatnonzero(np.diff(group_codes)) + 1
+
+    x = _insert_gaps(df_sorted['x'].to_numpy(), gaps)
+    y = _insert_gaps(df_sorted['y'].to_numpy(), gaps)
+    var_y_values = _insert_gaps(var_y[df_sorted.index].to_numpy(), gaps)
+    group_labels = np.insert(groups.astype(str).to_numpy(dtype=object)[group_codes], gaps, "")
+    # Marker colors are sent as palette indices with a discrete colorscale, which
+    # serializes as a compact numeric array instead of one color string per point
+    n_colors = len(plotly_palette)
+    point_colors = np.insert((line_index + group_codes) % n_colors, gaps, 0).astype(np.int16)
+    colorscale = [
+        [bound / n_colors, color]
+        for i, color in enumerate(plotly_palette)
+        for bound in (i, i + 1)
+    ]
+
+    hovertemplate = (
+        f"{x_label}: %{{x}}<br>"
+        f"%{{y}}<br>Group: %{{customdata}}<extra>%{{fullData.name}}</extra>"
+    )
+    line_color = plotly_palette[line_index % len(plotly_palette)]
+    common = dict(
+        type=scatter_type,
+        x=x,
+        mode='lines+markers',
+        line=dict(color=line_color),
+        marker=dict(color=point_colors, colorscale=colorscale, cmin=-0.5, cmax=n_colors - 0.5),
+        customdata=group_labels,
+        legendgroup=str(target),
+        meta=dict(target=str(target)),
+        hovertemplate=hovertemplate
+    )
+    traces = [
+        (dict(common, y=y, name=str(target)), 1, False),
+        (dict(common, y=var_y_values, name=f"{target} Var Y", showlegend=False), 2, False),
+    ]
+    return traces, len(groups)
+
+def _insert_gaps(values, gaps):
+    # NaN for numeric arrays, None for anything else (e.g. string x values)
+    if np.issubdtype(values.dtype, np.number):
+        return np.insert(values.astype(float), gaps, np.nan)
+    return np.insert(values.astype(object), gaps, None)
+
+def typed_array(values, float32_rtol=None):
+    """
+    Converts trace data to a NumPy array that Plotly serializes as a base64 typed
+    array instead of a JSON number list.
+
+    Object arrays holding only numbers (and None/NaN) become float arrays; arrays of
+    strings are returned unchanged since they cannot be typed. Float arrays are
+    downcast to float32 when every finite value keeps the relative precision
+    float32_rtol (None keeps float64).
+    """
+    arr = np.asarray(values)
+    if arr.dtype == object or arr.dtype.kind == 'b':
+        if pd.api.types.infer_dtype(arr.ravel(), skipna=True) not in ('integer', 'floating', 'mixed-integer-float', 'boolean', 'empty'):
+            return arr
+        arr = arr.astype(float)
+    if arr.dtype.kind == 'f' and arr.dtype != np.float32 and float32_rtol is not None:
+        with np.errstate(over='ignore'):
+            arr32 = arr.astype(np.float32)
+        finite = np.isfinite(arr)
+        if np.array_equal(np.isfinite(arr32), finite) and np.allclose(arr32[finite], arr[finite], rtol=float32_rtol, atol=0):
+            arr = arr32
+    return arr
+
+def performance_option(config_performance, key):
+    """Returns config_performance[key], falling back to DEFAULT_PERFORMANCE."""
+    if config_performance and key in config_performance:
+        return config_performance[key]
+    return DEFAULT_PERFORMANCE[key]
+
+def use_webgl(n_points, n_traces, config_performance=None):
+    """
+    Decides whether line traces should be drawn with WebGL (go.Scattergl) instead of SVG.
+
+    WebGL is used as soon as either the total number of points or the number of
+    line traces reaches its threshold in config_performance. Missing keys fall back
+    to DEFAULT_PERFORMANCE; a threshold of None disables that criterion.
+    """
+    point_limit = performance_option(config_performance, "webgl_point_threshold")
+    trace_limit = performance_option(config_performance, "webgl_trace_threshold")
+    return (
+        (point_limit is not None and n_points >= point_limit)
+        or (trace_limit is not None and n_traces >= trace_limit)
+    )
+
+def use_consolidation(entries, config_performance=None):
+    """
+    Decides whether the groups of each target are merged into one line trace per
+    subplot (consolidated_line_traces): only with 'consolidate_traces' on, and once the
+    entries would draw at least 'consolidate_trace_threshold' per-group line traces
+    (None: always).
+    """
+    if not performance_option(config_performance, "consolidate_traces"):
+        return False
+    trace_limit = performance_option(config_performance, "consolidate_trace_threshold")
+    return trace_limit is None or sum(2 * entry['df']['group'].nunique() for entry in entries) >= trace_limit
+
+def get_var_y(entry, var_y_type, y0):
+    """
+    Returns var_y for the rows of entry['df'] as a Series indexed like df.
+
+    Uses the table precomputed by data_loader.precompute_var_y when it holds
+    var_y_type, otherwise computes it on the fly against min, max or y0.
+    """
+    df = entry['df']
+    modes = entry.get('var_y_modes')
+    if modes is not None and var_y_type in modes:
+        return pd.Series(entry['var_y_table'][modes.index(var_y_type)], index=df.index)
+
+    if var_y_type == 'min':
+        ref = df['y'].min()
+    elif var_y_type == 'max':
+        ref = df['y'].max()
+    else:
+        # specific key from dictionary_aggregated_values
+        ref = y0
+    return 100 * (df['y'] - ref) / ref
 
-    return fig_plotly, add_third_subplot
 def map_xticks(d):
     return dict(zip(d['xticks'], d['xticklabels']))
 
+def compile_xticks(d):
+    """
+    Compiles a custom_xticks entry ({'xticks': [...], 'xticklabels': [...]}) into
+    lookup arrays (sorted ticks, their positions in 'xticks', labels). The result is
+    cached, so each column's mapping is compiled once.
+
+    The labels array has one extra NaN slot at the end for values without a tick.
+    """
+    return _compile_xticks(tuple(d['xticks']), tuple(d['xticklabels']))
+
+@lru_cache(maxsize=128)
+def _compile_xticks(xticks, xticklabels):
+    ticks = np.asarray(xticks)
+    sorter = np.argsort(ticks, kind='stable')
+    labels = np.empty(len(xticklabels) + 1, dtype=object)
+    labels[:-1] = xticklabels
+    labels[-1] = np.nan
+    return ticks[sorter], sorter, labels
+
+def xtick_codes(values, xtick_lookup):
+    """
+    Returns the position of each value in the 'xticks' list of a compiled mapping
+    (see compile_xticks), or len(xticks) for values without a tick, so that the codes
+    index the labels array and sort values in tick order.
+    """
+    sorted_ticks, sorter, _ = xtick_lookup
+    values = np.asarray(values)
+    n_ticks = len(sorted_ticks)
+    if n_ticks == 0:
+        return np.zeros(len(values), dtype=np.intp)
+    pos = np.minimum(np.searchsorted(sorted_ticks, values), n_ticks - 1)
+    found = sorted_ticks[pos] == values
+    return np.where(found, sorter[pos], n_ticks)
+
 def get_data_entry(data_dict, params):
     from .keygen import key_generator
     key = key_generator(params, preserve_types=True)
-    return data_dict[key]
\ No newline at end of file
+    # A view, so changes made by the caller stay out of the shared store
+    return entry_view(data_dict[key])
\ No newline at end of file
@@ -0,0 +1,116 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import streamlit as st
+from .data_loader import load_data_index, load_data_store
+from .store_manager import get_data_store
+
+DATA_PATTERNS = ("*.json", "*.jsonl")
+# Seconds between two refreshes of the progress shown while a file is warming
+POLL_INTERVAL = 1.0
+
+def prewarm_files(data_dir, files=(), n_recent=2):
+    """
+    Data files to warm: the configured file names that exist in data_dir, or else the
+    n_recent most recently modified data files.
+    """
+    data_dir = Path(data_dir)
+    if files:
+        return [data_dir / name for name in files if (data_dir / name).is_file()]
+    candidates = [f for pattern in DATA_PATTERNS for f in data_dir.glob(pattern)]
+    return sorted(candidates, key=lambda f: f.stat().st_mtime, reverse=True)[:n_recent]
+
+@st.cache_resource(show_spinner=False)
+def start_prewarm(data_dir, files=(), n_recent=2, reference_values=None, max_workers=2, memory_budget=None):
+    """
+    Starts loading data files into the shared store (store_manager.get_data_store,
+    under memory_budget) and building their key indexes (load_data_index) in
+    background threads, once per process: the first session to run starts it and the
+    files are ready for the sessions that follow.
+
+    The arguments of the loaders must match those of the app's own calls, so the
+    warmed entries are the ones the app looks up: the path is data_dir / name,
+    reference_values is passed through and the modification time is read here.
+
+    Returns:
+        dict: Shared state, updated by the threads: 'files' maps each file name to
+              its 'status' ('pending', 'loading', 'indexing', 'ready' or 'error'),
+              'done' and 'total' entries decoded, and 'error'.
+    """
+    state = {"lock": threading.Lock(), "files": {}}
+    paths = prewarm_files(data_dir, files, n_recent)
+    for path in paths:
+        state["files"][path.name] = {"status": "pending", "done": 0, "total": None, "error": None}
+    if paths:
+        pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prewarm")
+        for path in paths:
+            pool.submit(_warm_file, state, Path(data_dir) / path.name, reference_values, memory_budget)
+        # The threads finish the queued files; nothing waits for them
+        pool.shutdown(wait=False)
+    return state
+
+def _warm_file(state, path, reference_values, memory_budget):
+    status = state["files"][path.name]
+
+    def progress(done, total):
+        with state["lock"]:
+            status.update(done=done, total=total)
+
+    try:
+        modified = path.stat().st_mtime
+        with state["lock"]:
+            status["status"] = "loading"
+        if not get_data_store(path, reference_values, modified, memory_budget, _progress=progress):
+            # The loader's error message was shown to no one; leave the file to the app's
+            # own load, which reports it
+            load_data_store.clear(path, reference_values, modified)
+            with state["lock"]:
+                status.update(status="error", error="The file could not be loaded.")
+            return
+        with state["lock"]:
+            status["status"] = "indexing"
+        load_data_index(path, reference_values, modified)
+        with state["lock"]:
+            status["status"] = "ready"
+    except Exception as e:
+        with state["lock"]:
+            status.update(status="error", error=str(e))
+
+def file_status(state, name):
+    """Copy of the warming status of a file, or None if it is not being warmed."""
+    with state["lock"]:
+        status = state["files"].get(name)
+        return dict(status) if status is not None else None
+
+def is_warming(state, name):
+    """True while a file is queued or being loaded by the warmer."""
+    status = file_status(state, name)
+    return status is not None and status["status"] in ("pending", "loading", "indexing")
+
+def prewarm_summary(state):
+    """Caption text of the warming progress of all the files, or None once all are done."""
+    with state["lock"]:
+        statuses = [s["status"] for s in state["files"].values()]
+    if not any(s in ("pending", "loading", "indexing") for s in statuses):
+        return None
+    ready = sum(s == "ready" for s in statuses)
+    return f"Preloading data files: {ready} of {len(statuses)} ready"
+
+@st.fragment(run_every=POLL_INTERVAL)
+def prewarm_progress(state, name):
+    """
+    Progress of a file still being warmed, refreshed every POLL_INTERVAL seconds
+    without rerunning the app; once the file is ready, the app reruns and finds it in
+    the shared store.
+    """
+    status = file_status(state, name)
+    if status is None or status["status"] in ("ready", "error"):
+        st.rerun()
+    if status["status"] == "pending":
+        st.progress(0.0, text=f"{name} is queued for loading...")
+    elif status["status"] == "indexing":
+        st.progress(1.0, text=f"Indexing {name}...")
+    else:
+        total = status["total"] or 0
+        fraction = status["done"] / total if total else 0.0
+        st.progress(fraction, text=f"Loading {name}: {status['done']:,} of {total:,} entries" if total else f"Reading {name}...")
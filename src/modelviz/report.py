@@ -0,0 +1,352 @@
+"""
+Headless batch renderer of static reports.
+
+Renders one figure per (db, analysis, column, agg, ref, group) combination of a data
+file with matplotlib, in parallel over a process pool, and writes an index page.
+Combinations whose entries and settings did not change since the last run are skipped.
+The reference values of the Var Y subplot and the custom x ticks are read from the
+app's settings module, as in the app.
+
+Usage:
+    python -m modelviz.report data/mock_database.json reports/ --formats png svg html
+"""
+import argparse
+import hashlib
+import html
+import importlib
+import json
+import os
+import sys
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import StringIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from matplotlib import rcParams
+from matplotlib.figure import Figure
+from matplotlib.ticker import FixedLocator, FuncFormatter
+
+from .data_loader import decode_entry, precompute_var_y, read_raw_data_file
+from .keygen import reverse_key_generator
+from .plotting import get_var_y, map_xticks
+
+COMBINATION_PARAMS = ["db", "analysis", "column", "agg", "ref", "group"]
+REPORT_FORMATS = ("png", "svg", "html")
+MANIFEST_NAME = "manifest.json"
+# Bump when the rendering changes, so that existing reports are regenerated
+RENDERER_VERSION = 2
+# Most labelled x ticks per axis when the column has custom x ticks
+MAX_XTICKS = 20
+
+def enumerate_combinations(data_dict, preserved_types_in_keys=True):
+    """
+    Groups the keys of data_dict by their (db, analysis, column, agg, ref, group) values.
+
+    Returns:
+        dict: Maps each combination tuple (in COMBINATION_PARAMS order) to a sorted
+              list of (target, key) pairs. Malformed keys are skipped.
+    """
+    combinations = {}
+    for key in data_dict:
+        try:
+            params = reverse_key_generator(key, preserved_types=preserved_types_in_keys)
+        except ValueError:
+            continue
+        if "target" not in params or any(p not in params for p in COMBINATION_PARAMS):
+            continue
+        combination = tuple(params[p] for p in COMBINATION_PARAMS)
+        combinations.setdefault(combination, []).append((params["target"], key))
+    for targets in combinations.values():
+        targets.sort(key=lambda item: str(item[0]))
+    return combinations
+
+def combination_slug(combination):
+    """File-system safe, unique name of a combination."""
+    readable = "_".join(re.sub(r"[^A-Za-z0-9.-]+", "-", str(v)) for v in combination)
+    digest = hashlib.sha1(repr(combination).encode()).hexdigest()[:8]
+    return f"{readable}_{digest}"
+
+def combination_hash(raw_entries, settings):
+    """
+    Hash of the inputs of one report: the raw (JSON encoded) entries of its targets and
+    the render settings.
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps(settings, sort_keys=True).encode())
+    for target, raw_entry in raw_entries:
+        h.update(repr(target).encode())
+        h.update(json.dumps(raw_entry, sort_keys=True).encode())
+    return h.hexdigest()
+
+def render_combination(combination, raw_entries, output_dir, settings):
+    """
+    Renders the report of one combination into output_dir. Runs in a worker process,
+    so it receives the raw JSON entries and decodes them itself. settings holds the
+    'reference' value of a var_y_type taken from the reference values and the
+    custom 'xticks' of the column, if any.
+
+    Returns:
+        list: Names of the written files.
+    """
+    params = dict(zip(COMBINATION_PARAMS, combination))
+    entries = [(target, decode_entry(dict(raw_entry))) for target, raw_entry in raw_entries]
+    reference = settings.get("reference")
+    reference_values = {settings["var_y_type"]: reference} if reference is not None else None
+    precompute_var_y({str(i): entry for i, (_, entry) in enumerate(entries)}, reference_values)
+
+    fig = _draw_figure(params, entries, settings["var_y_type"], reference, settings.get("xticks"))
+    slug = combination_slug(combination)
+    files = []
+    for fmt in ("png",):
+        if fmt in settings["formats"]:
+            name = f"{slug}.{fmt}"
+            fig.savefig(Path(output_dir) / name, format=fmt, dpi=settings["dpi"])
+            files.append(name)
+    if "svg" in settings["formats"] or "html" in settings["formats"]:
+        # The SVG is rendered once and also inlined in the HTML page
+        buffer = StringIO()
+        fig.savefig(buffer, format="svg")
+        svg_markup = buffer.getvalue()
+        if "svg" in settings["formats"]:
+            name = f"{slug}.svg"
+            (Path(output_dir) / name).write_text(svg_markup)
+            files.append(name)
+        if "html" in settings["formats"]:
+            name = f"{slug}.html"
+            _write_html_page(svg_markup, params, Path(output_dir) / name)
+            files.append(name)
+    return files
+
+def build_reports(data_file, output_dir, formats=("png",), var_y_type="min", dpi=100, workers=None, force=False,
+                  reference_values=None, custom_xticks=None):
+    """
+    Renders every combination of data_file (.json or .jsonl) into output_dir and
+    writes index.html.
+
+    Combinations whose inputs have the same hash as recorded in the manifest of a
+    previous run (and whose files still exist) are skipped unless force is True.
+
+    Args:
+        var_y_type (str): Reference of the Var Y subplot: 'min', 'max' or a key of
+                          reference_values (e.g. dictionary_aggregated_values).
+        custom_xticks (dict): Tick values and labels by column, as in the app.
+
+    Returns:
+        dict: Counts of 'rendered', 'skipped' and 'failed' combinations, and
+              'failures': a list of (slug, error message) of the failed ones.
+    """
+    formats = [f for f in REPORT_FORMATS if f in formats]
+    if not formats:
+        raise ValueError(f"No supported report format given; choose from {REPORT_FORMATS}.")
+    reference_values = reference_values or {}
+    custom_xticks = custom_xticks or {}
+    if var_y_type not in ("min", "max") and var_y_type not in reference_values:
+        raise ValueError(f"var_y_type must be 'min', 'max' or one of {list(reference_values)}.")
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    raw_data = read_raw_data_file(data_file)
+
+    settings = {
+        "formats": formats, "var_y_type": var_y_type, "reference": reference_values.get(var_y_type),
+        "dpi": dpi, "version": RENDERER_VERSION,
+    }
+    manifest_path = output_dir / MANIFEST_NAME
+    old_manifest = json.loads(manifest_path.read_text()) if manifest_path.is_file() else {}
+    manifest = {}
+    pending = []
+    for combination, targets in enumerate_combinations(raw_data).items():
+        raw_entries = [(target, raw_data[key]) for target, key in targets]
+        slug = combination_slug(combination)
+        # Only the ticks of its own column take part in the hash of a combination
+        combination_settings = dict(settings, xticks=custom_xticks.get(combination[COMBINATION_PARAMS.index("column")]))
+        digest = combination_hash(raw_entries, combination_settings)
+        previous = old_manifest.get(slug)
+        up_to_date = (
+            not force and previous is not None and previous["hash"] == digest
+            and all((output_dir / name).is_file() for name in previous["files"])
+        )
+        if up_to_date:
+            manifest[slug] = previous
+        else:
+            pending.append((slug, combination, raw_entries, combination_settings, digest))
+
+    counts = {"rendered": 0, "skipped": len(manifest), "failed": 0, "failures": []}
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = {
+                pool.submit(render_combination, combination, raw_entries, output_dir, combination_settings): (slug, combination, digest)
+                for slug, combination, raw_entries, combination_settings, digest in pending
+            }
+            for future in as_completed(futures):
+                slug, combination, digest = futures[future]
+                try:
+                    files = future.result()
+                except Exception as e:
+                    counts["failures"].append((slug, f"{type(e).__name__}: {e}"))
+                    counts["failed"] += 1
+                    continue
+                manifest[slug] = {
+                    "hash": digest,
+                    "combination": dict(zip(COMBINATION_PARAMS, combination)),
+                    "files": files,
+                }
+                counts["rendered"] += 1
+
+    manifest_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    _write_index(manifest, output_dir / "index.html", data_file)
+    counts["failures"].sort()
+    return counts
+
+def _draw_figure(params, entries, var_y_type, reference=None, xticks=None):
+    add_third_subplot = params["group"] != "all"
+    rows = 3 if add_third_subplot else 2
+    fig = Figure(figsize=(12, 4 * rows), layout="constrained")
+    axes = fig.subplots(rows, 1)
+    ax_line, ax_var = axes[0], axes[1]
+    colors = [c["color"] for c in rcParams["axes.prop_cycle"]]
+
+    line_index = 0
+    for target, entry in entries:
+        df = entry["df"]
+        if df.empty:
+            continue
+        df_sorted = df.sort_values(by=["group", "x"])
+        var_y = get_var_y(entry, var_y_type, reference)
+        for g, group_df in df_sorted.groupby("group", sort=False):
+            color = colors[line_index % len(colors)]
+            x = _tick_values(group_df["x"], xticks)
+            ax_line.plot(x, group_df["y"], marker="o", markersize=3, color=color, label=f"{target}-{g}")
+            ax_var.plot(x, var_y[group_df.index], marker="o", markersize=3, color=color)
+            line_index += 1
+
+    # Histogram of the first target on a secondary axis of the first two subplots
+    dfh = entries[0][1]["dfh"]
+    dfh_x = _tick_values(dfh["x"], xticks)
+    for ax in (ax_line, ax_var):
+        ax_bar = ax.twinx()
+        ax_bar.bar(dfh_x, dfh["y"], width=_bar_width(dfh_x), color="#ff7f0e", alpha=0.3)
+        ax_bar.set_ylabel("Bar Plot Y-Axis")
+        # Keep the lines above the bars of the twin axis
+        ax.set_zorder(ax_bar.get_zorder() + 1)
+        ax.patch.set_visible(False)
+
+    ax_line.set_title("Y vs X")
+    ax_line.set_ylabel("Y")
+    ax_var.set_title(f"Var Y vs X (reference: {var_y_type})")
+    ax_var.set_ylabel("Var Y [%]")
+    ax_var.set_xlabel(params["column"])
+    _label_xticks(ax_line, xticks)
+    _label_xticks(ax_var, xticks)
+    if line_index:
+        ax_line.legend(fontsize="small", ncol=4)
+
+    if add_third_subplot:
+        ax_hist = axes[2]
+        dfhg = entries[0][1].get("dfhg")
+        if dfhg is not None and not dfhg.empty:
+            groups = dfhg["group"].unique()
+            dfhg_x = _tick_values(dfhg["x"], xticks)
+            # Side-by-side bars need numeric x; categorical x is drawn at positions 0..n-1
+            codes, categories = pd.factorize(dfhg_x, sort=True)
+            numeric_x = pd.api.types.is_numeric_dtype(dfhg_x)
+            positions = dfhg_x.to_numpy(dtype=float) if numeric_x else codes.astype(float)
+            width = (_bar_width(dfhg_x) if numeric_x else 0.8) / len(groups)
+            for idx, g in enumerate(groups):
+                in_group = (dfhg["group"] == g).to_numpy()
+                offset = (idx - (len(groups) - 1) / 2) * width
+                ax_hist.bar(positions[in_group] + offset, dfhg["y"].to_numpy()[in_group], width=width,
+                            color=colors[idx % len(colors)], alpha=0.7, label=f"Group {g} Hist")
+            if not numeric_x:
+                ax_hist.set_xticks(np.arange(len(categories)), [str(c) for c in categories])
+            else:
+                _label_xticks(ax_hist, xticks)
+            ax_hist.legend(fontsize="small", ncol=4)
+        ax_hist.set_title("Grouped Histogram")
+        ax_hist.set_ylabel("Grouped Histogram Y-Axis")
+        ax_hist.set_xlabel(params["column"])
+
+    fig.suptitle(", ".join(f"{k}={v}" for k, v in params.items()))
+    return fig
+
+def _tick_values(x, xticks):
+    # Categorical x is replaced by its tick labels; numeric x keeps its values and is
+    # labelled on the axis instead (see _label_xticks)
+    if xticks is None or pd.api.types.is_numeric_dtype(x):
+        return x
+    lookup = map_xticks(xticks)
+    return x.map(lambda v: lookup.get(v, v))
+
+def _label_xticks(ax, xticks):
+    if xticks is None or not all(isinstance(v, (int, float)) for v in xticks["xticks"]):
+        return
+    lookup = map_xticks(xticks)
+    # Every n-th tick when there are more than MAX_XTICKS
+    ax.xaxis.set_major_locator(FixedLocator(sorted(lookup), nbins=MAX_XTICKS))
+    ax.xaxis.set_major_formatter(FuncFormatter(lambda v, pos: str(lookup.get(v, ""))))
+
+def _bar_width(x):
+    if not pd.api.types.is_numeric_dtype(x):
+        return 0.8
+    x = np.unique(np.asarray(x, dtype=float))
+    steps = np.diff(x)
+    steps = steps[steps > 0]
+    return 0.8 * (steps.min() if len(steps) else 1.0)
+
+def _write_html_page(svg_markup, params, path):
+    title = html.escape(", ".join(f"{k}={v}" for k, v in params.items()))
+    # Drop the XML prolog so the SVG can be inlined
+    svg_markup = svg_markup[svg_markup.find("<svg"):]
+    path.write_text(f"<!DOCTYPE html>\n<html><head><meta charset='utf-8'><title>{title}</title></head>"
+                    f"<body><h1>{title}</h1>{svg_markup}</body></html>\n")
+
+def _write_index(manifest, path, data_file):
+    rows = []
+    for slug in sorted(manifest):
+        record = manifest[slug]
+        cells = "".join(f"<td>{html.escape(str(v))}</td>" for v in record["combination"].values())
+        links = " ".join(f"<a href='{html.escape(name)}'>{name.rsplit('.', 1)[-1]}</a>" for name in record["files"])
+        preview = next((name for name in record["files"] if name.endswith((".png", ".svg"))), None)
+        image = f"<img src='{html.escape(preview)}' width='320'>" if preview else ""
+        rows.append(f"<tr>{cells}<td>{links}</td><td>{image}</td></tr>")
+    header = "".join(f"<th>{p}</th>" for p in COMBINATION_PARAMS)
+    path.write_text(
+        "<!DOCTYPE html>\n<html><head><meta charset='utf-8'><title>ModelViz reports</title></head><body>"
+        f"<h1>Reports for {html.escape(str(data_file))}</h1>"
+        f"<table border='1'><tr>{header}<th>files</th><th>preview</th></tr>{''.join(rows)}</table>"
+        "</body></html>\n"
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render static reports for every combination of a data file.")
+    parser.add_argument("data_file", help="JSON or JSONL data file, as used by the app")
+    parser.add_argument("output_dir", help="Directory for the reports and index.html")
+    parser.add_argument("--formats", nargs="+", default=["png"], choices=REPORT_FORMATS)
+    parser.add_argument("--var-y", dest="var_y_type", default="min",
+                        help="Reference of the Var Y subplot: min, max or a key of the reference values")
+    parser.add_argument("--config", default="app.config",
+                        help="Settings module with dictionary_aggregated_values and custom_xticks (default: app.config)")
+    parser.add_argument("--dpi", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Render all combinations, even unchanged ones")
+    args = parser.parse_args(argv)
+
+    config = importlib.import_module(args.config)
+    try:
+        counts = build_reports(
+            args.data_file, args.output_dir, formats=args.formats, var_y_type=args.var_y_type,
+            dpi=args.dpi, workers=args.workers, force=args.force,
+            reference_values=getattr(config, "dictionary_aggregated_values", None),
+            custom_xticks=getattr(config, "custom_xticks", None),
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    for slug, error in counts["failures"]:
+        print(f"Failed to render {slug}: {error}", file=sys.stderr)
+    print(f"Rendered {counts['rendered']}, skipped {counts['skipped']} unchanged, {counts['failed']} failed.")
+    return 1 if counts["failed"] else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
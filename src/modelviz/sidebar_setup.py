@@ -12,7 +12,7 @@ def setup_sidebar(config_labels, IMAGE_PATH, DATA_PATH):
     st.sidebar.header(config_labels["headers"]["main"])
 
     # Let the user select a file from the data folder
-    data_files = [f.name for f in Path(DATA_PATH).glob('*.json')]
+    data_files = [f.name for pattern in ('*.json', '*.jsonl') for f in Path(DATA_PATH).glob(pattern)]
     if not data_files:
         st.error("No data files found in the 'data' folder.")
         st.stop()
@@ -20,9 +20,27 @@ def setup_sidebar(config_labels, IMAGE_PATH, DATA_PATH):
     return selected_file
 
 def select_config(data_dict, config_labels, analysis_explanations, dictionary_aggregated_values):
-    # Get all unique parameter values using keygen utility
-    param_names = ["db", "analysis", "column", "agg", "ref", "group", "target"]
-    all_options = get_all_distinct_parameter_values(data_dict, param_names, preserved_types_in_keys=True)
+    selection = select_data_config(data_dict, config_labels, analysis_explanations)
+    selected_targets, var_y_type, y0 = select_figure_config(
+        data_dict, config_labels, dictionary_aggregated_values, *selection
+    )
+    return (*selection, selected_targets, var_y_type, y0)
+
+def select_data_config(data_dict, config_labels, analysis_explanations, data_index=None):
+    """
+    Sidebar selection of the db, analysis, column, aggregation, reference and grouping.
+    With data_index (see keygen.build_data_index), the options are read from it
+    instead of parsing every key.
+
+    Returns:
+        tuple: (selected_db, selected_analysis, selected_column, selected_agg, selected_ref, selected_group)
+    """
+    if data_index is not None:
+        all_options = data_index["options"]
+    else:
+        # Get all unique parameter values using keygen utility
+        param_names = ["db", "analysis", "column", "agg", "ref", "group", "target"]
+        all_options = get_all_distinct_parameter_values(data_dict, param_names, preserved_types_in_keys=True)
 
     st.sidebar.header("Configuration")
     selected_db = st.sidebar.selectbox(
@@ -51,19 +69,27 @@ def select_config(data_dict, config_labels, analysis_explanations, dictionary_ag
         config_labels["menus"]["groupping"], all_options["group"],
         help=config_labels["help"]["groupping"]
     )
+    return (selected_db, selected_analysis, selected_column, selected_agg, selected_ref, selected_group)
+
+def select_figure_config(data_dict, config_labels, dictionary_aggregated_values, selected_db, selected_analysis, selected_column, selected_agg, selected_ref, selected_group, container=st.sidebar, data_index=None):
+    """
+    Selection of the targets and of the var_y reference, drawn in container (the
+    sidebar by default; the main area when called from a fragment, which cannot
+    write to the sidebar). With data_index, the targets are looked up in it.
+
+    Returns:
+        tuple: (selected_targets, var_y_type, y0)
+    """
     # Filter targets for the current selection
-    filtered_targets = [
-        reverse_key_generator(k, preserved_types=True)["target"]
-        for k in data_dict
-        if reverse_key_generator(k, preserved_types=True).get("db") == selected_db
-        and reverse_key_generator(k, preserved_types=True).get("analysis") == selected_analysis
-        and reverse_key_generator(k, preserved_types=True).get("column") == selected_column
-        and reverse_key_generator(k, preserved_types=True).get("agg") == selected_agg
-        and reverse_key_generator(k, preserved_types=True).get("ref") == selected_ref
-        and reverse_key_generator(k, preserved_types=True).get("group") == selected_group
-    ]
-    filtered_targets = sorted(set(filtered_targets))
-    selected_targets = st.sidebar.multiselect(
+    if data_index is not None:
+        filtered_targets = data_index["items"].get(
+            (selected_db, selected_analysis, selected_column, selected_agg, selected_ref, selected_group), []
+        )
+    else:
+        filtered_targets = filter_targets(
+            data_dict, selected_db, selected_analysis, selected_column, selected_agg, selected_ref, selected_group
+        )
+    selected_targets = container.multiselect(
         config_labels["menus"]["target"], filtered_targets, default=filtered_targets[:1],
         help=config_labels["help"]["target"]
     )
@@ -71,9 +97,28 @@ def select_config(data_dict, config_labels, analysis_explanations, dictionary_ag
         st.warning("Please select at least one target.")
         st.stop()
     var_y_options = ["min", "max"] + list(dictionary_aggregated_values.keys())
-    var_y_type = st.sidebar.selectbox(
+    var_y_type = container.selectbox(
         config_labels["menus"]["reference"], var_y_options,
         help=config_labels["help"]["reference"]
     )
     y0 = dictionary_aggregated_values.get(var_y_type)
-    return (selected_db, selected_analysis, selected_column, selected_agg, selected_ref, selected_group, selected_targets, var_y_type, y0)
\ No newline at end of file
+    return (selected_targets, var_y_type, y0)
+
+def filter_targets(data_dict, selected_db, selected_analysis, selected_column, selected_agg, selected_ref, selected_group):
+    """
+    Returns the sorted targets available in data_dict for the given selection.
+    """
+    selection = {
+        "db": selected_db,
+        "analysis": selected_analysis,
+        "column": selected_column,
+        "agg": selected_agg,
+        "ref": selected_ref,
+        "group": selected_group,
+    }
+    filtered_targets = set()
+    for k in data_dict:
+        params = reverse_key_generator(k, preserved_types=True)
+        if all(params.get(name) == value for name, value in selection.items()):
+            filtered_targets.add(params["target"])
+    return sorted(filtered_targets)
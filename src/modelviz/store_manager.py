@@ -0,0 +1,90 @@
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from .data_loader import deep_size, load_data_index, load_data_store
+
+# Resident data stores, least recently used first: (file, modified) -> residency record
+_resident = OrderedDict()
+_counters = {"hits": 0, "misses": 0, "evictions": 0, "evicted_bytes": 0}
+_lock = threading.Lock()
+
+def get_data_store(filename, reference_values=None, modified=None, memory_budget=None, _progress=None):
+    """
+    The shared store of a data file (data_loader.load_data_store), under a process-wide
+    memory budget.
+
+    The decoded size of each store (data_loader.deep_size) is measured once when it
+    is first seen. After each access, the least recently used stores are evicted from
+    the cache (with their key indexes) until the resident total fits memory_budget;
+    the store just requested is always kept, even alone over the budget. A store of an
+    older version of the same file (another modified) is evicted as soon as the new
+    one is loaded. Sessions still holding an evicted store keep it until their next
+    rerun; it is loaded again on its next access.
+
+    Args:
+        memory_budget (int): Bytes of decoded stores to keep resident; None for no limit.
+        _progress: Passed to load_data_store for a load.
+
+    Returns:
+        dict: The data_dict.
+    """
+    data_dict = load_data_store(filename, reference_values, modified, _progress=_progress)
+    if not data_dict:
+        # A failed load is not a resident store
+        return data_dict
+    key = (str(Path(filename)), modified)
+    with _lock:
+        if key in _resident:
+            _resident.move_to_end(key)
+            _counters["hits"] += 1
+            record = None
+        else:
+            _counters["misses"] += 1
+            record = {"args": (filename, reference_values, modified), "entries": len(data_dict), "bytes": None}
+            _resident[key] = record
+    if record is not None:
+        # Measured outside the lock; the store is read-only
+        size = deep_size(data_dict)
+        with _lock:
+            record["bytes"] = size
+    _evict(key, memory_budget)
+    return data_dict
+
+def _evict(keep, memory_budget):
+    with _lock:
+        victims = [key for key in _resident if key[0] == keep[0] and key != keep]
+        if memory_budget is not None:
+            total = sum(r["bytes"] or 0 for key, r in _resident.items() if key not in victims)
+            for key, record in _resident.items():
+                if total <= memory_budget:
+                    break
+                if key != keep and key not in victims:
+                    victims.append(key)
+                    total -= record["bytes"] or 0
+        evicted = [(key, _resident.pop(key)) for key in victims]
+        for _, record in evicted:
+            _counters["evictions"] += 1
+            _counters["evicted_bytes"] += record["bytes"] or 0
+    for _, record in evicted:
+        load_data_store.clear(*record["args"])
+        load_data_index.clear(*record["args"])
+
+def store_stats():
+    """
+    Residency and counters of the store manager.
+
+    Returns:
+        dict: 'files': list of dicts with 'file', 'modified', 'entries' and 'bytes'
+              (None while being measured) of the resident stores, least recently used
+              first; 'resident_bytes'; and the 'hits', 'misses', 'evictions' and
+              'evicted_bytes' counters since the process started.
+    """
+    with _lock:
+        files = [
+            {"file": Path(key[0]).name, "modified": key[1], "entries": r["entries"], "bytes": r["bytes"]}
+            for key, r in _resident.items()
+        ]
+        stats = dict(_counters)
+    stats["files"] = files
+    stats["resident_bytes"] = sum(f["bytes"] or 0 for f in files)
+    return stats
@@ -0,0 +1,339 @@
+import math
+from functools import reduce
+import numpy as np
+from .histogram import _is_integral, _numeric_histogram, histogram_frame, nice_number
+
+# The sketch capacity is chosen so the worst-case rank error stays within the requested
+# bound for up to capacity * 2**SKETCH_MAX_LEVELS values
+SKETCH_MAX_LEVELS = 24
+# Base grid bins kept before the grid is coarsened tenfold
+MAX_BASE_BINS = 1_000_000
+
+def quantile_sketch(rank_error=0.001):
+    """
+    Creates an empty mergeable quantile sketch.
+
+    The sketch keeps a stack of sorted buffers where an item at level h stands for 2**h
+    values; a full buffer is compacted by promoting every other item to the next level.
+    Each compaction at level h moves any rank by at most 2**h, which is accumulated in
+    'error' so the bound reported by sketch_rank_error is exact for the data seen.
+
+    Args:
+        rank_error (float): Target bound on the normalized rank error of the quantiles.
+
+    Returns:
+        dict: The sketch state (plain arrays and numbers, so it can be pickled).
+    """
+    return {
+        "capacity": max(2, math.ceil(2 * SKETCH_MAX_LEVELS / rank_error)),
+        "levels": [np.empty(0)],
+        "count": 0,
+        "error": 0,
+        "min": math.inf,
+        "max": -math.inf,
+    }
+
+def update_sketch(sketch, values):
+    """Adds an array of values (NaN values are ignored) to the sketch in place."""
+    values = np.asarray(values, dtype=float).ravel()
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return sketch
+    sketch["levels"][0] = np.concatenate([sketch["levels"][0], values])
+    sketch["count"] += len(values)
+    sketch["min"] = min(sketch["min"], values.min())
+    sketch["max"] = max(sketch["max"], values.max())
+    _compact(sketch)
+    return sketch
+
+def merge_sketches(sketch, other):
+    """Merges other into sketch in place. Both need the same capacity."""
+    if sketch["capacity"] != other["capacity"]:
+        raise ValueError("Only sketches created with the same rank_error can be merged.")
+    for h, level in enumerate(other["levels"]):
+        if h == len(sketch["levels"]):
+            sketch["levels"].append(np.empty(0))
+        sketch["levels"][h] = np.concatenate([sketch["levels"][h], level])
+    sketch["count"] += other["count"]
+    sketch["error"] += other["error"]
+    sketch["min"] = min(sketch["min"], other["min"])
+    sketch["max"] = max(sketch["max"], other["max"])
+    _compact(sketch)
+    return sketch
+
+def sketch_quantiles(sketch, qs):
+    """
+    Approximate quantiles of the values in the sketch, interpolated between order
+    statistics like np.percentile. They are exact while no compaction has happened.
+    """
+    n = sketch["count"]
+    if n == 0:
+        return np.full(len(qs), np.nan)
+    items = np.concatenate(sketch["levels"])
+    weights = np.concatenate([np.full(len(level), 2**h) for h, level in enumerate(sketch["levels"])])
+    order = np.argsort(items, kind="stable")
+    items, cum_weights = items[order], np.cumsum(weights[order])
+
+    def order_statistic(rank):
+        return items[min(np.searchsorted(cum_weights, rank, side="right"), len(items) - 1)]
+
+    result = []
+    for q in qs:
+        pos = q * (n - 1)
+        low = order_statistic(math.floor(pos))
+        result.append(low + (order_statistic(math.ceil(pos)) - low) * (pos - math.floor(pos)))
+    result = np.array(result, dtype=float)
+    # The extremes are tracked exactly
+    return np.clip(result, sketch["min"], sketch["max"])
+
+def sketch_rank_error(sketch):
+    """Worst-case normalized rank error of sketch_quantiles for the data seen so far."""
+    return sketch["error"] / sketch["count"] if sketch["count"] else 0.0
+
+def streaming_histogram(categorical=False, trim=0.025, rank_error=0.001):
+    """
+    Creates an empty streaming histogram, the chunked and mergeable counterpart of
+    histogram.smart_histogram for columns that do not fit in memory.
+
+    Feed it with update_histogram (one chunk at a time), combine partial results of
+    other processes with merge_histograms, and get the 'x'/'y' frame of dfh with
+    histogram_result_frame.
+
+    Numeric values are counted on a sparse base grid of width 10**exponent, so any
+    "nice" bin width (1, 2 or 5 times a power of ten) at or above it is an exact
+    multiple of it. The trimmed range and the Freedman-Diaconis width come from a
+    quantile sketch. While the sketch has not been compacted, it still holds every
+    value, and the result is exactly that of smart_histogram. Beyond that, the
+    approximation (see histogram_error) is:
+      - 'rank': the rank error of the trim bounds and quartiles, bounded by rank_error.
+      - 'resolution': the base grid width; the trim bounds are applied to whole base
+        bins, and bins narrower than the base grid cannot be produced.
+
+    Args:
+        categorical (bool): Count categories instead of binning numbers.
+        trim (float): Fraction trimmed at each side (numeric) or minimum category
+                      frequency (categorical), as in smart_histogram.
+        rank_error (float): Target bound on the normalized rank error of the sketch.
+
+    Returns:
+        dict: The histogram state (plain arrays and numbers, so it can be pickled).
+    """
+    return {
+        "categorical": categorical,
+        "trim": trim,
+        "count": 0,
+        "integral": True,
+        "exponent": None,
+        "bins": np.empty(0, dtype=np.int64),
+        "counts": np.empty(0, dtype=np.int64),
+        "categories": np.empty(0),
+        "sketch": None if categorical else quantile_sketch(rank_error),
+    }
+
+def update_histogram(state, chunk):
+    """
+    Adds a chunk of values to a streaming histogram in place.
+
+    Returns:
+        dict: state, to allow functools.reduce(update_histogram, chunks, state).
+    """
+    v = np.asarray(chunk).ravel()
+    if state["categorical"]:
+        if len(v):
+            categories, counts = np.unique(v, return_counts=True)
+            state["categories"], state["counts"] = _merge_counts(
+                state["categories"], state["counts"], categories, counts
+            )
+            state["count"] += len(v)
+        return state
+
+    v = v.astype(float) if v.dtype == object else v
+    if np.issubdtype(v.dtype, np.floating):
+        v = v[~np.isnan(v)]
+    if len(v) == 0:
+        return state
+    state["integral"] = state["integral"] and bool(_is_integral(v))
+    if state["exponent"] is None:
+        state["exponent"] = _base_exponent(v, state["integral"])
+    update_sketch(state["sketch"], v)
+    state["count"] += len(v)
+    exponent = _fit_exponent(state["exponent"], v)
+    if exponent > state["exponent"]:
+        _coarsen(state, exponent)
+    bins, counts = np.unique(_base_bins(v, state["exponent"]), return_counts=True)
+    state["bins"], state["counts"] = _merge_counts(state["bins"], state["counts"], bins, counts)
+    _limit_bins(state)
+    return state
+
+def merge_histograms(state, other):
+    """
+    Merges the streaming histogram other into state in place (e.g. partial results
+    of the chunks of different worker processes).
+    """
+    if state["categorical"] != other["categorical"]:
+        raise ValueError("Cannot merge a categorical and a numeric histogram.")
+    if other["count"] == 0:
+        return state
+    if state["categorical"]:
+        state["categories"], state["counts"] = _merge_counts(
+            state["categories"], state["counts"], other["categories"], other["counts"]
+        )
+        state["count"] += other["count"]
+        return state
+
+    if state["exponent"] is None:
+        state["exponent"] = other["exponent"]
+    other_bins = other["bins"]
+    if other["exponent"] > state["exponent"]:
+        _coarsen(state, other["exponent"])
+    elif other["exponent"] < state["exponent"]:
+        other_bins = other_bins // 10 ** (state["exponent"] - other["exponent"])
+    state["bins"], state["counts"] = _merge_counts(state["bins"], state["counts"], other_bins, other["counts"])
+    merge_sketches(state["sketch"], other["sketch"])
+    state["integral"] = state["integral"] and other["integral"]
+    state["count"] += other["count"]
+    _limit_bins(state)
+    return state
+
+def histogram_result(state):
+    """
+    Histogram of a streaming histogram state, with the same binning rules as
+    smart_histogram (and the same result while the sketch is not compacted).
+
+    Returns:
+      h: histogram counts
+      x: bin edges (for numeric) or unique categories (for categorical)
+    """
+    if state["count"] == 0:
+        return np.array([]), np.array([])
+    trim = state["trim"]
+    if state["categorical"]:
+        mask = state["counts"] / state["count"] >= trim
+        return state["counts"][mask], state["categories"][mask]
+    if _is_exact(state):
+        return _numeric_histogram(state["sketch"]["levels"][0], trim)
+
+    # Trim bounds, and quartiles of the rank range that survives the trim
+    qs = (trim, 1 - trim, trim + 0.25 * (1 - 2 * trim), trim + 0.75 * (1 - 2 * trim))
+    lower_bound, upper_bound, q1, q3 = sketch_quantiles(state["sketch"], qs)
+
+    width = 10.0 ** state["exponent"]
+    bins, counts = state["bins"], state["counts"]
+    in_range = ((bins + 1) * width > lower_bound) & (bins * width <= upper_bound)
+    bins, counts = bins[in_range], counts[in_range]
+    n_filtered = counts.sum()
+    if n_filtered == 0:
+        return np.array([]), np.array([])
+
+    is_integral = state["integral"]
+    data_min = max(lower_bound, bins[0] * width)
+    # With unit bins of integers, each base bin holds a single value
+    top = bins[-1] * width if is_integral and state["exponent"] == 0 else (bins[-1] + 1) * width
+    data_max = min(upper_bound, top)
+
+    # Freedman-Diaconis bin width
+    iqr = q3 - q1
+    if iqr > 0:
+        bin_width = 2 * iqr * (n_filtered ** (-1/3))
+    else:
+        data_range = data_max - data_min
+        bin_width = data_range / 10 if data_range != 0 else 1
+
+    nice_bin_width = nice_number(bin_width)
+    if is_integral:
+        nice_bin_width = max(1, round(nice_bin_width))
+    # Whole number of base bins per bin (the base grid width at least)
+    factor = max(1, round(nice_bin_width / width))
+    nice_bin_width = factor * width
+
+    first_bin = math.floor(data_min / nice_bin_width)
+    n_bins = max(1, math.ceil((data_max - first_bin * nice_bin_width) / nice_bin_width))
+    h = np.bincount(np.clip(bins // factor - first_bin, 0, n_bins - 1), weights=counts, minlength=n_bins)
+    h = h.astype(np.int64)
+    edges = (first_bin + np.arange(n_bins + 1)) * nice_bin_width
+    if is_integral:
+        edges = np.rint(edges).astype(int)
+    return h, edges
+
+def histogram_result_frame(state):
+    """'x'/'y' frame (dfh format) of a streaming histogram state."""
+    return histogram_frame(*histogram_result(state))
+
+def histogram_error(state):
+    """
+    Approximation error of histogram_result for the data seen so far.
+
+    Returns:
+        dict: 'rank', the worst-case normalized rank error of the trim bounds and
+              quartiles, and 'resolution', the base grid width (None if categorical
+              or while the sketch is not compacted, where the result is exact).
+    """
+    if state["categorical"] or _is_exact(state):
+        return {"rank": 0.0, "resolution": None}
+    resolution = None if state["exponent"] is None else 10.0 ** state["exponent"]
+    return {"rank": sketch_rank_error(state["sketch"]), "resolution": resolution}
+
+def histogram_from_chunks(chunks, categorical=False, trim=0.025, rank_error=0.001):
+    """Convenience wrapper: folds an iterable of chunks into a streaming histogram."""
+    return reduce(update_histogram, chunks, streaming_histogram(categorical, trim, rank_error))
+
+def _is_exact(state):
+    # No compaction yet: all the values are on the first level of the sketch
+    return state["count"] > 0 and state["sketch"]["error"] == 0
+
+def _compact(sketch):
+    levels = sketch["levels"]
+    h = 0
+    while h < len(levels):
+        level = levels[h]
+        if len(level) > sketch["capacity"]:
+            level = np.sort(level)
+            n_pairs = len(level) // 2
+            # Alternate which item of each pair is promoted so the errors do not pile up
+            offset = (sketch["count"] >> h) & 1
+            promoted = level[offset:2 * n_pairs:2]
+            levels[h] = level[2 * n_pairs:]
+            if h + 1 == len(levels):
+                levels.append(np.empty(0))
+            levels[h + 1] = np.concatenate([levels[h + 1], promoted])
+            sketch["error"] += 2**h
+        h += 1
+
+def _base_exponent(v, integral):
+    # Ten times finer than the smallest nice width the data of the first chunk suggests
+    q1, q3 = np.percentile(v, [25, 75])
+    spread = q3 - q1 if q3 > q1 else np.ptp(v)
+    if spread <= 0 or not np.isfinite(spread):
+        return 0
+    exponent = math.floor(math.log10(2 * spread * len(v) ** (-1/3) / 1000))
+    return max(exponent, 0) if integral else exponent
+
+def _fit_exponent(exponent, v):
+    # Keeps the base bin indices within int64
+    largest = np.abs(v).max()
+    while largest / 10.0 ** exponent >= 2**62:
+        exponent += 1
+    return exponent
+
+def _base_bins(v, exponent):
+    scaled = v * 10.0 ** -exponent if exponent < 0 else v / 10.0 ** exponent
+    return np.floor(scaled).astype(np.int64)
+
+def _coarsen(state, exponent):
+    state["bins"], state["counts"] = _merge_counts(
+        state["bins"] // 10 ** (exponent - state["exponent"]), state["counts"],
+        np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    )
+    state["exponent"] = exponent
+
+def _limit_bins(state):
+    while len(state["bins"]) > MAX_BASE_BINS:
+        _coarsen(state, state["exponent"] + 1)
+
+def _merge_counts(keys, counts, other_keys, other_counts):
+    if len(keys) == 0:
+        keys, counts = np.asarray(other_keys), np.asarray(other_counts)
+        other_keys, other_counts = keys[:0], counts[:0]
+    keys, inverse = np.unique(np.concatenate([keys, other_keys]), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate([counts, other_counts]), minlength=len(keys))
+    return keys, counts.astype(np.int64)
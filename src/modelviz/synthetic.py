@@ -0,0 +1,199 @@
+"""
+Synthetic data files for benchmarks and regression tests.
+
+Generates entries shaped like the mock data of notebooks/mock_data3.ipynb for every
+combination of the parameter values, with a configurable number of values per
+parameter. Each entry is drawn from its own generator, seeded from the base seed and
+its key, so a file is reproducible regardless of the number of workers and any entry
+can be regenerated on its own. Entries are generated and serialized in batches by a
+process pool and streamed to the output file in key order.
+
+Usage:
+    python -m modelviz.synthetic data/synthetic.json --targets 50 --points 200 --workers 4
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .data_loader import encode_entry
+from .keygen import key_generator
+
+PARAM_ORDER = ["db", "analysis", "column", "agg", "ref", "group", "target"]
+OUTPUT_FORMATS = ("json", "jsonl")
+
+def parameter_values(dbs=2, analyses=2, columns=2, aggs=("sum", "mean"), refs=2, groups=2, targets=2):
+    """
+    Values of each parameter, e.g. db1..dbN. The groupings are 'all' followed by
+    group1..groupN, as in the mock data.
+
+    Returns:
+        dict: Parameter name (PARAM_ORDER) -> list of values.
+    """
+    return {
+        "db": [f"db{i}" for i in range(1, dbs + 1)],
+        "analysis": [f"analysis{i}" for i in range(1, analyses + 1)],
+        "column": [f"column{i}" for i in range(1, columns + 1)],
+        "agg": list(aggs),
+        "ref": [f"ref{i}" for i in range(1, refs + 1)],
+        "group": ["all"] + [f"group{i}" for i in range(1, groups + 1)],
+        "target": [f"target{i}" for i in range(1, targets + 1)],
+    }
+
+def count_entries(values):
+    """Number of entries (keys) of a file generated from parameter values."""
+    return int(np.prod([len(values[p]) for p in PARAM_ORDER]))
+
+def iter_params(values):
+    """Parameter dicts of all the entries, in a fixed order."""
+    for combination in itertools.product(*(values[p] for p in PARAM_ORDER)):
+        yield dict(zip(PARAM_ORDER, combination))
+
+def entry_rng(key, seed=0):
+    """Generator of one entry, seeded from the base seed and a hash of its key."""
+    digest = int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "little")
+    return np.random.default_rng([seed, digest])
+
+def synthetic_entry(params, rng, n_points=100, n_categories=3):
+    """
+    One entry ('df', 'dfh', 'dfhg' DataFrames) with the distributions of the mock data:
+    log-normal y and var_y over x = 1..n_points; for groupings other than 'all', one
+    block per category with y varied by 10% around a shared base.
+    """
+    n_groups = 1 if params["group"] == "all" else n_categories
+    labels = ["all"] if params["group"] == "all" else [f"category{i}" for i in range(1, n_groups + 1)]
+    x = np.arange(1, n_points + 1)
+    y_base = rng.lognormal(mean=2, sigma=0.5, size=n_points)
+    var_y = rng.lognormal(mean=1.5, sigma=0.4, size=n_points)
+    if params["group"] == "all":
+        y = y_base
+    else:
+        y = (y_base * (1 + rng.normal(0.0, 0.1, size=(n_groups, n_points)))).ravel()
+    scale = y_base.mean()
+    group = np.repeat(labels, n_points)
+    return {
+        'df': pd.DataFrame({'x': np.tile(x, n_groups), 'y': y, 'var_y': np.tile(var_y, n_groups), 'group': group}),
+        'dfh': pd.DataFrame({'x': x, 'y': rng.random(n_points) * scale}),
+        'dfhg': pd.DataFrame({'x': np.tile(x, n_groups), 'group': group, 'y': rng.random(n_groups * n_points) * scale}),
+    }
+
+def generate_data_file(output, values, n_points=100, n_categories=3, output_format=None, seed=0, workers=None, batch_size=256):
+    """
+    Writes a synthetic data file with one entry per combination of values.
+
+    Args:
+        output (str or Path): File to write.
+        values (dict): Parameter values, see parameter_values.
+        n_points (int): Points (x values) per group of an entry.
+        n_categories (int): Categories of each grouping other than 'all'.
+        output_format (str): 'json' (the flat file read by the app) or 'jsonl' (one
+                             entry per line, with its key under 'key'). Defaults to
+                             the suffix of output.
+        seed (int): Base seed.
+        workers (int): Worker processes; 1 generates in this process.
+        batch_size (int): Entries per task.
+
+    Returns:
+        int: Number of entries written.
+    """
+    output = Path(output)
+    output_format = output_format or output.suffix.lstrip(".") or "json"
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}'. Use one of {OUTPUT_FORMATS}.")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    settings = {"n_points": n_points, "n_categories": n_categories, "seed": seed, "output_format": output_format}
+    batches = _batches(iter_params(values), batch_size)
+
+    n_entries = 0
+    with open(output, "w") as f:
+        if output_format == "json":
+            f.write("{")
+        for lines in _serialized_batches(batches, settings, workers):
+            for line in lines:
+                if output_format == "json":
+                    f.write(", " if n_entries else "")
+                    f.write(line)
+                else:
+                    f.write(line + "\n")
+                n_entries += 1
+        if output_format == "json":
+            f.write("}")
+    return n_entries
+
+def _serialize_batch(batch, settings):
+    lines = []
+    for params in batch:
+        key = key_generator(params, preserve_types=True)
+        rng = entry_rng(key, settings["seed"])
+        encoded = encode_entry(synthetic_entry(params, rng, settings["n_points"], settings["n_categories"]))
+        if settings["output_format"] == "json":
+            lines.append(f"{json.dumps(key)}: {json.dumps(encoded)}")
+        else:
+            lines.append(json.dumps(dict(key=key, **encoded)))
+    return lines
+
+def _serialized_batches(batches, settings, workers):
+    # Yields the serialized batches in order, keeping a bounded number in flight so the
+    # whole file is never held in memory
+    if workers == 1:
+        for batch in batches:
+            yield _serialize_batch(batch, settings)
+        return
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        max_in_flight = 2 * workers
+        for batch in batches:
+            in_flight.append(pool.submit(_serialize_batch, batch, settings))
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic data file for benchmarks and regression tests.")
+    parser.add_argument("output", help="Data file to write (.json or .jsonl)")
+    parser.add_argument("--dbs", type=int, default=2)
+    parser.add_argument("--analyses", type=int, default=2)
+    parser.add_argument("--columns", type=int, default=2)
+    parser.add_argument("--aggs", nargs="+", default=["sum", "mean"])
+    parser.add_argument("--refs", type=int, default=2)
+    parser.add_argument("--groups", type=int, default=2, help="Groupings besides 'all'")
+    parser.add_argument("--targets", type=int, default=2)
+    parser.add_argument("--points", type=int, default=100, help="Points per group of an entry")
+    parser.add_argument("--categories", type=int, default=3, help="Categories per grouping")
+    parser.add_argument("--format", dest="output_format", default=None, choices=OUTPUT_FORMATS,
+                        help="Output format (default: from the file suffix)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Entries per task")
+    args = parser.parse_args(argv)
+
+    values = parameter_values(args.dbs, args.analyses, args.columns, args.aggs, args.refs, args.groups, args.targets)
+    print(f"Generating {count_entries(values)} entries...")
+    start = time.perf_counter()
+    n_entries = generate_data_file(
+        args.output, values, n_points=args.points, n_categories=args.categories,
+        output_format=args.output_format, seed=args.seed, workers=args.workers, batch_size=args.batch_size
+    )
+    print(f"Wrote {n_entries} entries to {args.output} in {time.perf_counter() - start:.1f} s.")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
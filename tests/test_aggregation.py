@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+from modelviz.aggregation import ALL_GROUP, AGGREGATIONS, aggregate_model_data, bin_codes, column_bins
+from modelviz.keygen import key_generator
+
+COLUMNS = ["column1", "column2", "column3"]
+TARGETS = ["RP_total", "MP"]
+REFERENCES = {"ref1": "ref_a"}
+GROUPS = ["group1"]
+
+def make_raw_data(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    raw = pd.DataFrame({
+        "column1": rng.lognormal(3, 0.6, n_rows),
+        "column2": rng.integers(18, 80, n_rows),
+        "column3": rng.choice(["a", "b", "c", "d"], n_rows),
+        "group1": rng.choice(["category2", "category1", "category3"], n_rows),
+        "RP_total": rng.gamma(2, 50, n_rows),
+        "MP": rng.gamma(2, 48, n_rows),
+        "ref_a": rng.gamma(2, 50, n_rows),
+    })
+    # Missing values are left out of the statistics of their column only
+    raw.loc[raw.sample(frac=0.05, random_state=seed).index, "MP"] = np.nan
+    return raw
+
+def groupby_reference(raw, bins):
+    """The data_dict of aggregate_model_data, with one pandas groupby per combination."""
+    data_dict = {}
+    for column in COLUMNS:
+        codes = bin_codes(raw[column].to_numpy(), bins[column])
+        rows = raw[codes >= 0].assign(bin=codes[codes >= 0], **{ALL_GROUP: ALL_GROUP})
+        x_values = np.asarray(bins[column]["x"])
+        sizes = rows.groupby("bin").size()
+        dfh = pd.DataFrame({"x": x_values[sizes.index], "y": sizes.to_numpy()})
+        for grouping in [ALL_GROUP] + GROUPS:
+            grouped = rows.groupby([grouping, "bin"])
+            group_sizes = grouped.size()
+            x = x_values[group_sizes.index.get_level_values("bin")]
+            group = group_sizes.index.get_level_values(0).to_numpy()
+            dfhg = pd.DataFrame({"x": x, "group": group, "y": group_sizes.to_numpy()})
+            for agg in AGGREGATIONS:
+                for ref, ref_column in REFERENCES.items():
+                    y_ref = grouped[ref_column].agg(agg).to_numpy(dtype=float)
+                    for target in TARGETS:
+                        y = grouped[target].agg(agg).to_numpy(dtype=float)
+                        params = {"db": "db1", "analysis": "analysis1", "column": column, "agg": agg,
+                                  "ref": ref, "group": grouping, "target": target}
+                        data_dict[key_generator(params, preserve_types=True)] = {
+                            "df": pd.DataFrame({"x": x, "y": y, "var_y": 100 * (y - y_ref) / y_ref, "group": group}),
+                            "dfh": dfh,
+                            "dfhg": dfhg,
+                        }
+    return data_dict
+
+def assert_same_data_dict(result, expected):
+    assert result.keys() == expected.keys()
+    for key, entry in expected.items():
+        for name, frame in entry.items():
+            pd.testing.assert_frame_equal(result[key][name], frame, check_dtype=False)
+
+def aggregate(data, bins=None):
+    return aggregate_model_data(data, COLUMNS, TARGETS, REFERENCES, GROUPS, AGGREGATIONS, bins=bins)
+
+@pytest.fixture(scope="module")
+def raw():
+    return make_raw_data(5000)
+
+@pytest.fixture(scope="module")
+def bins(raw):
+    return column_bins(raw, COLUMNS)
+
+def test_single_frame_matches_groupby(raw, bins):
+    assert_same_data_dict(aggregate(raw, bins), groupby_reference(raw, bins))
+    # Bins chosen from the frame itself
+    assert_same_data_dict(aggregate(raw), groupby_reference(raw, bins))
+
+@pytest.mark.parametrize("source", ["list", "callable", "iterator"])
+def test_chunks_match_groupby(raw, bins, source):
+    chunks = [raw.iloc[start:start + 700] for start in range(0, len(raw), 700)]
+    data = {
+        "list": chunks,
+        "callable": lambda: iter(chunks),
+        "iterator": iter(chunks),
+    }[source]
+    assert_same_data_dict(aggregate(data, bins), groupby_reference(raw, bins))
+
+def test_chunks_choose_the_bins_of_the_frame(raw, bins):
+    # Below the sketch's compaction threshold, the streaming bins are those of the frame
+    chunks = [raw.iloc[start:start + 700] for start in range(0, len(raw), 700)]
+    assert_same_data_dict(aggregate(chunks), groupby_reference(raw, bins))
+
+def test_one_pass_iterator_needs_bins(raw, bins):
+    chunks = [raw.iloc[:2500], raw.iloc[2500:]]
+    with pytest.raises(ValueError):
+        aggregate(iter(chunks))
+    # Bins of some columns only are not enough either
+    with pytest.raises(ValueError):
+        aggregate(iter(chunks), {"column1": bins["column1"]})
+
+def test_unknown_aggregation(raw):
+    with pytest.raises(ValueError):
+        aggregate_model_data(raw, COLUMNS, TARGETS, REFERENCES, aggs=("median",))
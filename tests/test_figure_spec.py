@@ -0,0 +1,169 @@
+import base64
+import json
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+import pytest
+from app.config import config_labels, config_colors, dictionary_aggregated_values
+from modelviz.data_loader import precompute_var_y
+from modelviz.figure_spec import build_exploration_spec, build_figure_spec, figure_from_spec
+from modelviz.keygen import key_generator
+from modelviz.plotting import AXIS_REFS, create_figure
+
+SELECTION = {"db": "db1", "analysis": "analysis1", "column": "column1", "agg": "sum", "ref": "ref1"}
+TARGETS = ["target0", "target1"]
+# Summaries of create_figure as of da5af87, before its traces moved to build_figure_parts
+GOLDEN = Path(__file__).resolve().parent / "fixtures" / "create_figure_baseline.json"
+GOLDEN_CASES = {
+    "all": ("all", None),
+    "group1": ("group1", None),
+    "group1_webgl": ("group1", {"webgl_point_threshold": 1}),
+}
+
+def make_data_dict(group, n_groups=3, n_points=20):
+    rng = np.random.default_rng(0)
+    x = np.arange(1, n_points + 1)
+    labels = [f"category{i}" for i in range(1, n_groups + 1)] if group != "all" else ["all"]
+    data_dict = {}
+    for target in TARGETS:
+        df = pd.DataFrame({
+            "x": np.tile(x, len(labels)),
+            "y": rng.lognormal(2, 0.5, n_points * len(labels)),
+            "var_y": rng.lognormal(1.5, 0.4, n_points * len(labels)),
+            "group": np.repeat(labels, n_points),
+        })
+        entry = {"df": df, "dfh": pd.DataFrame({"x": x, "y": rng.random(n_points) * 10})}
+        if group != "all":
+            entry["dfhg"] = pd.DataFrame({
+                "x": np.tile(x, n_groups),
+                "group": np.repeat(labels, n_points),
+                "y": rng.random(n_points * n_groups) * 10,
+            })
+        data_dict[key_generator(dict(SELECTION, group=group, target=target), preserve_types=True)] = entry
+    return data_dict
+
+def plain(value):
+    """JSON value with typed arrays ({'dtype', 'bdata'}) decoded to lists."""
+    if isinstance(value, dict):
+        if "bdata" in value:
+            return np.frombuffer(base64.b64decode(value["bdata"]), dtype=value["dtype"]).tolist()
+        return {k: plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [plain(v) for v in value]
+    return value
+
+def figure_summary(figure_json):
+    """
+    The traces (names, order, types, hover templates, axes, colors and values) and the
+    layout of a figure's JSON. The template depends on the plotly version, and the
+    'meta' tags of the line traces were added later for the reference menu.
+    """
+    return {
+        "data": [{k: plain(v) for k, v in trace.items() if k != "meta"} for trace in figure_json["data"]],
+        "layout": {k: plain(v) for k, v in figure_json["layout"].items() if k != "template"},
+    }
+
+@pytest.mark.parametrize("case", GOLDEN_CASES)
+def test_create_figure_matches_baseline(case):
+    group, config_performance = GOLDEN_CASES[case]
+    fig, _ = create_figure(
+        make_data_dict(group), config_labels, config_colors, {},
+        SELECTION["db"], SELECTION["analysis"], SELECTION["column"], SELECTION["agg"],
+        SELECTION["ref"], group, TARGETS, "mean", dictionary_aggregated_values["mean"], config_performance,
+    )
+    expected = json.loads(GOLDEN.read_text())[case]
+    summary = figure_summary(json.loads(pio.to_json(fig, validate=False)))
+    assert [trace.get("name") for trace in summary["data"]] == [trace.get("name") for trace in expected["data"]]
+    assert summary["layout"] == expected["layout"]
+    for trace, expected_trace in zip(summary["data"], expected["data"]):
+        # Float values are sent as float32 within the default float32_rtol
+        for axis in ("x", "y"):
+            np.testing.assert_allclose(trace.pop(axis), expected_trace.pop(axis), rtol=1e-6)
+        assert trace == expected_trace
+
+@pytest.mark.parametrize("group", ["all", "group1"])
+@pytest.mark.parametrize("config_performance", [
+    None,
+    {"webgl_point_threshold": 1},
+    {"consolidate_traces": True, "consolidate_trace_threshold": None},
+])
+def test_spec_matches_create_figure(group, config_performance):
+    data_dict = make_data_dict(group)
+    args = (
+        data_dict, config_labels, config_colors, {},
+        SELECTION["db"], SELECTION["analysis"], SELECTION["column"], SELECTION["agg"],
+        SELECTION["ref"], group, TARGETS, "mean", dictionary_aggregated_values["mean"], config_performance,
+    )
+    fig, add_third_subplot = create_figure(*args)
+    spec, spec_third_subplot = build_figure_spec(*args)
+    assert spec_third_subplot == add_third_subplot
+    assert json.loads(pio.to_json(figure_from_spec(spec), validate=False)) == json.loads(pio.to_json(fig, validate=False))
+
+@pytest.mark.parametrize("group", ["all", "group1"])
+@pytest.mark.parametrize("consolidate", [False, True])
+def test_exploration_references_match_figures(group, consolidate):
+    data_dict = precompute_var_y(make_data_dict(group), dictionary_aggregated_values)
+    config_performance = {"consolidate_traces": consolidate, "consolidate_trace_threshold": None}
+    selection_args = (
+        data_dict, config_labels, config_colors, {},
+        SELECTION["db"], SELECTION["analysis"], SELECTION["column"], SELECTION["agg"],
+        SELECTION["ref"], group,
+    )
+    spec, _, included_targets = build_exploration_spec(
+        *selection_args, TARGETS, TARGETS[:1], "mean", dictionary_aggregated_values, config_performance
+    )
+    assert included_targets == TARGETS
+    reference_menu = spec["layout"]["updatemenus"][1]["buttons"]
+    assert [button["label"] for button in reference_menu] == ["min", "max"] + list(dictionary_aggregated_values)
+    for button in reference_menu:
+        mode = button["label"]
+        figure, _ = build_figure_spec(
+            *selection_args, TARGETS, mode, dictionary_aggregated_values.get(mode), config_performance
+        )
+        expected = [
+            trace["y"] for trace in figure["data"]
+            if "target" in trace.get("meta", {}) and trace["yaxis"] == AXIS_REFS[(2, False)][1]
+        ]
+        ys, indices = button["args"][0]["y"], button["args"][1]
+        assert len(ys) == len(indices) == len(expected)
+        for y, values in zip(ys, expected):
+            decoded = np.frombuffer(base64.b64decode(y["bdata"]), dtype=y["dtype"])
+            np.testing.assert_array_equal(decoded, values)
+
+@pytest.mark.parametrize("threshold, n_line_traces", [(None, 4), (12, 4), (13, 12)])
+def test_consolidation_threshold(threshold, n_line_traces):
+    # 2 targets x 3 groups x 2 subplots = 12 per-group line traces
+    spec, _ = build_figure_spec(
+        make_data_dict("group1"), config_labels, config_colors, {},
+        SELECTION["db"], SELECTION["analysis"], SELECTION["column"], SELECTION["agg"],
+        SELECTION["ref"], "group1", TARGETS, "mean", dictionary_aggregated_values["mean"],
+        {"consolidate_traces": True, "consolidate_trace_threshold": threshold},
+    )
+    assert sum("target" in trace.get("meta", {}) for trace in spec["data"]) == n_line_traces
+
+def test_custom_xticks_follow_the_tick_order():
+    # Tick order differs from the alphabetical order of the labels; 5 has no tick
+    custom_xticks = {"column1": {"xticks": [3, 1, 4, 2], "xticklabels": ["zeta", "beta", "mu", "alpha"]}}
+    data_dict = make_data_dict("group1", n_points=5)
+    saved = {key: {name: frame.copy() for name, frame in entry.items()} for key, entry in data_dict.items()}
+    figures = []
+    for _ in range(3):
+        fig, _ = create_figure(
+            data_dict, config_labels, config_colors, custom_xticks,
+            SELECTION["db"], SELECTION["analysis"], SELECTION["column"], SELECTION["agg"],
+            SELECTION["ref"], "group1", TARGETS, "mean", dictionary_aggregated_values["mean"],
+        )
+        figures.append(json.loads(pio.to_json(fig, validate=False)))
+        # The cached frames are left as they were
+        for key, entry in data_dict.items():
+            for name, frame in entry.items():
+                pd.testing.assert_frame_equal(frame, saved[key][name])
+    assert figures[1] == figures[0] and figures[2] == figures[0]
+
+    bars = {trace["name"]: trace for trace in figures[0]["data"] if trace["type"] == "bar"}
+    dfh = saved[next(iter(saved))]["dfh"].set_index("x")["y"]
+    assert bars["Bar Plot"]["x"] == ["zeta", "beta", "mu", "alpha", None]
+    np.testing.assert_allclose(plain(bars["Bar Plot"]["y"]), dfh[[3, 1, 4, 2, 5]], rtol=1e-6)
+    for g in ["category1", "category2", "category3"]:
+        assert bars[f"Group {g} Hist"]["x"] == ["zeta", "beta", "mu", "alpha", None]
@@ -0,0 +1,83 @@
+import json
+from pathlib import Path
+import numpy as np
+import pytest
+from modelviz.histogram import smart_histogram
+
+NOTEBOOK = Path(__file__).resolve().parents[1] / "notebooks" / "histogram_test.ipynb"
+
+@pytest.fixture(scope="module")
+def reference():
+    """smart_histogram as defined in the notebook it was promoted from."""
+    cells = ["".join(cell["source"]) for cell in json.loads(NOTEBOOK.read_text())["cells"]]
+    source = next(cell for cell in cells if "def smart_histogram" in cell)
+    namespace = {}
+    exec(source.split("# Example usage")[0], namespace)
+    return namespace["smart_histogram"]
+
+def assert_same(reference, v, trim):
+    h_ref, x_ref = reference(v, trim=trim)
+    h, x = smart_histogram(v, trim=trim)
+    np.testing.assert_array_equal(h, h_ref)
+    np.testing.assert_allclose(x, x_ref)
+
+@pytest.mark.parametrize("v, trim", [
+    # Ties at the trim bounds are kept, and count in the quartiles
+    ([1, 1, 1, 2, 3, 4, 5, 5, 5], 0.1),
+    ([0, 0, 0, 0, 1, 2, 9, 9, 9, 9], 0.25),
+    ([0., 1., 1., 1., 1., 2.5, 2.5, 1000.], 0.1),
+    # Few values: the trim bounds fall between the same two values
+    ([2, 2, 3, 3], 0.4),
+    ([5, 6, 2, 1, 3], 0.25),
+    ([3.5], 0.0),
+    # Values on the bin edges
+    ([-0.4, -0.2, -0.2, 0., 0.2, 0.2, 0.4, 0.6], 0.0),
+    (np.arange(100), 0.025),
+])
+def test_matches_reference(reference, v, trim):
+    assert_same(reference, np.asarray(v), trim)
+
+def test_matches_reference_fuzz(reference):
+    rng = np.random.default_rng(0)
+    for i in range(500):
+        n = int(rng.integers(1, 60))
+        v = [
+            rng.integers(0, int(rng.integers(1, 8)), n),
+            rng.normal(size=n).round(int(rng.integers(0, 3))),
+            rng.choice([0., 1., 2.5, 1e3], n),
+            rng.exponential(size=n),
+        ][i % 4]
+        trim = (0, 0.025, 0.1, 0.25, 0.4)[i % 5]
+        h_ref, x_ref = reference(v, trim=trim)
+        if len(h_ref) == 0:
+            # Degenerate case, covered below
+            continue
+        assert_same(reference, v, trim)
+
+@pytest.mark.parametrize("v, trim", [
+    ([7, 7, 7, 7], 0.025),
+    ([3.0], 0.0),
+    ([2, 2, 3], 0.4),
+    ([1, 2, 2, 2, 2, 2, 2, 2, 2, 3], 0.2),
+])
+def test_equal_values_fill_one_bin(reference, v, trim):
+    # The notebook returns no bins when the trimmed values are all equal
+    h_ref, x_ref = reference(np.asarray(v), trim=trim)
+    assert len(h_ref) == 0
+    h, x = smart_histogram(v, trim=trim)
+    assert len(h) == 1 and len(x) == 2
+    assert x[0] <= x_ref[0] < x[1]
+    assert h[0] == np.count_nonzero(np.asarray(v) == x_ref[0])
+
+def test_empty_and_nan():
+    for v in ([], [np.nan, np.nan]):
+        h, x = smart_histogram(np.asarray(v, dtype=float))
+        assert len(h) == 0 and len(x) == 0
+    h, x = smart_histogram([np.nan, 1., 2., 3., np.nan], trim=0)
+    assert h.sum() == 3
+
+def test_categorical_drops_rare_categories():
+    v = np.array(["a"] * 50 + ["b"] * 49 + ["c"])
+    h, x = smart_histogram(v, categorical=True, trim=0.025)
+    assert list(x) == ["a", "b"]
+    assert list(h) == [50, 49]
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+from modelviz.aggregation import AGGREGATIONS, aggregate_model_data, column_bins
+from modelviz.incremental import BINS_NAME, add_partition, create_store, store_entries, store_path
+
+COLUMNS = ["column1", "column2"]
+TARGETS = ["RP_total", "MP"]
+REFERENCES = {"ref1": "ref_a"}
+GROUPS = ["group1"]
+
+def make_raw_data(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "column1": rng.lognormal(3, 0.6, n_rows),
+        "column2": rng.choice(["a", "b", "c"], n_rows),
+        "group1": rng.choice(["category1", "category2"], n_rows),
+        "RP_total": rng.gamma(2, 50, n_rows),
+        "MP": rng.gamma(2, 48, n_rows),
+        "ref_a": rng.gamma(2, 50, n_rows),
+    })
+
+@pytest.fixture
+def store_dir(tmp_path):
+    create_store(tmp_path, "db1", "analysis1", COLUMNS, TARGETS, REFERENCES, GROUPS, AGGREGATIONS)
+    return tmp_path
+
+def full_recompute(partitions):
+    bins = column_bins(partitions[0], COLUMNS)
+    return aggregate_model_data(partitions, COLUMNS, TARGETS, REFERENCES, GROUPS, AGGREGATIONS, bins=bins)
+
+def assert_same_entries(entries, expected):
+    assert entries.keys() == expected.keys()
+    for key in expected:
+        for frame in ("df", "dfh", "dfhg"):
+            if frame in expected[key]:
+                pd.testing.assert_frame_equal(entries[key][frame], expected[key][frame])
+
+def test_first_partition_from_iterator_raises(store_dir):
+    chunks = (chunk for chunk in [make_raw_data(500)])
+    with pytest.raises(ValueError):
+        add_partition(store_dir, "db1", "analysis1", "day0", chunks)
+    # Nothing was recorded
+    assert not (store_path(store_dir, "db1", "analysis1") / BINS_NAME).exists()
+    assert store_entries(store_dir, "db1", "analysis1") == {}
+    # The same rows as a list are added
+    assert add_partition(store_dir, "db1", "analysis1", "day0", [make_raw_data(500)])
+
+def test_later_partition_from_iterator(store_dir):
+    partitions = [make_raw_data(1000, seed=0), make_raw_data(800, seed=1)]
+    add_partition(store_dir, "db1", "analysis1", "day0", partitions[0])
+    entries = add_partition(store_dir, "db1", "analysis1", "day1", (chunk for chunk in [partitions[1]]))
+    assert_same_entries(entries, full_recompute(partitions))
+
+def test_merged_totals_match_full_recompute(store_dir):
+    partitions = [make_raw_data(1000, seed=seed) for seed in range(3)]
+    for day, partition in enumerate(partitions):
+        entries = add_partition(store_dir, "db1", "analysis1", f"day{day}", partition)
+    expected = full_recompute(partitions)
+    assert_same_entries(entries, expected)
+    assert_same_entries(store_entries(store_dir, "db1", "analysis1"), expected)
+
+def test_replacing_a_partition(store_dir):
+    partitions = [make_raw_data(1000, seed=0), make_raw_data(1000, seed=1)]
+    add_partition(store_dir, "db1", "analysis1", "day0", partitions[0])
+    # A wrong day1 (e.g. a failed export), then the corrected one
+    add_partition(store_dir, "db1", "analysis1", "day1", make_raw_data(3000, seed=2))
+    entries = add_partition(store_dir, "db1", "analysis1", "day1", partitions[1])
+    assert_same_entries(entries, full_recompute(partitions))
+    totals_files = list(store_path(store_dir, "db1", "analysis1").glob("totals_*.pkl"))
+    assert len(totals_files) == 1
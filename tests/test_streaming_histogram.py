@@ -0,0 +1,116 @@
+import itertools
+import math
+import numpy as np
+import pytest
+from modelviz.histogram import smart_histogram
+from modelviz.streaming_histogram import (
+    histogram_error, histogram_from_chunks, histogram_result, merge_histograms, quantile_sketch,
+    sketch_quantiles, sketch_rank_error, streaming_histogram, update_histogram, update_sketch,
+)
+
+CASES = {
+    "integers": lambda rng, n: rng.integers(0, 500, n),
+    "lognormal": lambda rng, n: rng.lognormal(2, 0.5, n),
+    "rounded": lambda rng, n: rng.normal(0, 1, n).round(2),
+    "ties": lambda rng, n: rng.choice([0., 1., 2.5, 1e3], n),
+}
+
+def streamed(parts, categorical=False, trim=0.025, rank_error=0.001):
+    """Merges the streaming histograms of parts, each fed in a few chunks."""
+    partials = [
+        histogram_from_chunks(np.array_split(part, 3), categorical, trim, rank_error) for part in parts
+    ]
+    state = partials[0]
+    for partial in partials[1:]:
+        merge_histograms(state, partial)
+    return state
+
+def assert_same_histogram(result, expected):
+    h, x = result
+    h_ref, x_ref = expected
+    np.testing.assert_array_equal(h, h_ref)
+    np.testing.assert_array_equal(x, x_ref)
+
+@pytest.mark.parametrize("case", CASES)
+@pytest.mark.parametrize("trim", [0, 0.025, 0.1])
+def test_matches_smart_histogram_before_compaction(case, trim):
+    rng = np.random.default_rng(0)
+    for n in (1, 7, 500, 5000):
+        v = CASES[case](rng, n)
+        state = streamed(np.array_split(v, 4), trim=trim)
+        assert state["sketch"]["error"] == 0
+        assert_same_histogram(histogram_result(state), smart_histogram(v, trim=trim))
+        assert histogram_error(state) == {"rank": 0.0, "resolution": None}
+
+def test_categorical_matches_smart_histogram():
+    v = np.random.default_rng(0).choice(["a", "b", "c", "d"], 5000, p=[0.5, 0.3, 0.19, 0.01])
+    state = streamed(np.array_split(v, 4), categorical=True)
+    assert_same_histogram(histogram_result(state), smart_histogram(v, categorical=True))
+
+@pytest.mark.parametrize("categorical", [False, True])
+def test_merge_does_not_depend_on_grouping_or_order(categorical):
+    rng = np.random.default_rng(1)
+    v = rng.choice(["a", "b", "c"], 3000) if categorical else rng.lognormal(2, 0.5, 3000)
+    parts = np.array_split(v, 4)
+    expected = histogram_result(streamed([v], categorical))
+    for order in itertools.permutations(range(4)):
+        assert_same_histogram(histogram_result(streamed([parts[i] for i in order], categorical)), expected)
+    # Partials merged in a tree instead of one after another
+    left, right = streamed(parts[:2], categorical), streamed(parts[2:], categorical)
+    assert_same_histogram(histogram_result(merge_histograms(right, left)), expected)
+
+def test_merged_base_grid_does_not_depend_on_order_after_compaction():
+    v = np.random.default_rng(2).lognormal(2, 0.5, 40_000)
+    parts = np.array_split(v, 4)
+    states = [streamed([parts[i] for i in order], rank_error=0.05) for order in ([0, 1, 2, 3], [3, 1, 0, 2])]
+    assert all(state["sketch"]["error"] > 0 for state in states)
+    np.testing.assert_array_equal(states[0]["bins"], states[1]["bins"])
+    np.testing.assert_array_equal(states[0]["counts"], states[1]["counts"])
+    assert states[0]["count"] == states[1]["count"] == len(v)
+
+@pytest.mark.parametrize("rank_error", [0.05, 0.01])
+def test_sketch_rank_error_is_reported_and_respected(rank_error):
+    rng = np.random.default_rng(3)
+    v = rng.normal(0, 1, 200_000)
+    sketch = quantile_sketch(rank_error)
+    for chunk in np.array_split(v, 20):
+        update_sketch(sketch, chunk)
+    bound = sketch_rank_error(sketch)
+    assert 0 < bound <= rank_error
+    qs = np.linspace(0, 1, 41)
+    sorted_v = np.sort(v)
+    n = len(v)
+    for q, value in zip(qs, sketch_quantiles(sketch, qs)):
+        # Rank of the estimate against the rank asked for, in the exact data
+        low = np.searchsorted(sorted_v, value, side="left")
+        high = np.searchsorted(sorted_v, value, side="right")
+        target = q * (n - 1)
+        distance = max(0, low - math.ceil(target), math.floor(target) - high)
+        assert distance <= bound * n + 1
+
+@pytest.mark.parametrize("case", ["lognormal", "integers"])
+def test_histogram_error_is_reported_and_respected(case):
+    rng = np.random.default_rng(4)
+    v = CASES[case](rng, 200_000)
+    trim = 0.025
+    state = streamed(np.array_split(v, 4), trim=trim, rank_error=0.01)
+    error = histogram_error(state)
+    assert 0 < error["rank"] <= 0.01
+    h, x = histogram_result(state)
+    rank, resolution = error["rank"], error["resolution"]
+    lower = np.quantile(v, [trim - rank, trim + rank])
+    upper = np.quantile(v, [1 - trim - rank, 1 - trim + rank])
+    # The bins reach over the exact trimmed range, up to the reported errors
+    assert x[0] <= lower[1] and x[-1] >= upper[0] - resolution
+    # and count the values within it, with the bounds applied to whole base bins
+    inner = np.count_nonzero((v >= lower[1] + resolution) & (v <= upper[0] - resolution))
+    outer = np.count_nonzero((v >= lower[0] - resolution) & (v <= upper[1] + resolution))
+    assert inner <= h.sum() <= outer
+
+def test_empty_and_nan():
+    state = streaming_histogram()
+    update_histogram(state, np.array([np.nan, np.nan]))
+    h, x = histogram_result(state)
+    assert len(h) == 0 and len(x) == 0
+    update_histogram(state, np.array([np.nan, 1., 2., 3.]))
+    assert_same_histogram(histogram_result(state), smart_histogram(np.array([1., 2., 3.])))